@@ -0,0 +1,58 @@
+"""
+Compare the CPU latency and throughput of the inference backends in common.backends.
+
+Each backend and model variant runs the same letterboxed 640×640 input. Latency
+is measured at batch size 1 and throughput at --batch-size. Backends whose
+dependencies or model files are missing are reported and skipped.
+Run from the repo root:
+
+    poetry run python -m benchmarks.backends [--profile latency] [--batch-size 8]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.timing import timed_ms
+from common.backends import load_backend, model_path
+from common.session import PROFILES
+
+REQUESTS = 30
+
+# (backend, variant) pairs with the raw [bbox, cls, ldm] contract
+CANDIDATES = [("onnx", "fp32"), ("onnx", "int8"), ("torchscript", "fp32"), ("torch-compile", "fp32")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=PROFILES, default="latency")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    single = rng.normal(0, 50, size=(1, 3, 640, 640)).astype(np.float32)
+    batch = rng.normal(0, 50, size=(args.batch_size, 3, 640, 640)).astype(np.float32)
+
+    print(f"profile {args.profile!r}, {os.cpu_count()} cores, batch size {args.batch_size} for throughput")
+    print(f"{'backend':>20} {'load':>9} {'p50':>9} {'p95':>9} {'throughput':>12}")
+    for name, variant in CANDIDATES:
+        label = f"{name}/{variant}"
+        if name == "onnx" and not os.path.exists(model_path(variant)):
+            print(f"{label:>20} skipped: {os.path.basename(model_path(variant))} not found")
+            continue
+        start = time.perf_counter()
+        try:
+            backend = load_backend(name, variant=variant, profile=args.profile)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{label:>20} skipped: {e}")
+            continue
+        load_ms = (time.perf_counter() - start) * 1000
+
+        backend.model(single)  # warm up, e.g. compilation
+        backend.model(batch)
+        p50, p95 = np.percentile(timed_ms(lambda: backend.model(single), REQUESTS), [50, 95])
+        batch_ms = min(timed_ms(lambda: backend.model(batch), max(REQUESTS // args.batch_size, 3)))
+        throughput = args.batch_size / batch_ms * 1000
+        print(f"{label:>20} {load_ms:>6.0f} ms {p50:>6.1f} ms {p95:>6.1f} ms {throughput:>7.1f} img/s")
@@ -0,0 +1,170 @@
+"""
+Load test the Flask server under waitress against the micro-batching ASGI server (server/asgi.py) under uvicorn.
+
+Each server is started on a local port with the result caches, near-duplicate lookup and detection store off, so
+that every request runs the model. Client threads then post distinct 640px uploads to /googly_eyes/raw as fast as
+the server answers them, and the test reports the throughput and the median and p99 latency. Run from the repo root:
+
+    poetry run python -m benchmarks.load_test [--requests 200] [--concurrency 16] [--max-batch 8]
+
+or against servers that are already running, e.g. in docker compose:
+
+    poetry run python -m benchmarks.load_test --url http://localhost:8000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+from urllib.parse import urlsplit
+
+import numpy as np
+from PIL import Image
+
+IMAGE_PATH = "tests/group_of_people.jpg"
+IMAGE_SIZE = 640
+
+# Every request runs decode, detection, drawing and encoding
+_UNCACHED = {
+    "DETECTION_CACHE_SIZE": "0",
+    "RENDER_CACHE_SIZE": "0",
+    "NEAR_DUPLICATE_MAX_DISTANCE": "-1",
+    "DETECTION_STORE_DIR": "",
+    "ORT_SESSION_PROFILE": "latency",
+}
+
+
+def uploads(n: int) -> list[bytes]:
+    """n distinct JPEGs of the test photo, differing in one pixel, so that no two requests are coalesced"""
+    photo = Image.open(IMAGE_PATH).convert("RGB")
+    photo.thumbnail((IMAGE_SIZE, IMAGE_SIZE))
+    pixels = np.asarray(photo).copy()
+    contents = []
+    for i in range(n):
+        pixels[0, 0] = (i % 256, i // 256 % 256, 0)
+        buffer = BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        contents.append(buffer.getvalue())
+    return contents
+
+
+def _post(connection: http.client.HTTPConnection, content: bytes) -> None:
+    connection.request("POST", "/googly_eyes/raw?model_tier=fast", body=content, headers={"Content-Type": "image/jpeg"})
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"Server answered {response.status}.")
+
+
+def run_load(url: str, contents: list[bytes], concurrency: int) -> tuple[float, list[float]]:
+    """Post every upload from concurrency client threads, returning the wall time and each request's latency in s"""
+    host = urlsplit(url).netloc
+    latencies: list[float] = []
+    lock = threading.Lock()
+    remaining = iter(contents)
+
+    def client() -> None:
+        connection = http.client.HTTPConnection(host, timeout=300)
+        while True:
+            with lock:
+                content = next(remaining, None)
+            if content is None:
+                break
+            start = time.perf_counter()
+            _post(connection, content)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 120) -> None:
+    host = urlsplit(url).netloc
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}.")
+        try:
+            connection = http.client.HTTPConnection(host, timeout=5)
+            connection.request("GET", "/cache_stats")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Server at {url} didn't start within {timeout} s.")
+
+
+def servers(port: int, threads: int, max_batch: int, max_wait_ms: float) -> dict[str, list[str]]:
+    python = sys.executable
+    return {
+        "waitress (Flask)": [
+            python, "-m", "waitress", "--host=127.0.0.1", f"--port={port}", f"--threads={threads}", "server.app:app"
+        ],
+        f"uvicorn (ASGI, batch {max_batch}, {max_wait_ms:g} ms)": [
+            python, "-m", "uvicorn", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+            "server.asgi:app",
+        ],
+    }  # fmt: skip
+
+
+def _mean_batch(url: str) -> str:
+    """Mean images per model call so far, for servers that batch them"""
+    connection = http.client.HTTPConnection(urlsplit(url).netloc, timeout=5)
+    connection.request("GET", "/cache_stats")
+    batches = json.loads(connection.getresponse().read()).get("inference_batches")
+    return f"{batches['mean_batch']:.1f}" if batches else "-"
+
+
+def _report(name: str, url: str, wall: float, latencies: list[float]) -> None:
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    print(f"{name:>36} {len(latencies) / wall:>8.1f} {p50:>9.0f} {p99:>9.0f} {_mean_batch(url):>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load test this running server instead of starting both")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--threads", type=int, default=16, help="waitress worker threads")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    contents = uploads(args.requests)
+    warm_up = uploads(args.concurrency + args.requests)[args.requests :]
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, {os.cpu_count()} CPUs")
+    print(f"{'server':>36} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'mean batch':>11}")
+    if args.url:
+        run_load(args.url, warm_up, args.concurrency)
+        _report(args.url, args.url, *run_load(args.url, contents, args.concurrency))
+        sys.exit()
+
+    url = f"http://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        **_UNCACHED,
+        "INFERENCE_MAX_BATCH": str(args.max_batch),
+        "INFERENCE_MAX_WAIT_MS": str(args.max_wait_ms),
+    }
+    for name, command in servers(args.port, args.threads, args.max_batch, args.max_wait_ms).items():
+        process = subprocess.Popen(command, env=env, stderr=subprocess.DEVNULL)
+        try:
+            _wait_until_up(url, process)
+            run_load(url, warm_up, args.concurrency)
+            _report(name, url, *run_load(url, contents, args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,42 @@
+"""
+Benchmark the vectorised NMS against the original pure-Python cpu_nms.
+
+Candidates are clustered around simulated faces, as in a crowd photo scored
+with a low threshold. The cpu_nms reference takes about a minute at 10,000
+candidates, so it is only timed once at that size. Run from the repo root:
+
+    poetry run python -m benchmarks.nms
+"""
+
+import numpy as np
+
+from benchmarks.timing import best_ms
+from retinaface.commons.postprocess import cpu_nms, nms
+
+CANDIDATE_COUNTS = [10, 100, 1_000, 10_000]
+THRESHOLD = 0.4
+TOP_K = 750
+
+
+def _crowd_dets(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n_faces = max(n // 20, 1)
+    centres = rng.uniform(0, 4000, size=(n_faces, 2))[rng.integers(0, n_faces, size=n)]
+    centres += rng.normal(0, 6, size=(n, 2))
+    sizes = rng.uniform(20, 120, size=(n, 1))
+    return np.hstack([centres - sizes / 2, centres + sizes / 2, rng.uniform(0.02, 1, size=(n, 1))]).astype(np.float32)
+
+
+if __name__ == "__main__":
+    print(f"{'candidates':>10} {'cpu_nms':>12} {'nms':>12} {'nms top-k':>12} {'speedup':>8} {'kept':>6}")
+    for n in CANDIDATE_COUNTS:
+        dets = _crowd_dets(n)
+        assert nms(dets, THRESHOLD) == cpu_nms(dets, THRESHOLD)
+        repeat = 3 if n >= 10_000 else 10
+        reference = best_ms(lambda: cpu_nms(dets, THRESHOLD), 1 if n >= 10_000 else repeat)
+        vectorised = best_ms(lambda: nms(dets, THRESHOLD), repeat)
+        top_k = best_ms(lambda: nms(dets, THRESHOLD, top_k=TOP_K), repeat)
+        print(
+            f"{n:>10} {reference:>9.2f} ms {vectorised:>9.2f} ms {top_k:>9.2f} ms "
+            f"{reference / vectorised:>7.1f}x {len(nms(dets, THRESHOLD)):>6}"
+        )
@@ -0,0 +1,114 @@
+"""
+Verify the near-duplicate lookup of common.phash on perturbed copies of local images.
+
+Each image is re-uploaded the ways users do: resized, re-compressed,
+re-saved without EXIF, converted to PNG, lightly brightened. Every copy's
+dHash distance to the original is compared against distinct images, which
+are offset crops and mirror images of the originals. For each copy the
+benchmark reports the distance, and the landmark error of the original's
+faces rescaled to the copy against running the model on the copy. Timing
+is the lookup in an index padded with random hashes. Run from the repo root:
+
+    poetry run python -m benchmarks.phash [image_path ...] [--max-distance 6]
+"""
+
+import argparse
+import timeit
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from common.image import open_for_detection
+from common.phash import NearDuplicateIndex, dhash, hamming
+
+DEFAULT_IMAGES = ["tests/group_of_people.jpg"]
+INDEX_SIZE = 4096
+
+
+def _encode(image: Image.Image, fmt: str, **kwargs: object) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def _scaled(image: Image.Image, scale: float) -> Image.Image:
+    return image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.LANCZOS)
+
+
+def near_duplicates(image: Image.Image) -> dict[str, bytes]:
+    return {
+        "resaved, no EXIF": _encode(image, "JPEG", quality=95),
+        "JPEG quality 30": _encode(image, "JPEG", quality=30),
+        "PNG": _encode(_scaled(image, 0.5), "PNG"),
+        "resized 50%": _encode(_scaled(image, 0.5), "JPEG", quality=85),
+        "resized 25%, q50": _encode(_scaled(image, 0.25), "JPEG", quality=50),
+        "resized 10%": _encode(_scaled(image, 0.1), "JPEG", quality=85),
+        "brightness +10%": _encode(ImageEnhance.Brightness(image).enhance(1.1), "JPEG", quality=85),
+    }
+
+
+def distinct_images(image: Image.Image) -> dict[str, bytes]:
+    width, height = image.size
+    return {
+        "mirrored": _encode(image.transpose(Image.Transpose.FLIP_LEFT_RIGHT), "JPEG"),
+        "upside down": _encode(image.transpose(Image.Transpose.FLIP_TOP_BOTTOM), "JPEG"),
+        "left half": _encode(image.crop((0, 0, width // 2, height)), "JPEG"),
+        "centre crop": _encode(image.crop((width // 4, height // 4, 3 * width // 4, 3 * height // 4)), "JPEG"),
+        "shifted 10%": _encode(image.crop((width // 10, 0, width, height)), "JPEG"),
+    }
+
+
+def _detect(content: bytes) -> tuple[tuple[int, int], list]:
+    from common.googlify import detect_faces
+
+    image, scale = open_for_detection(content, 640)
+    faces = detect_faces(np.asarray(image))
+    size = Image.open(BytesIO(content)).size
+    eyes = [[np.array(face.landmarks[name]) * scale for name in ("right_eye", "left_eye")] for face in faces]
+    return size, eyes
+
+
+def _eye_error_px(original: tuple[tuple[int, int], list], copy: tuple[tuple[int, int], list]) -> float:
+    """Worst distance from each eye detected on the copy to the nearest rescaled eye of the original"""
+    scale = copy[0][0] / original[0][0]
+    reused = np.array([eye * scale for face in original[1] for eye in face]).reshape(-1, 2)
+    fresh = np.array([eye for face in copy[1] for eye in face]).reshape(-1, 2)
+    if len(reused) == 0 or len(fresh) == 0:
+        return float("nan")
+    return float(np.linalg.norm(fresh[:, None] - reused[None], axis=-1).min(axis=1).max())
+
+
+def _hash(content: bytes) -> int | None:
+    return dhash(open_for_detection(content, 640)[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES)
+    parser.add_argument("--max-distance", type=int, default=6)
+    parser.add_argument("--skip-model", action="store_true", help="only report the hash distances")
+    args = parser.parse_args()
+
+    for path in args.images:
+        with open(path, "rb") as file:
+            content = file.read()
+        original_hash = _hash(content)
+        original = None if args.skip_model else _detect(content)
+        print(f"{path}: {Image.open(path).size}, hash {original_hash:016x}")
+        print(f"{'copy':>22} {'distance':>9} {'match':>6} {'eye error':>10}")
+        for name, copy in near_duplicates(Image.open(path)).items():
+            distance = hamming(original_hash, _hash(copy))
+            error = "" if original is None else f"{_eye_error_px(original, _detect(copy)):>7.1f} px"
+            print(f"{name:>22} {distance:>9} {'yes' if distance <= args.max_distance else 'NO':>6} {error:>10}")
+        for name, copy in distinct_images(Image.open(path)).items():
+            distance = hamming(original_hash, _hash(copy))
+            print(f"{name:>22} {distance:>9} {'FALSE' if distance <= args.max_distance else 'no':>6}")
+
+    rng = np.random.default_rng(0)
+    index: NearDuplicateIndex[int] = NearDuplicateIndex(max_distance=args.max_distance, maxsize=INDEX_SIZE)
+    for value, key in enumerate(rng.integers(0, 2**63, size=INDEX_SIZE)):
+        index.add(int(key), value)
+    queries = [int(key) for key in rng.integers(0, 2**63, size=100)]
+    lookup_us = min(timeit.repeat(lambda: [index.find(key) for key in queries], number=1, repeat=5)) * 1e4
+    print(f"lookup in an index of {INDEX_SIZE:,} random hashes: {lookup_us:.0f} µs")
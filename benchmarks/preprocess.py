@@ -0,0 +1,56 @@
+"""
+Benchmark per-request allocations and time of the preprocessing pipeline.
+
+Compares the original pipeline (defensive copy, PIL round-trip, float32 copy,
+mean subtraction and transpose, then concatenation into a batch) with the
+buffer-reusing one used by retinaface.detect, which writes straight into a
+per-thread NCHW buffer. Run from the repo root:
+
+    poetry run python -m benchmarks.preprocess [image]
+"""
+
+import argparse
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from benchmarks.timing import best_ms, peak_allocation_mb
+from retinaface.commons import preprocess
+
+DEFAULT_IMAGE = "tests/group_of_people.jpg"
+REPEATS = 20
+
+
+def _legacy(img: np.ndarray) -> np.ndarray:
+    img = img.copy()
+    im = ImageOps.pad(Image.fromarray(img), size=(640, 640), method=Image.Resampling.BILINEAR)
+    img = np.array(im).astype(np.float32)
+    img = img[:, :, ::-1]
+    img -= np.array([104.0, 117.0, 123.0], dtype=np.float32)
+    im_tensor = img.transpose(2, 0, 1)[np.newaxis, :, :, :]
+    return np.concatenate([im_tensor], axis=0)
+
+
+def _buffered(img: np.ndarray) -> np.ndarray:
+    img = preprocess.get_image(img, copy=False)
+    resized, _, _ = preprocess.resize_for_model(img, allow_upscaling=True)
+    im_tensor = preprocess.get_buffer((1, 3, 640, 640))
+    preprocess.write_tensor(resized, im_tensor[0])
+    return im_tensor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", default=DEFAULT_IMAGE)
+    args = parser.parse_args()
+
+    img = np.asarray(Image.open(args.image).convert("RGB"))
+    np.testing.assert_array_equal(_legacy(img), _buffered(img))
+
+    print(f"Input {img.shape[1]}×{img.shape[0]} ({img.nbytes / 1e6:.1f} MB)")
+    print(f"{'pipeline':>10} {'time':>10} {'peak alloc':>12}")
+    for name, fn in [("legacy", _legacy), ("buffered", _buffered)]:
+        ms = best_ms(lambda: fn(img), REPEATS)
+        # Warmed up, to leave out the per-thread buffer
+        peak_mb = peak_allocation_mb(lambda: fn(img), warm_up=True)
+        print(f"{name:>10} {ms:>7.1f} ms {peak_mb:>9.1f} MB")
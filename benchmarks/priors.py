@@ -0,0 +1,68 @@
+"""
+Benchmark prior (anchor) generation, which used to run at import time.
+
+Compares the original nested Python loop with the vectorised NumPy generator and
+the memory-mapped .npy artefact shipped next to the model, and measures the
+cold-start cost of importing retinaface.detect and building the 640×640 priors
+in a fresh interpreter. Run from the repo root:
+
+    poetry run python -m benchmarks.priors
+"""
+
+import math
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.timing import best_ms
+from retinaface.commons.priors import generate_priors, load_priors, priors_path, save_priors
+
+MIN_SIZES = [[16, 32], [64, 128], [256, 512]]
+STEPS = [8, 16, 32]
+IMAGE_SIZE = (640, 640)
+REPEATS = 20
+
+
+def _loop_priors(image_size: tuple[int, int]) -> np.ndarray:
+    im_height, im_width = image_size
+    priors = []
+    for min_sizes, step in zip(MIN_SIZES, STEPS):
+        for i in range(math.ceil(im_height / step)):
+            for j in range(math.ceil(im_width / step)):
+                for min_size in min_sizes:
+                    cx = (j + 0.5) * step / im_width
+                    cy = (i + 0.5) * step / im_height
+                    priors.append([cx, cy, min_size / im_width, min_size / im_height])
+    return np.array(priors, dtype=np.float32)
+
+
+def _cold_start_ms(code: str) -> float:
+    runs = []
+    for _ in range(5):
+        out = subprocess.run(
+            [sys.executable, "-c", f"import time; t=time.perf_counter(); {code}; print(time.perf_counter()-t)"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(float(out.stdout) * 1000)
+    return min(runs)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = priors_path(tmp, IMAGE_SIZE)
+        save_priors(path, generate_priors(MIN_SIZES, STEPS, IMAGE_SIZE))
+
+        print(f"Priors for {IMAGE_SIZE[0]}×{IMAGE_SIZE[1]} (best of {REPEATS}):")
+        print(f"  nested loop:     {best_ms(lambda: _loop_priors(IMAGE_SIZE), REPEATS):8.3f} ms")
+        print(f"  vectorised:      {best_ms(lambda: generate_priors(MIN_SIZES, STEPS, IMAGE_SIZE), REPEATS):8.3f} ms")
+        print(f"  memory-mapped:   {best_ms(lambda: load_priors(path), REPEATS):8.3f} ms")
+
+    print("Import retinaface.detect and build the 640×640 priors in a fresh interpreter (best of 5):")
+    old = "import retinaface.detect; import benchmarks.priors as b; b._loop_priors((640, 640))"
+    new = "import retinaface.detect as d; import benchmarks.priors; d._generate_priors((640, 640))"
+    print(f"  nested loop (previous import-time behaviour): {_cold_start_ms(old):8.1f} ms")
+    print(f"  retinaface.detect._generate_priors:           {_cold_start_ms(new):8.1f} ms")
@@ -0,0 +1,103 @@
+"""
+Compare the INT8 RetinaFace model against the float32 reference.
+
+For every image in a folder, both models are run through retinaface.detect and
+the faces are matched by IoU. The report gives the inference speed-up, the box
+IoU and the landmark error in original-image pixels. The thresholds act as an
+accuracy gate: the script exits non-zero if the quantised model misses faces,
+or its boxes or landmarks drift too far. Run from the repo root:
+
+    poetry run python -m benchmarks.quantization path/to/images
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import onnxruntime
+from PIL import Image
+
+from common.backends import model_path
+from retinaface import detect
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MATCH_IOU = 0.5
+
+
+class _TimedSession:
+    def __init__(self, path: str):
+        self.session = onnxruntime.InferenceSession(path)
+        self.seconds: list[float] = []
+
+    def __call__(self, X: np.ndarray) -> list[np.ndarray]:
+        start = time.perf_counter()
+        out = self.session.run(["bbox", "cls", "ldm"], {"input": X})
+        self.seconds.append(time.perf_counter() - start)
+        return out
+
+
+def _iou(a: list[float], b: list[float]) -> float:
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _landmark_error(a: dict[str, list[float]], b: dict[str, list[float]]) -> float:
+    return max(float(np.linalg.norm(np.subtract(a[name], b[name]))) for name in a)
+
+
+def _image_paths(image_dir: str) -> list[str]:
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_dir", nargs="?", default="tests")
+    parser.add_argument("--reference", default=model_path("fp32"))
+    parser.add_argument("--candidate", default=model_path("int8"))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-iou", type=float, default=0.8, help="gate on the mean box IoU of matched faces")
+    parser.add_argument("--max-landmark-error", type=float, default=8.0, help="gate on the worst landmark error (px)")
+    args = parser.parse_args()
+
+    reference, candidate = _TimedSession(args.reference), _TimedSession(args.candidate)
+    ious, landmark_errors, missed, extra = [], [], 0, 0
+    for path in _image_paths(args.image_dir):
+        img = np.asarray(Image.open(path).convert("RGB"))
+        for _ in range(args.repeats):
+            expected = detect.detect_faces(img, model=reference)
+            got = detect.detect_faces(img, model=candidate)
+
+        unmatched = list(got)
+        for face in expected:
+            scores = [_iou(face["facial_area"], other["facial_area"]) for other in unmatched]
+            if not scores or max(scores) < MATCH_IOU:
+                missed += 1
+                continue
+            match = unmatched.pop(int(np.argmax(scores)))
+            ious.append(max(scores))
+            landmark_errors.append(_landmark_error(face["landmarks"], match["landmarks"]))
+        extra += len(unmatched)
+
+    reference_ms = np.median(reference.seconds) * 1000
+    candidate_ms = np.median(candidate.seconds) * 1000
+    print(f"Reference {args.reference}: {reference_ms:.1f} ms median inference")
+    print(f"Candidate {args.candidate}: {candidate_ms:.1f} ms median inference ({reference_ms / candidate_ms:.2f}x)")
+    print(f"Matched faces: {len(ious)}, missed: {missed}, extra: {extra}")
+    if ious:
+        print(f"Box IoU: mean {np.mean(ious):.3f}, min {np.min(ious):.3f}")
+        print(f"Landmark error: mean {np.mean(landmark_errors):.2f} px, max {np.max(landmark_errors):.2f} px")
+
+    passed = (
+        missed == 0
+        and (not ious or np.mean(ious) >= args.min_iou)
+        and (not landmark_errors or np.max(landmark_errors) <= args.max_landmark_error)
+    )
+    print("Accuracy gate:", "PASS" if passed else "FAIL")
+    sys.exit(0 if passed else 1)
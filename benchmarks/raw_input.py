@@ -0,0 +1,61 @@
+"""
+Benchmark the raw-input model against NumPy preprocessing plus the plain model.
+
+Both pipelines run detection end to end on the same decoded image. The raw-input
+model (retinaface/raw_input.py) is built into a temporary directory when
+retinaface.raw.onnx is missing. Reports latency and the peak Python-side
+allocation of each. Run from the repo root:
+
+    poetry run python -m benchmarks.raw_input [image_path] [--threads N]
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+
+from benchmarks.timing import best_ms, peak_allocation_mb
+from common.backends import model_path
+from retinaface import detect
+
+DEFAULT_IMAGE = "tests/group_of_people.jpg"
+REPEATS = 20
+
+
+def _session(path: str, threads: int) -> ort.InferenceSession:
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", default=DEFAULT_IMAGE)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    img = np.asarray(Image.open(args.image).convert("RGB"))
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = model_path("raw")
+        if not os.path.exists(raw_path):
+            from retinaface.raw_input import export_raw_input
+
+            raw_path = os.path.join(tmp, "retinaface.raw.onnx")
+            export_raw_input(model_path("fp32"), raw_path)
+        plain = _session(model_path("fp32"), args.threads)
+        raw = _session(raw_path, args.threads)
+
+    pipelines = {
+        "numpy": lambda: detect.detect_faces(img, model=lambda X: plain.run(["bbox", "cls", "ldm"], {"input": X})),
+        "in-graph": lambda: detect.detect_faces_raw(
+            img, model=lambda image: raw.run(["bbox", "cls", "ldm"], {"image": image})
+        ),
+    }
+    print(f"Input {img.shape[1]}×{img.shape[0]}, {args.threads} ORT threads")
+    print(f"{'pipeline':>10} {'faces':>6} {'time':>10} {'peak alloc':>12}")
+    for name, fn in pipelines.items():
+        faces = fn()
+        print(f"{name:>10} {len(faces):>6} {best_ms(fn, REPEATS):>7.1f} ms {peak_allocation_mb(fn):>9.1f} MB")
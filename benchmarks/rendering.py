@@ -0,0 +1,74 @@
+"""
+Benchmark the sprite eye renderer against drawing each face with ImageDraw.
+
+Faces of random sizes are scattered over a 12MP image, as in a crowd photo,
+and single faces with eyes 100 to 3000px apart, as in portraits. The
+reference is add_googly_eyes called once per face. The sprite renderer
+computes the geometry for all faces at once and pastes cached, anti-aliased
+sprites (common.drawing.render_googly_eyes). Cold times start from an empty
+sprite cache, as for the first request of a worker; warm times are the best
+of 10 runs. Run from the repo root:
+
+    poetry run python -m benchmarks.rendering
+"""
+
+import typing as t
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.timing import best_ms
+from common.drawing import _sprites, add_googly_eyes, googly_eyes_for_faces, render_googly_eyes
+from common.face import Face
+
+FACE_COUNTS = [1, 10, 100, 400]
+PORTRAIT_EYE_DISTANCES = [100, 800, 3000]
+IMAGE_SIZE = (4000, 3000)
+EYE_SIZE = 0.5
+PUPIL_SIZE_RANGE = (0.4, 0.6)
+WARM_REPEATS = 10
+
+
+def _crowd(n: int, seed: int = 0) -> list[Face]:
+    rng = np.random.default_rng(seed)
+    faces = []
+    for x, y, distance in zip(
+        rng.uniform(50, IMAGE_SIZE[0] - 50, n), rng.uniform(50, IMAGE_SIZE[1] - 50, n), rng.uniform(8, 60, n)
+    ):
+        box = [x - distance, y - distance, x + distance, y + distance]
+        eyes = {"right_eye": [x - distance / 2, y], "left_eye": [x + distance / 2, y]}
+        faces.append(Face(score=1.0, bounding_box=box, landmarks=eyes))
+    return faces
+
+
+def _portrait(eye_distance: float) -> list[Face]:
+    x, y = IMAGE_SIZE[0] / 2, IMAGE_SIZE[1] / 2
+    box = [x - eye_distance, y - eye_distance, x + eye_distance, y + eye_distance]
+    eyes = {"right_eye": [x - eye_distance / 2, y], "left_eye": [x + eye_distance / 2, y]}
+    return [Face(score=1.0, bounding_box=box, landmarks=eyes)]
+
+
+def _cold_ms(fn: t.Callable[..., t.Any]) -> float:
+    _sprites.clear()
+    return best_ms(fn, repeat=1)
+
+
+if __name__ == "__main__":
+    image = Image.new("RGB", IMAGE_SIZE, color=(120, 130, 140))
+    cases = [(f"{n} faces", _crowd(n)) for n in FACE_COUNTS]
+    cases += [(f"{distance}px eyes", _portrait(distance)) for distance in PORTRAIT_EYE_DISTANCES]
+    print(f"{'case':>12} {'ImageDraw':>12} {'sprites cold':>14} {'sprites warm':>14}")
+    for name, faces in cases:
+
+        def draw() -> None:
+            for face in faces:
+                add_googly_eyes(image, face, eye_size=EYE_SIZE, pupil_size_range=PUPIL_SIZE_RANGE)
+
+        def render() -> None:
+            eyes = googly_eyes_for_faces(faces, eye_size=EYE_SIZE, pupil_size_range=PUPIL_SIZE_RANGE)
+            render_googly_eyes(image, eyes)
+
+        reference = best_ms(draw, WARM_REPEATS)
+        cold = _cold_ms(render)
+        warm = best_ms(render, WARM_REPEATS)
+        print(f"{name:>12} {reference:>9.2f} ms {cold:>11.2f} ms {warm:>11.2f} ms")
@@ -0,0 +1,75 @@
+"""
+Benchmark the ONNX Runtime session profiles in common.session.
+
+For each profile this reports the session load time, both cold (optimising
+the graph) and warm (reusing the persisted optimised graph). It also reports
+single-stream latency, and throughput with one session per worker thread.
+Run from the repo root:
+
+    poetry run python -m benchmarks.session [--workers N]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import onnxruntime
+
+from benchmarks.timing import timed_ms
+from common.backends import model_path
+from common.session import PROFILES, create_session
+
+REQUESTS = 50
+
+
+def _load_ms(profile: str, cache_dir: str) -> float:
+    start = time.perf_counter()
+    create_session(model_path("fp32"), profile=profile, cache_dir=cache_dir)
+    return (time.perf_counter() - start) * 1000
+
+
+def _latency_ms(profile: str, cache_dir: str, X: np.ndarray) -> tuple[float, float]:
+    session = create_session(model_path("fp32"), profile=profile, cache_dir=cache_dir)
+    session.run(None, {"input": X})
+    times = timed_ms(lambda: session.run(None, {"input": X}), REQUESTS)
+    return float(np.percentile(times, 50)), float(np.percentile(times, 95))
+
+
+def _throughput(profile: str, cache_dir: str, X: np.ndarray, workers: int) -> float:
+    sessions = [create_session(model_path("fp32"), profile=profile, cache_dir=cache_dir) for _ in range(workers)]
+    for session in sessions:
+        session.run(None, {"input": X})
+
+    def work(session: onnxruntime.InferenceSession) -> None:
+        for _ in range(REQUESTS // workers + 1):
+            session.run(None, {"input": X})
+
+    threads = [threading.Thread(target=work, args=(session,)) for session in sessions]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return workers * (REQUESTS // workers + 1) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    X = np.random.default_rng(0).normal(0, 50, size=(1, 3, 640, 640)).astype(np.float32)
+    print(f"{args.workers} workers for the throughput column")
+    print(f"{'profile':>10} {'cold load':>10} {'warm load':>10} {'p50':>9} {'p95':>9} {'throughput':>12}")
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold = _load_ms(profile, cache_dir)
+            warm = _load_ms(profile, cache_dir)
+            p50, p95 = _latency_ms(profile, cache_dir, X)
+            throughput = _throughput(profile, cache_dir, X, args.workers)
+        print(
+            f"{profile:>10} {cold:>7.0f} ms {warm:>7.0f} ms {p50:>6.1f} ms {p95:>6.1f} ms {throughput:>7.1f} img/s"
+        )
@@ -0,0 +1,39 @@
+"""Timing and allocation helpers shared by the benchmark scripts"""
+
+import time
+import timeit
+import tracemalloc
+import typing as t
+
+
+def best_ms(fn: t.Callable[..., t.Any], repeat: int) -> float:
+    """Fastest of repeat calls of fn, in ms"""
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def timed_ms(fn: t.Callable[..., t.Any], repeat: int) -> list[float]:
+    """Duration of each of repeat calls of fn, in ms, for percentiles"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def peak_allocation_mb(fn: t.Callable[..., t.Any], warm_up: bool = False) -> float:
+    """
+    Peak Python-visible allocation of one call of fn, in MB
+    Args:
+        fn (callable): called without arguments
+        warm_up (bool): call fn once untraced first, e.g. to leave out buffers that are allocated once per thread
+    Returns
+        peak traced allocation
+    """
+    if warm_up:
+        fn()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
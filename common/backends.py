@@ -0,0 +1,117 @@
+import os
+import typing as t
+from dataclasses import dataclass
+
+import numpy as np
+import onnxruntime
+
+from common.session import create_session, session_options
+from retinaface import detect
+
+# Maps a (batch, 3, H, W) float32 tensor to the raw [bbox, cls, ldm] outputs
+Model = t.Callable[[np.ndarray], list[np.ndarray]]
+
+# Exported model files, selected with the RETINAFACE_MODEL_VARIANT environment variable
+MODEL_VARIANTS = {
+    "fp32": "retinaface.onnx",
+    "int8": "retinaface.int8.onnx",  # see retinaface/quantize_model.py
+    "e2e": "retinaface.e2e.onnx",  # see retinaface/end_to_end.py
+    "raw": "retinaface.raw.onnx",  # see retinaface/raw_input.py
+    "resnet50": "retinaface.resnet50.onnx",  # see retinaface/convert_model.py --backbone resnet50
+}
+
+# Anchor config of each variant's model, where it is not MobileNet0.25
+_VARIANT_ANCHORS = {"resnet50": detect.RESNET50}
+
+# Selected with the INFERENCE_BACKEND environment variable
+BACKENDS = ("onnx", "torchscript", "torch-compile")
+
+TORCHSCRIPT_FILE = "retinaface.torchscript.pt"  # see retinaface/convert_model.py --torchscript
+
+
+def model_path(variant: str) -> str:
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant {variant!r}, expected one of {sorted(MODEL_VARIANTS)}.")
+    return os.path.join(os.path.dirname(detect.__file__), MODEL_VARIANTS[variant])
+
+
+@dataclass(frozen=True)
+class Backend:
+    name: str
+    model: Model
+    # Whether the model accepts any input height/width (a multiple of 32), rather than only its export size
+    dynamic_input: bool
+    # Prior layout and input size to decode the outputs with
+    anchors: detect.AnchorConfig = detect.MOBILENET
+    # The underlying ONNX Runtime session, for variants whose inputs/outputs differ from Model
+    session: onnxruntime.InferenceSession | None = None
+
+
+def _onnx(variant: str, profile: str) -> Backend:
+    session = create_session(model_path(variant), profile=profile)
+
+    def model(X: np.ndarray) -> list[np.ndarray]:
+        return session.run(["bbox", "cls", "ldm"], {"input": X})
+
+    dynamic_input = not all(isinstance(dim, int) for dim in session.get_inputs()[0].shape[2:])
+    anchors = _VARIANT_ANCHORS.get(variant, detect.MOBILENET)
+    return Backend(name="onnx", model=model, dynamic_input=dynamic_input, anchors=anchors, session=session)
+
+
+def _torch_model(net: t.Callable[..., t.Any], profile: str) -> Model:
+    import torch
+
+    threads = session_options(profile).intra_op_num_threads
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+    def model(X: np.ndarray) -> list[np.ndarray]:
+        with torch.inference_mode():
+            return [output.numpy() for output in net(torch.from_numpy(X))]
+
+    return model
+
+
+def _torchscript(profile: str) -> Backend:
+    import torch
+
+    path = os.path.join(os.path.dirname(detect.__file__), TORCHSCRIPT_FILE)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{path} not found, export it with retinaface/convert_model.py --torchscript.")
+    net = torch.jit.load(path, map_location="cpu")
+    # Traced at 640×640, so the FPN upsampling sizes are fixed
+    return Backend(name="torchscript", model=_torch_model(net, profile), dynamic_input=False)
+
+
+def _torch_compile(profile: str) -> Backend:
+    import torch
+    from huggingface_hub import hf_hub_download
+
+    from retinaface.convert_model import WEIGHTS_FILE, WEIGHTS_REPO, load_model
+
+    net = torch.compile(load_model(hf_hub_download(repo_id=WEIGHTS_REPO, filename=WEIGHTS_FILE)))
+    # Each new input shape triggers a recompile, so stick to the letterboxed 640×640 input
+    return Backend(name="torch-compile", model=_torch_model(net, profile), dynamic_input=False)
+
+
+def load_backend(name: str = "onnx", variant: str = "fp32", profile: str = "default") -> Backend:
+    """
+    Load an inference backend
+    All backends return the same [bbox, cls, ldm] outputs, except the ONNX "e2e" and "raw" variants,
+    which are used through Backend.session.
+    Args:
+        name (str): one of BACKENDS. The torch backends need the dev dependencies.
+        variant (str): ONNX model variant, see MODEL_VARIANTS. Only "fp32" is available to the torch backends.
+        profile (str): tuning profile, see common.session.session_options. The torch backends take its thread count.
+    Returns
+        backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {list(BACKENDS)}.")
+    if name == "onnx":
+        return _onnx(variant, profile)
+    if variant != "fp32":
+        raise ValueError(f"Model variant {variant!r} is only available with the onnx backend.")
+    if name == "torchscript":
+        return _torchscript(profile)
+    return _torch_compile(profile)
@@ -1,35 +1,224 @@
+import math
+import threading
 import typing as t
+from collections import OrderedDict
+from dataclasses import dataclass
 
 import numpy as np
 from PIL import Image, ImageDraw
 
 from common.face import Face
+from common.image import to_rgb
+
+
+@dataclass
+class GooglyEye:
+    centre: list[float]
+    radius: float
+    # Pupil centre relative to the eye centre
+    pupil_offset: list[float]
+    pupil_radius: float
 
 
 def plot_circle(draw: ImageDraw, xy: t.Sequence[float], radius: float, **kwargs: t.Any) -> None:
     draw.ellipse((xy[0] - radius, xy[1] - radius, xy[0] + radius, xy[1] + radius), **kwargs)
 
 
-def add_googly_eyes(image: Image, face: Face, eye_size: float, pupil_size_range: tuple[float, float]) -> None:
-    draw = ImageDraw.Draw(image)
-    radius = 0.5 * float(np.linalg.norm(np.array(face.landmarks["right_eye"]) - np.array(face.landmarks["left_eye"])))
-
-    def plot_googly_eye(eye: list[float]) -> None:
-        pupil_size = eye_size * np.random.uniform(pupil_size_range[0], pupil_size_range[1])
-        plot_circle(
-            draw,
-            eye,
-            radius=eye_size * radius,
-            fill=(255, 255, 255, 255),
-            outline=(0, 0, 0, 255),
-        )
-        orientation = np.random.uniform(0, np.pi)
-        plot_circle(
-            draw,
-            np.array(eye) + (eye_size - pupil_size) * radius * np.array([np.sin(orientation), np.cos(orientation)]),
-            radius=pupil_size * radius,
-            fill=(0, 0, 0, 255),
+def googly_eyes_for_faces(
+    faces: t.Sequence[Face],
+    eye_size: float,
+    pupil_size_range: tuple[float, float],
+    rng: np.random.Generator | None = None,
+) -> list[GooglyEye]:
+    """
+    Place a googly eye over each eye of each face, with a randomly sized pupil rolled to a random side
+    Computed for all faces at once, as crowd photos have hundreds.
+    Args:
+        faces (sequence): detected faces
+        eye_size (float): eye radius relative to the eye-to-eye distance
+        pupil_size_range (tuple): range of the pupil radius relative to the eye radius
+        rng (Generator): source of the pupil sizes and orientations, seeded for reproducible eyes.
+            Defaults to a fresh, unseeded one.
+    Returns
+        right eye then left eye of each face
+    """
+    if not faces:
+        return []
+    centres = np.array([[face.landmarks["right_eye"], face.landmarks["left_eye"]] for face in faces], dtype=float)
+    radius = 0.5 * np.linalg.norm(centres[:, 0] - centres[:, 1], axis=-1)
+    radius = np.repeat(radius, 2)
+    centres = centres.reshape(-1, 2)
+    rng = np.random.default_rng() if rng is None else rng
+    pupil_size = eye_size * rng.uniform(pupil_size_range[0], pupil_size_range[1], size=len(centres))
+    orientation = rng.uniform(0, np.pi, size=len(centres))
+    offsets = ((eye_size - pupil_size) * radius)[:, None] * np.stack([np.sin(orientation), np.cos(orientation)], 1)
+    return [
+        GooglyEye(centre=centre, radius=eye_radius, pupil_offset=offset, pupil_radius=pupil_radius)
+        for centre, eye_radius, offset, pupil_radius in zip(
+            centres.tolist(), (eye_size * radius).tolist(), offsets.tolist(), (pupil_size * radius).tolist()
         )
+    ]
+
+
+def googly_eyes(
+    face: Face, eye_size: float, pupil_size_range: tuple[float, float], rng: np.random.Generator | None = None
+) -> list[GooglyEye]:
+    """Right and left googly eye of a face, see googly_eyes_for_faces"""
+    return googly_eyes_for_faces([face], eye_size=eye_size, pupil_size_range=pupil_size_range, rng=rng)
+
+
+def draw_googly_eye(draw: ImageDraw, eye: GooglyEye) -> None:
+    plot_circle(draw, eye.centre, radius=eye.radius, fill=(255, 255, 255, 255), outline=(0, 0, 0, 255))
+    plot_circle(draw, np.array(eye.centre) + eye.pupil_offset, radius=eye.pupil_radius, fill=(0, 0, 0, 255))
+
+
+def add_googly_eyes(
+    image: Image,
+    face: Face,
+    eye_size: float,
+    pupil_size_range: tuple[float, float],
+    rng: np.random.Generator | None = None,
+) -> None:
+    draw = ImageDraw.Draw(image)
+    for eye in googly_eyes(face, eye_size, pupil_size_range, rng=rng):
+        draw_googly_eye(draw, eye)
+
+
+# Sprites are rendered for radii rounded to this fraction of a pixel
+_SPRITE_RADIUS_STEP = 0.25
+
+# Circles larger than this are drawn with ImageDraw instead: a sprite's cost and size grow with the square of its
+# radius, while ImageDraw's jagged edges are only noticeable on small circles
+_SPRITE_MAX_RADIUS = 64
+
+# Bytes of sprites kept, evicting the least recently used. A sprite of the largest radius takes about 70 kB.
+_SPRITE_CACHE_BYTES = 16 * 2**20
+
+# Modes that render_googly_eyes pastes sprites into; others are converted to one of them first, see drawable_image
+_SPRITE_MODES = ("RGB", "RGBA")
+
+
+def _render_sprite(radius: float, pupil: bool, supersample: int, mode: str) -> tuple[Image.Image, Image.Image]:
+    """
+    Anti-aliased eye (white with a black outline) or pupil (black), centred in a square of odd size
+    Drawn at supersample times the size and box-filtered down, so the edges get fractional coverage.
+    Returns
+        colour in the given mode, and the coverage as an "L" paste mask
+    """
+    half = math.ceil(radius) + 1
+    size = 2 * half + 1
+    canvas = Image.new("RGBA", (size * supersample, size * supersample), (0, 0, 0, 0))
+    centre, scaled = (half + 0.5) * supersample, radius * supersample
+    box = (centre - scaled, centre - scaled, centre + scaled, centre + scaled)
+    if pupil:
+        ImageDraw.Draw(canvas).ellipse(box, fill=(0, 0, 0, 255))
+    else:
+        ImageDraw.Draw(canvas).ellipse(box, fill=(255, 255, 255, 255), outline=(0, 0, 0, 255), width=supersample)
+
+    # Average the premultiplied colour, so the edge colour isn't darkened by the transparent black around it
+    rgba = np.asarray(canvas, dtype=np.float32) / 255
+    rgba[..., :3] *= rgba[..., 3:]
+    rgba = rgba.reshape(size, supersample, size, supersample, 4).mean(axis=(1, 3))
+    alpha = rgba[..., 3:]
+    rgb = np.divide(rgba[..., :3], alpha, out=np.zeros_like(rgba[..., :3]), where=alpha > 0)
+    colour = Image.fromarray(np.round(rgb * 255).astype(np.uint8), "RGB").convert(mode)
+    return colour, Image.fromarray(np.round(alpha[..., 0] * 255).astype(np.uint8), "L")
+
+
+class _SpriteCache:
+    """Thread-safe LRU cache of sprites, bounded by their bytes rather than their number"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._sprites: OrderedDict[tuple, tuple[Image.Image, Image.Image]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, radius: float, pupil: bool, supersample: int, mode: str) -> tuple[Image.Image, Image.Image]:
+        key = (radius, pupil, supersample, mode)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+        sprite = _render_sprite(radius, pupil, supersample, mode)
+        with self._lock:
+            if key not in self._sprites:
+                self._sprites[key] = sprite
+                self.bytes += sum(len(image.getbands()) * image.width * image.height for image in sprite)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._sprites.popitem(last=False)
+                self.bytes -= sum(len(image.getbands()) * image.width * image.height for image in evicted)
+        return sprite
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sprites.clear()
+            self.bytes = self.hits = self.misses = 0
+
+
+_sprites = _SpriteCache(_SPRITE_CACHE_BYTES)
+
+
+def drawable_image(image: Image) -> Image:
+    """
+    The image in a mode that render_googly_eyes draws into directly: RGBA if it has transparency, otherwise RGB
+    Args:
+        image (Image): image in any mode, e.g. a greyscale or CMYK JPEG, or a 16-bit PNG
+    Returns
+        the image itself if already RGB or RGBA, otherwise a converted copy with the same format and info
+    """
+    return image if image.mode in _SPRITE_MODES else to_rgb(image)
+
+
+def render_googly_eyes(image: Image, eyes: t.Sequence[GooglyEye], supersample: int = 4) -> None:
+    """
+    Draw googly eyes in place, pasting pre-rendered anti-aliased sprites
+    Sprites are rendered once per radius (rounded to _SPRITE_RADIUS_STEP) and cached, so supersampling costs
+    nothing per eye, and eye centres are rounded to whole pixels. Circles larger than _SPRITE_MAX_RADIUS are
+    drawn with ImageDraw.
+    Args:
+        image (Image): image to draw on. Other modes than RGB and RGBA are drawn on a copy from drawable_image and
+            converted back, which is lossy for palette and 16-bit images: convert those with drawable_image first.
+        eyes (sequence): eyes to draw, in order
+        supersample (int): anti-aliasing factor; 1 gives hard edges like ImageDraw
+    """
+    if not eyes:
+        return
+    if image.mode not in _SPRITE_MODES:
+        converted = drawable_image(image)
+        render_googly_eyes(converted, eyes, supersample)
+        image.paste(converted.convert(image.mode))
+        return
+
+    # Each eye, then its pupil
+    centres = np.array([[eye.centre, np.add(eye.centre, eye.pupil_offset)] for eye in eyes]).reshape(-1, 2)
+    exact_radii = np.array([[eye.radius, eye.pupil_radius] for eye in eyes]).reshape(-1)
+    radii = np.round(exact_radii / _SPRITE_RADIUS_STEP) * _SPRITE_RADIUS_STEP
+    corners = np.round(centres).astype(np.int64) - (np.ceil(radii).astype(np.int64) + 1)[:, None]
+    pupil = np.tile([False, True], len(eyes))
+    draw = None
+    for i, (radius, is_pupil, (x, y)) in enumerate(zip(radii.tolist(), pupil.tolist(), corners.tolist())):
+        if radius > _SPRITE_MAX_RADIUS:
+            draw = draw or ImageDraw.Draw(image)
+            if is_pupil:
+                plot_circle(draw, centres[i], radius=exact_radii[i], fill=(0, 0, 0, 255))
+            else:
+                plot_circle(draw, centres[i], radius=exact_radii[i], fill=(255, 255, 255, 255), outline=(0, 0, 0, 255))
+            continue
+        colour, mask = _sprites.get(radius, is_pupil, supersample, image.mode)
+        image.paste(colour, (x, y), mask)
+
 
-    plot_googly_eye(face.landmarks["right_eye"])
-    plot_googly_eye(face.landmarks["left_eye"])
+def composite_googly_eyes(image: Image, eyes: t.Iterable[GooglyEye | dict[str, t.Any]]) -> None:
+    """
+    Draw the eyes of an overlay response (response_mode "overlay") onto the client's copy of the image, in place
+    Args:
+        image (Image): the uploaded image, before any EXIF transpose, as the eye coordinates are in its pixels
+        eyes (iterable): GooglyEye, or their dicts from the JSON response
+    """
+    render_googly_eyes(image, [eye if isinstance(eye, GooglyEye) else GooglyEye(**eye) for eye in eyes])
@@ -1,44 +1,561 @@
+import functools
+import hashlib
 import os
+import secrets
+import time
 import typing as t
-from dataclasses import asdict
+from dataclasses import asdict, replace
 
 import numpy as np
-import onnxruntime
+from PIL import Image
 
-from common.drawing import add_googly_eyes
+from common.backends import Backend, load_backend, model_path
+from common.cache import TTLCache
+from common.drawing import GooglyEye, drawable_image, googly_eyes_for_faces, render_googly_eyes
 from common.face import Face
-from common.image import deserialize_image, serialize_image
+from common.image import (
+    decode_base64,
+    encode_base64,
+    get_image_from_bytes,
+    mimetype,
+    open_for_detection,
+    output_format,
+    put_image_into_buffer,
+)
+from common.payload import DETECTION_MODES, MODEL_TIERS, accepts
+from common.phash import NearDuplicateIndex, dhash
+from common.store import DetectionStore
 from retinaface import detect
+from retinaface.commons import preprocess
+
+_PROFILE = os.environ.get("ORT_SESSION_PROFILE", "default")
+
+_BACKEND_NAME = os.environ.get("INFERENCE_BACKEND", "onnx")
+_VARIANT = os.environ.get("RETINAFACE_MODEL_VARIANT", "fp32")
+
+# The "fast" tier
+_backend = load_backend(_BACKEND_NAME, variant=_VARIANT, profile=_PROFILE)
+_session = _backend.session
+
+# Models exported with dynamic height/width can run at the image's own aspect ratio
+_KEEP_ASPECT_RATIO = _backend.dynamic_input
+
+# End-to-end models return the final faces, with decoding and NMS done in-graph
+_END_TO_END = _session is not None and "boxes" in {output.name for output in _session.get_outputs()}
+
+# Raw-input models take the decoded uint8 image and letterbox/normalise it in-graph
+_RAW_INPUT = _session is not None and _session.get_inputs()[0].type == "tensor(uint8)"
+
+# Images with more pixels than this are detected in full-resolution tiles, to find small faces (0: never)
+_TILE_ABOVE_PIXELS = int(os.environ.get("TILED_DETECTION_MIN_PIXELS", 0)) or None
+
+# Raw responses are encoded in this format (see common.image.OUTPUT_FORMATS) when the request doesn't ask for one
+# and its Accept header lists the format's MIME type, e.g. WEBP for smaller responses to browsers
+_PREFERRED_OUTPUT_FORMAT = os.environ.get("PREFERRED_OUTPUT_FORMAT") or None
+if _PREFERRED_OUTPUT_FORMAT is not None:
+    _PREFERRED_OUTPUT_FORMAT = output_format(_PREFERRED_OUTPUT_FORMAT)
+
+# Detects the faces in an image for a detection mode and model tier, like detect_faces
+Detector = t.Callable[..., list[Face]]
+
+# "image" returns the result image; "overlay" returns only the googly eye geometry, for the client to draw
+RESPONSE_MODES = ("image", "overlay")
+
+# Requests without a model_tier use the accurate tier for images with a longer side than this, which lose
+# small faces in the fast model's 640px letterbox, unless its recent latency exceeds the request's budget
+_ACCURATE_MIN_SIDE = int(os.environ.get("ACCURATE_TIER_MIN_SIDE", 1280))
+_LATENCY_BUDGET_MS = float(os.environ.get("MODEL_TIER_LATENCY_BUDGET_MS", 1000))
 
-_session = onnxruntime.InferenceSession(
-    os.path.join(os.path.dirname(detect.__file__), "retinaface.onnx")
+# Moving average of the detection latency of each tier and detection mode, with the newest sample weighted by
+# _LATENCY_SMOOTHING. Runs at full resolution count per megapixel of the image, as their cost grows with it.
+_LATENCY_SMOOTHING = 0.2
+# An average decays by half every this many seconds, so that a tier ruled out by a slow spell, which gets no new
+# samples while it's ruled out, is tried again
+_LATENCY_HALF_LIFE_S = float(os.environ.get("MODEL_TIER_LATENCY_HALF_LIFE_S", 60))
+_tier_latency: dict[tuple[str, str], tuple[float, float]] = {}  # (tier, mode) -> (average, time.monotonic())
+
+# Faces detected in recent uploads, keyed on the upload's content hash, model tier and detection mode, so that
+# redrawing an upload with other eye options skips decoding and detection
+_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 600))
+_detection_cache: TTLCache[tuple, list[Face]] = TTLCache(
+    int(os.environ.get("DETECTION_CACHE_SIZE", 256)), ttl=_CACHE_TTL_SECONDS
+)
+
+# Encoded results of seeded requests, which are deterministic, keyed on the detection key plus the drawing and
+# encoding options. Kept smaller, as each entry is a whole encoded image.
+_render_cache: TTLCache[tuple, tuple[bytes, str, dict[str, t.Any]]] = TTLCache(
+    int(os.environ.get("RENDER_CACHE_SIZE", 32)), ttl=_CACHE_TTL_SECONDS
 )
 
+# Detections persisted under this directory, shared by all worker processes and kept across restarts (unset: off)
+_STORE_DIR = os.environ.get("DETECTION_STORE_DIR") or None
+_detection_store = (
+    DetectionStore(_STORE_DIR, max_bytes=int(float(os.environ.get("DETECTION_STORE_MAX_MB", 256)) * 2**20))
+    if _STORE_DIR
+    else None
+)
+
+# warm_detection_store writes its detections in one transaction per this many images
+_WARM_UP_BATCH = 256
+
+# Re-encoded, resized or re-saved copies of a recent upload reuse its faces, rescaled, instead of running the model
+# again. Uploads match when their dHashes (see common.phash) differ in at most this many of their 64 bits (-1: off).
+# Copies measured within 2 bits of the original, and crops, flips and other photos 16 or more.
+_NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", 6))
+_NEAR_DUPLICATE_INDEX_SIZE = int(os.environ.get("NEAR_DUPLICATE_INDEX_SIZE", 4096))
+
+# Copies must keep the aspect ratio to within this fraction, so that a crop close to its original never matches
+_NEAR_DUPLICATE_ASPECT_TOLERANCE = 0.01
+
+# One index of (image size, faces) per model tier and detection mode
+_near_duplicates: dict[tuple[str, str], NearDuplicateIndex[tuple[tuple[int, int], list[Face]]]] = {}
+
 
 def _model(X: np.ndarray) -> list[np.ndarray]:
-    return _session.run(["bbox", "cls", "ldm"], {"input": X})
+    return _backend.model(X)
+
+
+def _model_end_to_end(X: np.ndarray, threshold: float) -> list[np.ndarray]:
+    return _session.run(
+        ["batch_index", "boxes", "scores", "landmarks"],
+        {"input": X, "score_threshold": np.array([threshold], dtype=np.float32)},
+    )
+
+
+def _model_raw(image: np.ndarray) -> list[np.ndarray]:
+    return _session.run(["bbox", "cls", "ldm"], {"image": image})
+
+
+@functools.lru_cache(maxsize=None)
+def _accurate_backend() -> Backend | None:
+    if not os.path.isfile(model_path("resnet50")):
+        return None
+    return load_backend("onnx", variant="resnet50", profile=_PROFILE)
+
+
+def _tier_backend(tier: str) -> Backend:
+    return (_accurate_backend() if tier == "accurate" else None) or _backend
+
+
+def available_tier(tier: str) -> str:
+    """The tier serving requests for the given one: "accurate" falls back to "fast" if its model is missing."""
+    if tier not in MODEL_TIERS:
+        raise ValueError(f"Unknown model tier {tier!r}, expected one of {list(MODEL_TIERS)}.")
+    if tier == "accurate" and _accurate_backend() is None:
+        return "fast"
+    return tier
+
+
+def choose_tier(image_shape: tuple[int, ...], latency_budget_ms: float | None = None, mode: str = "standard") -> str:
+    """
+    Default tier for an image: only large images, where the fast model misses small faces, pay for the accurate one
+    Args:
+        image_shape (tuple): image height and width
+        latency_budget_ms (float): maximum acceptable detection latency, defaulting to $MODEL_TIER_LATENCY_BUDGET_MS
+        mode (str): detection mode the image will be run in
+    Returns
+        tier
+    """
+    if max(image_shape[0:2]) <= _ACCURATE_MIN_SIDE:
+        return "fast"
+    budget = _LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+    if _expected_latency("accurate", mode, image_shape) > budget:
+        return "fast"
+    return available_tier("accurate")
+
+
+def _latency_scale(image_shape: tuple[int, ...], mode: str) -> float:
+    # Megapixels for runs at full resolution; a letterboxed run costs the same whatever the image size
+    if _needs_full_resolution((image_shape[1], image_shape[0]), mode):
+        return image_shape[0] * image_shape[1] / 1e6
+    return 1.0
+
+
+def _decayed_latency(tier: str, mode: str, now: float) -> float | None:
+    entry = _tier_latency.get((tier, mode))
+    if entry is None:
+        return None
+    average, updated = entry
+    return average * 0.5 ** ((now - updated) / _LATENCY_HALF_LIFE_S)
+
+
+def _expected_latency(tier: str, mode: str, image_shape: tuple[int, ...]) -> float:
+    """Detection latency in ms of an image in a tier and mode, from the recent runs, or 0 if there were none"""
+    average = _decayed_latency(tier, mode, time.monotonic())
+    return 0.0 if average is None else average * _latency_scale(image_shape, mode)
+
+
+def _record_latency(tier: str, mode: str, image_shape: tuple[int, ...], latency_ms: float) -> None:
+    now = time.monotonic()
+    sample = latency_ms / _latency_scale(image_shape, mode)
+    average = _decayed_latency(tier, mode, now)
+    _tier_latency[(tier, mode)] = (
+        sample if average is None else average + _LATENCY_SMOOTHING * (sample - average),
+        now,
+    )
+
+
+def _scale_face(face: Face, scale: float) -> Face:
+    return replace(
+        face,
+        bounding_box=[int(value * scale) for value in face.bounding_box],
+        landmarks={name: [x * scale, y * scale] for name, (x, y) in face.landmarks.items()},
+    )
+
+
+def _to_face(face: dict[str, t.Any]) -> Face:
+    return Face(
+        score=face["score"],
+        bounding_box=face["facial_area"],
+        landmarks=face["landmarks"],
+    )
+
+
+def _detect(image: np.ndarray, backend: Backend, mode: str) -> list[dict[str, t.Any]]:
+    anchors = backend.anchors
+    if mode == "standard":
+        return detect.detect_faces(
+            image,
+            model=backend.model,
+            keep_aspect_ratio=backend.dynamic_input,
+            tile_above_pixels=_TILE_ABOVE_PIXELS,
+            anchors=anchors,
+        )
+    if mode == "tiled":
+        return detect.detect_faces_tiled(image, model=backend.model, anchors=anchors)
+    if mode == "two_pass":
+        # The coarse stage can only run below the model resolution on models with dynamic height/width
+        coarse_size = anchors.image_size // 2 if backend.dynamic_input else anchors.image_size
+        return detect.detect_faces_two_pass(image, model=backend.model, coarse_size=coarse_size, anchors=anchors)
+    raise ValueError(f"Unknown detection mode {mode!r}, expected one of {list(DETECTION_MODES)}.")
 
 
-def detect_faces(image: np.ndarray) -> list[Face]:
+def detect_faces(image: np.ndarray, mode: str = "standard", tier: str = "fast") -> list[Face]:
+    tier = available_tier(tier)
+    accurate = _accurate_backend() if tier == "accurate" else None
+    if accurate is None and (_END_TO_END or _RAW_INPUT) and mode in ("tiled", "two_pass"):
+        raise ValueError(f"Detection mode {mode!r} needs a model with the plain float32 input and raw outputs.")
+
+    start = time.perf_counter()
+    if accurate is not None:
+        faces = _detect(image, accurate, mode)
+    elif mode == "standard" and _END_TO_END:
+        faces = detect.detect_faces_end_to_end(image, model=_model_end_to_end)
+    elif mode == "standard" and _RAW_INPUT:
+        faces = detect.detect_faces_raw(image, model=_model_raw)
+    else:
+        faces = _detect(image, _backend, mode)
+    _record_latency(tier, mode, image.shape, (time.perf_counter() - start) * 1000)
+    return [_to_face(face) for face in faces]
+
+
+def detect_faces_batch(images: t.Sequence[np.ndarray], batch_size: int | None = None) -> list[list[Face]]:
+    if _END_TO_END or _RAW_INPUT:
+        return [detect_faces(image) for image in images]
     return [
-        Face(
-            score=face["score"],
-            bounding_box=face["facial_area"],
-            landmarks=face["landmarks"],
+        [_to_face(face) for face in faces]
+        for faces in detect.detect_faces_batch(
+            images, model=_model, batch_size=batch_size, keep_aspect_ratio=_KEEP_ASPECT_RATIO
         )
-        for face in detect.detect_faces(image, model=_model)
     ]
 
 
-def googlify(data: dict[str, t.Any]) -> dict[str, t.Any]:
-    image = deserialize_image(data["image"])
-    eye_size = data.get("eye_size", 0.5)
-    pupil_size_range_raw = data.get("pupil_size_range", None)
-    pupil_size_range = tuple(pupil_size_range_raw) if pupil_size_range_raw else (0.4, 0.6)
-    faces = detect_faces(np.array(image))
-    for face in faces:
-        add_googly_eyes(image, face, eye_size=eye_size, pupil_size_range=pupil_size_range)
+def batchable(image_shape: tuple[int, ...], mode: str = "standard", tier: str = "fast") -> bool:
+    """Whether detect_faces_batch detects the faces in an image the same way as detect_faces with these options"""
+    return (
+        mode == "standard"
+        and available_tier(tier) == "fast"
+        and not (_END_TO_END or _RAW_INPUT)
+        and not (_TILE_ABOVE_PIXELS is not None and image_shape[0] * image_shape[1] > _TILE_ABOVE_PIXELS)
+    )
+
+
+def batch_input_shape(image_shape: tuple[int, ...]) -> tuple[int, int]:
+    """Height and width of an image's model input, so that images batched together need no padding"""
+    size = _backend.anchors.image_size
+    if not _KEEP_ASPECT_RATIO:
+        return size, size
+    scale = size / max(image_shape[0:2])
+    stride = _backend.anchors.stride
+    height, width = (preprocess.aligned_size(max(round(side * scale), 1), stride) for side in image_shape[0:2])
+    return height, width
+
+
+def _needs_full_resolution(image_size: tuple[int, int], mode: str) -> bool:
+    if mode in ("tiled", "two_pass"):
+        return True
+    return _TILE_ABOVE_PIXELS is not None and image_size[0] * image_size[1] > _TILE_ABOVE_PIXELS
+
+
+def request_seed(options: t.Mapping[str, t.Any]) -> int:
+    """The request's seed for the googly eyes' randomness, or a new random one so that the response can echo it"""
+    seed = options.get("seed")
+    if seed is None:
+        return secrets.randbits(32)
+    if isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise ValueError(f"Seed must be a non-negative integer, got {seed!r}.")
+    return seed
+
+
+def _googly_eyes(faces: list[Face], options: t.Mapping[str, t.Any]) -> tuple[list[GooglyEye], int]:
+    pupil_size_range = options.get("pupil_size_range", None)
+    pupil_size_range = tuple(pupil_size_range) if pupil_size_range else (0.4, 0.6)
+    seed = request_seed(options)
+    rng = np.random.default_rng(seed)
+    return googly_eyes_for_faces(faces, options.get("eye_size", 0.5), pupil_size_range, rng=rng), seed
+
+
+def content_key(content: bytes) -> str:
+    """Hash identifying an upload in the result caches"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Size, hit, miss and eviction counts of the detection and render caches, and of the near-duplicate lookup"""
+    near_duplicate = {"size": 0, "maxsize": _NEAR_DUPLICATE_INDEX_SIZE, "hits": 0, "misses": 0}
+    for index in list(_near_duplicates.values()):
+        for name in ("size", "hits", "misses"):
+            near_duplicate[name] += index.stats()[name]
+    return {"detection": _detection_cache.stats(), "render": _render_cache.stats(), "near_duplicate": near_duplicate}
+
+
+def _request_tier(image: Image.Image, options: t.Mapping[str, t.Any]) -> str:
+    image_shape = (image.height, image.width)
+    budget = options.get("latency_budget_ms")
+    mode = options.get("detection_mode", "standard")
+    return available_tier(options.get("model_tier") or choose_tier(image_shape, budget, mode))
+
+
+def _store_key(digest: str, tier: str, mode: str) -> str:
+    # Unlike the in-process cache, the store outlives a change of model, so its key names the model too
+    model = "onnx/resnet50" if tier == "accurate" else f"{_BACKEND_NAME}/{_VARIANT}"
+    return f"{digest}:{model}:{mode}"
+
+
+def _near_duplicate_faces(
+    index: NearDuplicateIndex[tuple[tuple[int, int], list[Face]]], image_hash: int, image_size: tuple[int, int]
+) -> list[Face] | None:
+    """Faces of an indexed near-duplicate of the upload, rescaled to the upload's size"""
+    match = index.find(image_hash)
+    if match is None:
+        return None
+    (width, height), faces = match
+    if abs(image_size[0] / image_size[1] - width / height) > _NEAR_DUPLICATE_ASPECT_TOLERANCE * width / height:
+        return None
+    scale = image_size[0] / width
+    return faces if scale == 1.0 else [_scale_face(face, scale) for face in faces]
+
+
+def _detect_upload(
+    content: bytes,
+    options: t.Mapping[str, t.Any],
+    digest: str | None = None,
+    detector: Detector | None = None,
+    persist: bool = True,
+) -> tuple[Image.Image, list[Face], str]:
+    """
+    The upload's header-only image, its faces in full-resolution coordinates and the tier used
+    Faces are read through the in-process cache, then the on-disk store, then the faces of a near-duplicate
+    upload (see $NEAR_DUPLICATE_MAX_DISTANCE), before running the model with detector (default detect_faces).
+    New faces go in the on-disk store unless persist is off, for callers that write them in batches.
+    """
+    mode = options.get("detection_mode", "standard")
+    image = get_image_from_bytes(content)  # only reads the header until the first draw
+    tier = _request_tier(image, options)
+    digest = digest or content_key(content)
+    key = (digest, tier, mode)
+    faces = _detection_cache.get(key)
+    if faces is not None:
+        return image, faces, tier
+    if _detection_store is not None:
+        faces = _detection_store.get(_store_key(digest, tier, mode))
+        if faces is not None:
+            _detection_cache.set(key, faces)
+            return image, faces, tier
+
+    if _needs_full_resolution(image.size, mode):
+        detection_size = max(image.size)
+    else:
+        detection_size = _tier_backend(tier).anchors.image_size
+    detection_image, scale = open_for_detection(content, detection_size)
+
+    index = image_hash = faces = None
+    if _NEAR_DUPLICATE_MAX_DISTANCE >= 0:
+        index = _near_duplicates.setdefault(
+            (tier, mode), NearDuplicateIndex(_NEAR_DUPLICATE_MAX_DISTANCE, _NEAR_DUPLICATE_INDEX_SIZE)
+        )
+        image_hash = dhash(detection_image)
+        if image_hash is not None:
+            faces = _near_duplicate_faces(index, image_hash, image.size)
+    if faces is None:
+        faces = (detector or detect_faces)(np.asarray(detection_image), mode=mode, tier=tier)
+        if scale != 1.0:
+            faces = [_scale_face(face, scale) for face in faces]
+        if index is not None and image_hash is not None:
+            index.add(image_hash, (image.size, faces))
+    _detection_cache.set(key, faces)
+    if persist and _detection_store is not None:
+        _detection_store.put(_store_key(digest, tier, mode), faces)
+    return image, faces, tier
+
+
+def warm_detection_store(directory: str, options: t.Mapping[str, t.Any] | None = None) -> int:
+    """
+    Detect the faces in every image file under a directory, filling the detection store (or just the cache)
+    Args:
+        directory (str): searched recursively; files that aren't images are skipped
+        options (mapping): detection_mode and model_tier to detect with, see googlify_image
+    Returns
+        number of images whose faces are now stored
+    """
+    options = options or {}
+    mode = options.get("detection_mode", "standard")
+    pending: list[tuple[str, list[Face]]] = []
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as file:
+                content = file.read()
+            digest = content_key(content)
+            try:
+                _, faces, tier = _detect_upload(content, options, digest, persist=False)
+            except (OSError, SyntaxError):  # PIL's errors for unreadable or unknown image files
+                continue
+            count += 1
+            if _detection_store is None:
+                continue
+            pending.append((_store_key(digest, tier, mode), faces))
+            if len(pending) >= _WARM_UP_BATCH:
+                _detection_store.put_many(pending)
+                pending.clear()
+    if _detection_store is not None and pending:
+        _detection_store.put_many(pending)
+    return count
+
+
+def googlify_image(
+    content: bytes, options: t.Mapping[str, t.Any], digest: str | None = None, detector: Detector | None = None
+) -> tuple[Image.Image, dict[str, t.Any]]:
+    """
+    Draw googly eyes on the faces in an encoded image
+    Faces are detected on a reduced-resolution decode just large enough for the model (see
+    common.image.open_for_detection). Only drawing touches the full-resolution pixels, except in the
+    tiled and two-pass modes, which need them for detection too.
+    Args:
+        content (bytes): encoded upload
+        options (mapping): eye_size, pupil_size_range, detection_mode, model_tier, latency_budget_ms and seed,
+            all optional. The same upload, options and seed give the same image.
+        digest (str): content_key of the upload, if already computed
+        detector (callable): runs the model instead of detect_faces, e.g. batching concurrent requests
+    Returns
+        the full-resolution image with googly eyes, and the detected faces, the model tier and the seed used
+    """
+    image, faces, tier = _detect_upload(content, options, digest, detector)
+    eyes, seed = _googly_eyes(faces, options)
+    image = drawable_image(image)
+    render_googly_eyes(image, eyes)
+    return image, {
+        "faces": [asdict(face) for face in faces],
+        "model_tier": tier,
+        "seed": seed,
+    }
+
+
+def googlify_overlay(
+    content: bytes, options: t.Mapping[str, t.Any], detector: Detector | None = None
+) -> dict[str, t.Any]:
+    """
+    Googly eye geometry for the faces in an encoded image, for clients that already hold the image
+    Neither decodes nor encodes the full-resolution image. Draw the eyes with common.drawing.composite_googly_eyes.
+    Args:
+        content (bytes): encoded upload
+        options (mapping): see googlify_image
+        detector (callable): see googlify_image
+    Returns
+        the detected faces, their googly eyes (see common.drawing.GooglyEye), in the upload's pixel coordinates,
+        and the model tier and seed used
+    """
+    _, faces, tier = _detect_upload(content, options, detector=detector)
+    eyes, seed = _googly_eyes(faces, options)
     return {
-        "image": serialize_image(image),
         "faces": [asdict(face) for face in faces],
+        "eyes": [asdict(eye) for eye in eyes],
+        "model_tier": tier,
+        "seed": seed,
+    }
+
+
+def response_mode(options: t.Mapping[str, t.Any]) -> str:
+    """The requested response mode, one of RESPONSE_MODES"""
+    mode = options.get("response_mode") or "image"
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode {mode!r}, expected one of {list(RESPONSE_MODES)}.")
+    return mode
+
+
+def _encode_options(options: t.Mapping[str, t.Any], accept: str | None = None) -> dict[str, t.Any]:
+    format = options.get("output_format")
+    if format is None and _PREFERRED_OUTPUT_FORMAT and accepts(accept, mimetype(_PREFERRED_OUTPUT_FORMAT)):
+        format = _PREFERRED_OUTPUT_FORMAT
+    return {
+        "format": format,
+        "quality": options.get("quality"),
+        "optimize": options.get("optimize", False),
+        "progressive": options.get("progressive", False),
     }
+
+
+def _render(
+    content: bytes, options: t.Mapping[str, t.Any], accept: str | None = None, detector: Detector | None = None
+) -> tuple[bytes, str, dict[str, t.Any]]:
+    digest = content_key(content)
+    header = get_image_from_bytes(content)
+    # Pin the tier, so that a cached render and a fresh one agree even if choose_tier would now pick another
+    options = {**options, "model_tier": _request_tier(header, options)}
+    encode_options = _encode_options(options, accept)
+    key = None
+    if options.get("seed") is not None:
+        key = (
+            digest,
+            options["model_tier"],
+            options.get("detection_mode", "standard"),
+            options.get("eye_size", 0.5),
+            tuple(options.get("pupil_size_range") or (0.4, 0.6)),
+            options["seed"],
+            *encode_options.values(),
+        )
+        cached = _render_cache.get(key)
+        if cached is not None:
+            return cached
+
+    image, metadata = googlify_image(content, options, digest, detector)
+    format = output_format(encode_options["format"]) if encode_options["format"] else image.format
+    result = put_image_into_buffer(image, **encode_options).getvalue(), mimetype(format), metadata
+    if key is not None:
+        _render_cache.set(key, result)
+    return result
+
+
+def googlify(data: dict[str, t.Any], detector: Detector | None = None) -> dict[str, t.Any]:
+    if response_mode(data) == "overlay":
+        return googlify_overlay(decode_base64(data["image"]), data, detector)
+    image, _, metadata = _render(decode_base64(data["image"]), data, detector=detector)
+    return {"image": encode_base64(image), **metadata}
+
+
+def googlify_bytes(
+    content: bytes, options: t.Mapping[str, t.Any], accept: str | None = None, detector: Detector | None = None
+) -> tuple[bytes, str, dict[str, t.Any]]:
+    """
+    Googlify an encoded image without the base64 JSON envelope
+    Args:
+        content (bytes): JPEG, PNG or WebP file contents
+        options (mapping): see googlify_image, plus the encoder's output_format, quality, optimize and progressive
+            (see common.image.put_image_into_buffer)
+        accept (str): the request's Accept header, for $PREFERRED_OUTPUT_FORMAT
+        detector (callable): see googlify_image
+    Returns
+        encoded result, by default in the input's format, its MIME type, and the faces, model tier and seed used.
+        Seeded results are cached, see RENDER_CACHE_SIZE.
+    """
+    return _render(content, options, accept, detector)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import typing as t
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from common.image import output_format
+
+# Content types of the raw endpoints' request and response bodies
+IMAGE_MIMETYPES = ("image/jpeg", "image/png", "image/webp")
+
+# Response headers carrying the metadata that the JSON endpoint returns alongside the image
+FACES_HEADER = "X-Faces"
+# Set instead of FACES_HEADER when the faces would make it longer than _FACES_HEADER_MAX_BYTES
+FACES_OMITTED_HEADER = "X-Faces-Omitted"
+TIER_HEADER = "X-Model-Tier"
+SEED_HEADER = "X-Seed"
+
+# Proxies and API Gateway reject responses whose headers add up to more than about 8-10 kB. At about 150 bytes per
+# face, this fits some 25 faces; crowds are left to the JSON endpoint and the overlay response mode.
+_FACES_HEADER_MAX_BYTES = 4096
+
+# Error message for request bodies that PIL can't decode, whose own message names an in-memory buffer
+UNIDENTIFIED_IMAGE = "Couldn't decode the image, expected JPEG, PNG or WEBP."
+
+DETECTION_MODES = ("standard", "tiled", "two_pass")
+
+# "accurate" is the ResNet50 model, loaded on first use
+MODEL_TIERS = ("fast", "accurate")
+
+
+def _flag(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Expected a boolean, got {value!r}.")
+
+
+def _seed(value: str) -> int:
+    seed = int(value)
+    if seed < 0:
+        raise ValueError(f"Seed must be non-negative, got {seed}.")
+    return seed
+
+
+def _quality(value: str) -> int:
+    quality = int(value)
+    if not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be between 1 and 100, got {quality}.")
+    return quality
+
+
+def _choice(choices: tuple[str, ...]) -> t.Callable[[str], str]:
+    def parse(value: str) -> str:
+        if value not in choices:
+            raise ValueError(f"Expected one of {list(choices)}, got {value!r}.")
+        return value
+
+    return parse
+
+
+# Query string / form field parsers for the options of a googlify request
+_OPTION_PARSERS: dict[str, t.Callable[[str], t.Any]] = {
+    "eye_size": float,
+    "pupil_size_range": lambda value: [float(part) for part in value.split(",")],
+    "detection_mode": _choice(DETECTION_MODES),
+    "model_tier": _choice(MODEL_TIERS),
+    "latency_budget_ms": float,
+    "response_mode": str,
+    "seed": _seed,
+    "output_format": output_format,
+    "quality": _quality,
+    "optimize": _flag,
+    "progressive": _flag,
+}
+
+
+def parse_options(params: t.Mapping[str, str]) -> dict[str, t.Any]:
+    """
+    Options of a raw request, from its query string or form fields
+    Args:
+        params (mapping): string values, e.g. {"eye_size": "0.4", "pupil_size_range": "0.3,0.5"}
+    Returns
+        the options, typed as in the JSON request body. Unknown keys are ignored.
+    """
+    options = {}
+    for key, parse in _OPTION_PARSERS.items():
+        if key in params:
+            try:
+                options[key] = parse(params[key])
+            except ValueError:
+                raise ValueError(f"Invalid value {params[key]!r} for option {key!r}.") from None
+    return options
+
+
+def accepts(accept: str | None, mimetype: str) -> bool:
+    """
+    Whether an Accept header lists a MIME type by name, with a non-zero q
+    Wildcards don't count: curl and most HTTP libraries send */* by default, and keep getting the input's format.
+    """
+    for entry in (accept or "").split(","):
+        media_range, *params = [part.strip() for part in entry.split(";")]
+        if media_range.lower() != mimetype:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def parse_multipart(body: bytes, content_type: str) -> tuple[bytes, dict[str, str]]:
+    """
+    Split a multipart/form-data body into the image file and the other form fields
+    Args:
+        body (bytes): request body
+        content_type (str): Content-Type header, including the boundary
+    Returns
+        image bytes, form fields
+    """
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    if not message.is_multipart():
+        raise ValueError("Expected a multipart/form-data body.")
+
+    image = None
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        if name == "image":
+            image = payload
+        elif isinstance(name, str) and payload is not None:
+            fields[name] = payload.decode(part.get_content_charset() or "utf-8")
+    if image is None:
+        raise ValueError("Expected an 'image' part in the multipart body.")
+    return image, fields
+
+
+def _rounded_face(face: dict[str, t.Any]) -> dict[str, t.Any]:
+    """A face dict with its score to three places and its coordinates to a tenth of a pixel"""
+    rounded = {**face, "score": round(face["score"], 3), "bounding_box": [round(v, 1) for v in face["bounding_box"]]}
+    if "landmarks" in face:
+        rounded["landmarks"] = {name: [round(v, 1) for v in point] for name, point in face["landmarks"].items()}
+    return rounded
+
+
+def metadata_headers(metadata: dict[str, t.Any]) -> dict[str, str]:
+    """
+    Response headers for the faces, model tier and seed of a raw response
+    The faces go in FACES_HEADER as compact JSON with rounded coordinates. When there are too many for a header,
+    FACES_OMITTED_HEADER is set instead; the JSON endpoint and the overlay response mode return them all.
+    """
+    headers = {TIER_HEADER: metadata["model_tier"], SEED_HEADER: str(metadata["seed"])}
+    faces = json.dumps([_rounded_face(face) for face in metadata["faces"]], separators=(",", ":"))
+    if len(faces) <= _FACES_HEADER_MAX_BYTES:
+        headers[FACES_HEADER] = faces
+    else:
+        headers[FACES_OMITTED_HEADER] = "true"
+    return headers
+
+
+def etag(body: bytes) -> str:
+    """
+    Strong entity tag of a response body, quoted
+    Responses are deterministic given the upload, options and seed, so a repeated seeded request gets the same tag.
+    """
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    """Whether an If-None-Match header matches an entity tag, so the response is bodiless, see precondition_status"""
+    tags = [candidate.strip().removeprefix("W/") for candidate in (if_none_match or "").split(",")]
+    return tag in tags or "*" in tags
+
+
+def precondition_status(method: str) -> int:
+    """
+    Status of a response to a request whose If-None-Match matches: 304 Not Modified for GET and HEAD, and 412
+    Precondition Failed for other methods, e.g. the POST endpoints (RFC 9110 section 13.1.2)
+    """
+    return 304 if method.upper() in ("GET", "HEAD") else 412
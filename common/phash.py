@@ -0,0 +1,143 @@
+import threading
+import typing as t
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+V = t.TypeVar("V")
+
+# dHash compares neighbouring pixels of a (HASH_SIZE + 1) × HASH_SIZE thumbnail, giving HASH_SIZE² bits
+HASH_SIZE = 8
+
+# Thumbnails whose grey levels span less than this are too flat to hash: blank frames would all match each other
+_MIN_CONTRAST = 8
+
+# When an index outgrows its size, the least recently used entries are dropped, this fraction at a time
+_EVICT_FRACTION = 0.1
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int | None:
+    """
+    Difference hash of an image: whether each pixel of a tiny greyscale thumbnail is brighter than its right
+    neighbour. Robust to resizing, re-compression and metadata changes, which move it by a few bits at most.
+    Args:
+        image (Image): image to hash, at any resolution
+        hash_size (int): thumbnail height; the hash has hash_size² bits
+    Returns
+        hash, or None if the image is too flat to hash
+    """
+    thumbnail = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX), dtype=np.int16)
+    if int(thumbnail.max()) - int(thumbnail.min()) < _MIN_CONTRAST:
+        return None
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree(t.Generic[V]):
+    """
+    Burkhard-Keller tree of hashes under the Hamming distance
+    Each child is keyed on its distance to the parent, so by the triangle inequality a search within distance r of
+    a query only descends into children keyed within r of the query's distance to their parent.
+    """
+
+    def __init__(self) -> None:
+        self._root: list | None = None  # [hash, value, {distance: child}]
+        self._size = 0
+
+    def add(self, key: int, value: V) -> None:
+        """Add a hash, replacing the value of an identical one"""
+        if self._root is None:
+            self._root = [key, value, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1] = value
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, value, {}]
+                self._size += 1
+                return
+            node = child
+
+    def search(self, key: int, max_distance: int) -> list[tuple[int, int, V]]:
+        """Entries within max_distance of a hash, as (distance, hash, value), nearest first"""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[0], node[1]))
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results, key=lambda result: result[0])
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class NearDuplicateIndex(t.Generic[V]):
+    """
+    Thread-safe, size-bounded map from perceptual hashes to values, looked up by nearest hash
+    Args:
+        max_distance (int): Hamming distance up to which a hash matches
+        maxsize (int): number of hashes kept, dropping the least recently used
+    """
+
+    def __init__(self, max_distance: int, maxsize: int):
+        self.max_distance = max_distance
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, V] = OrderedDict()
+        self._tree: BKTree[V] = BKTree()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, key: int, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) <= self.maxsize:
+                self._tree.add(key, value)
+                return
+            # BK-trees can't delete, so rebuild from the entries that remain
+            for _ in range(max(int(self.maxsize * _EVICT_FRACTION), 1)):
+                self._entries.popitem(last=False)
+            self._tree = BKTree()
+            for entry_key, entry_value in self._entries.items():
+                self._tree.add(entry_key, entry_value)
+
+    def find(self, key: int) -> V | None:
+        """Value of the nearest hash within max_distance"""
+        with self._lock:
+            matches = self._tree.search(key, self.max_distance)
+            if not matches:
+                self.misses += 1
+                return None
+            self.hits += 1
+            _, match, value = matches[0]
+            self._entries.move_to_end(match)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tree = BKTree()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
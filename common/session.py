@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+
+import onnxruntime
+
+# Lambda allocates CPU in proportion to memory: one vCPU per 1,769 MB, up to 6 vCPUs
+_LAMBDA_MB_PER_VCPU = 1769
+_LAMBDA_MAX_VCPUS = 6
+
+PROFILES = ("default", "latency", "throughput", "lambda")
+
+# Profiles whose optimised graph isn't persisted. Lambda's /tmp doesn't outlive a cold start, so the graph would be
+# written on every one and never read, and the fully optimised graph is specific to the CPU it was optimised on
+# (e.g. its NCHWc block size), so it can't be built into the image on another machine either.
+_UNPERSISTED_PROFILES = ("default", "lambda")
+
+
+def _lambda_threads() -> int:
+    memory_mb = int(os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", _LAMBDA_MB_PER_VCPU))
+    return max(1, min(_LAMBDA_MAX_VCPUS, round(memory_mb / _LAMBDA_MB_PER_VCPU)))
+
+
+def session_options(profile: str) -> onnxruntime.SessionOptions:
+    """
+    ONNX Runtime options for a named tuning profile
+    Args:
+        profile (str): one of
+            "default": ONNX Runtime defaults
+            "latency": one request at a time using every core (intra-op threads = number of cores)
+            "throughput": one thread per session, for many concurrent workers
+            "lambda": thread count from the Lambda memory tier, no spinning on billed CPU
+    Returns
+        session options
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown session profile {profile!r}, expected one of {list(PROFILES)}.")
+
+    options = onnxruntime.SessionOptions()
+    if profile == "default":
+        return options
+
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.inter_op_num_threads = 1
+    # Input shapes repeat between requests, so the arena and the memory pattern planner pay off
+    options.enable_cpu_mem_arena = True
+    options.enable_mem_pattern = True
+
+    if profile == "latency":
+        options.intra_op_num_threads = os.cpu_count() or 1
+    elif profile == "throughput":
+        options.intra_op_num_threads = 1
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    elif profile == "lambda":
+        options.intra_op_num_threads = _lambda_threads()
+        # Spinning threads burn billed CPU time between requests
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        # Keep the resident set small under the function's memory limit
+        options.enable_cpu_mem_arena = False
+    return options
+
+
+def _cache_dir() -> str:
+    return os.environ.get("ORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "googly-eyes-ort"))
+
+
+def _ensure_dir(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def optimized_model_path(model_path: str, cache_dir: str) -> str:
+    """Cache location of the optimised graph, keyed on the model file and the ONNX Runtime version."""
+    stat = os.stat(model_path)
+    key = f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}:{onnxruntime.__version__}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    name, _ = os.path.splitext(os.path.basename(model_path))
+    return os.path.join(cache_dir, f"{name}.{digest}.optimized.onnx")
+
+
+def create_session(
+    model_path: str, profile: str = "default", cache_dir: str | None = None
+) -> onnxruntime.InferenceSession:
+    """
+    Create an inference session for the given tuning profile
+    Except for the "default" and "lambda" profiles, the fully optimised graph is serialised on first load and
+    reused by later sessions, which then skip graph optimisation.
+    Args:
+        model_path (str): ONNX model file
+        profile (str): tuning profile, see session_options
+        cache_dir (str): where optimised graphs are kept, defaulting to $ORT_CACHE_DIR or the temp directory
+    Returns
+        inference session
+    """
+    options = session_options(profile)
+    if profile in _UNPERSISTED_PROFILES:
+        return onnxruntime.InferenceSession(model_path, sess_options=options)
+
+    cache_dir = cache_dir or _cache_dir()
+    optimized_path = optimized_model_path(model_path, cache_dir)
+    if os.path.isfile(optimized_path):
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return onnxruntime.InferenceSession(optimized_path, sess_options=options)
+
+    # Write into a private directory and move into place data-first, so that concurrent workers
+    # never see a partial model. Initializers go to a sidecar file next to the optimised graph.
+    data_name = f"{os.path.basename(optimized_path)}.data"
+    with tempfile.TemporaryDirectory(dir=_ensure_dir(cache_dir)) as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, os.path.basename(optimized_path))
+        options.optimized_model_filepath = tmp_path
+        options.add_session_config_entry("session.optimized_model_external_initializers_file_name", data_name)
+        session = onnxruntime.InferenceSession(model_path, sess_options=options)
+        if os.path.isfile(tmp_path):
+            if os.path.isfile(os.path.join(tmp_dir, data_name)):
+                os.replace(os.path.join(tmp_dir, data_name), os.path.join(cache_dir, data_name))
+            os.replace(tmp_path, optimized_path)
+    return session
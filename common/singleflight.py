@@ -0,0 +1,68 @@
+import threading
+import typing as t
+
+K = t.TypeVar("K", bound=t.Hashable)
+V = t.TypeVar("V")
+
+
+class _Call(t.Generic[V]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: V | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(t.Generic[K, V]):
+    """
+    Coalesces concurrent calls with the same key: the first runs, the others wait for it and share its result
+    Calls that arrive after it finished run again, so nothing is cached.
+    Args:
+        maxsize (int): number of keys in flight at once. Calls beyond it run on their own. 0 disables coalescing.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._calls: dict[K, _Call[V]] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: K, compute: t.Callable[[], V]) -> V:
+        """
+        The result of compute(), or of a concurrent call's compute() with the same key
+        Raises the exception compute() raised, in the caller that ran it and in every one waiting on it.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None and len(self._calls) < self.maxsize
+            if leader:
+                call = self._calls[key] = _Call()
+            elif call is not None:
+                self.shared += 1
+        if call is None:
+            return compute()
+        if leader:
+            return self._lead(key, call, compute)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return t.cast(V, call.value)
+
+    def _lead(self, key: K, call: _Call[V], compute: t.Callable[[], V]) -> V:
+        try:
+            call.value = compute()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict[str, int]:
+        return {"in_flight": len(self._calls), "maxsize": self.maxsize, "calls": self.calls, "shared": self.shared}
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import time
+import typing as t
+
+import numpy as np
+
+from common.face import Face
+
+# Landmarks in the order of a record's landmark rows
+LANDMARKS = ("right_eye", "left_eye", "nose", "mouth_right", "mouth_left")
+
+# One face per record row: 60 bytes, against about 400 for the same face as JSON
+_FACE_DTYPE = np.dtype([("score", "<f4"), ("box", "<i4", (4,)), ("landmarks", "<f4", (len(LANDMARKS), 2))])
+
+# Bytes counted per entry on top of its key and record, roughly SQLite's row and index overhead
+_ENTRY_OVERHEAD = 40
+
+# When the store outgrows max_bytes, the least recently used entries are evicted until it is this much smaller,
+# so that eviction doesn't run on every insert
+_EVICT_FRACTION = 0.1
+
+# A read refreshes its entry's last access time only when that is older than this, so that repeated reads of a hot
+# entry don't each take the database's write lock. Eviction order is only this precise.
+_ACCESS_UPDATE_INTERVAL_S = 60
+
+STORE_FILE = "detections.sqlite3"
+
+
+def encode_faces(faces: t.Sequence[Face]) -> bytes:
+    """Compact binary record of detected faces, see _FACE_DTYPE"""
+    records = np.zeros(len(faces), dtype=_FACE_DTYPE)
+    for record, face in zip(records, faces):
+        record["score"] = face.score
+        record["box"] = face.bounding_box
+        record["landmarks"] = [face.landmarks[name] for name in LANDMARKS]
+    return records.tobytes()
+
+
+def decode_faces(record: bytes) -> list[Face]:
+    return [
+        Face(
+            score=float(face["score"]),
+            bounding_box=face["box"].tolist(),
+            landmarks=dict(zip(LANDMARKS, face["landmarks"].tolist())),
+        )
+        for face in np.frombuffer(record, dtype=_FACE_DTYPE)
+    ]
+
+
+class DetectionStore:
+    """
+    On-disk map from a detection key (upload hash, model and mode) to the detected faces, shared between processes
+    A SQLite database in WAL mode, so readers don't block the writer and every worker process can use it at once.
+    Each thread gets its own connection. Entries are evicted least recently used first once their keys and
+    records add up to more than max_bytes.
+    Args:
+        directory (str): where to keep the database, created if missing
+        max_bytes (int): size budget of the database
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, STORE_FILE)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS detections "
+                "(key TEXT PRIMARY KEY, faces BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS detections_accessed ON detections (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # durable across process crashes, not power loss
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> list[Face] | None:
+        connection = self._connection()
+        row = connection.execute("SELECT faces, accessed FROM detections WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        faces, accessed = row
+        now = time.time()
+        if now - accessed >= _ACCESS_UPDATE_INTERVAL_S:
+            connection.execute("UPDATE detections SET accessed = ? WHERE key = ?", (now, key))
+        return decode_faces(faces)
+
+    def put(self, key: str, faces: t.Sequence[Face]) -> None:
+        self.put_many([(key, faces)])
+
+    def put_many(self, items: t.Iterable[tuple[str, t.Sequence[Face]]]) -> None:
+        """Store several detections in one transaction, e.g. when warming the store up"""
+        now = time.time()
+        rows = []
+        for key, faces in items:
+            record = encode_faces(faces)
+            rows.append((key, record, len(key) + len(record) + _ENTRY_OVERHEAD, now))
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO detections (key, faces, size, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict(connection)
+
+    def size_bytes(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * (1 - _EVICT_FRACTION))
+        connection.execute(
+            "DELETE FROM detections WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed, key) - size AS before FROM detections) "
+            "WHERE before < ?)",
+            (excess,),
+        )
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fill the detection store from a directory of images")
+    parser.add_argument("directory")
+    parser.add_argument("--detection-mode", default="standard")
+    parser.add_argument("--model-tier", default="fast")
+    args = parser.parse_args()
+    if not os.environ.get("DETECTION_STORE_DIR"):
+        parser.error("Set DETECTION_STORE_DIR to the store's directory.")
+
+    from common.googlify import warm_detection_store
+
+    count = warm_detection_store(args.directory, {"detection_mode": args.detection_mode, "model_tier": args.model_tier})
+    print(f"Stored the faces of {count} images.")
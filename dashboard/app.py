@@ -4,9 +4,9 @@ import requests
 import streamlit as st
 from PIL import Image, ImageDraw
 import typing as t
-from common.drawing import plot_circle
+from common.drawing import composite_googly_eyes, plot_circle
 from common.face import Face
-from common.image import put_image_into_buffer, deserialize_image, serialize_image
+from common.image import put_image_into_buffer, serialize_image
 from requests.auth import AuthBase
 from PIL import ImageOps
 
@@ -74,11 +74,15 @@ def run_dashboard(url: str, auth: AuthBase | None = None):
         "image": serialize_image(image),
         "eye_size": eye_size,
         "pupil_size_range": pupil_size_range,
+        # We already have the image, so only fetch the eyes and draw them here
+        "response_mode": "overlay",
+        # Keep the pupils in place while the sliders move; the server caches the faces, so only the eyes are redone
+        "seed": 0,
     }
 
     data = _add_googly_eyes(body, _url=url, _auth=auth)
     if googly_eyes_enabled:
-        image = deserialize_image(data["image"])
+        composite_googly_eyes(image, data["eyes"])
 
     if highlight_faces:
         for face in data["faces"]:
@@ -1,10 +1,81 @@
+import base64
 import json
 import typing as t
 
+from PIL import UnidentifiedImageError
 
-from common.googlify import googlify
+from common.googlify import googlify, googlify_bytes, googlify_overlay, response_mode
+from common.payload import (
+    IMAGE_MIMETYPES,
+    UNIDENTIFIED_IMAGE,
+    etag,
+    etag_matches,
+    metadata_headers,
+    parse_multipart,
+    parse_options,
+    precondition_status,
+)
+
+
+def _headers(event: dict) -> dict[str, str]:
+    return {key.lower(): value for key, value in (event.get("headers") or {}).items()}
+
+
+def _content_type(event: dict) -> str:
+    return _headers(event).get("content-type", "application/json")
+
+
+def _method(event: dict) -> str:
+    # REST APIs send the method as httpMethod, HTTP APIs (payload format 2.0) under requestContext
+    return event.get("httpMethod") or (event.get("requestContext") or {}).get("http", {}).get("method", "POST")
+
+
+def _conditional(event: dict, response: dict[str, t.Any], body: bytes) -> dict[str, t.Any]:
+    tag = etag(body)
+    if etag_matches(_headers(event).get("if-none-match"), tag):
+        headers = {"ETag": tag, **({"Vary": response["headers"]["Vary"]} if "Vary" in response["headers"] else {})}
+        return {"statusCode": precondition_status(_method(event)), "headers": headers, "body": ""}
+    response["headers"]["ETag"] = tag
+    return response
+
+
+def _raw_handler(event: dict, content_type: str) -> dict[str, t.Any]:
+    """Image bytes in and out. API Gateway base64-encodes binary bodies, so they arrive with isBase64Encoded."""
+    body = event.get("body") or ""
+    content = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("latin-1")
+    params = dict(event.get("queryStringParameters") or {})
+    if content_type.split(";")[0].strip() == "multipart/form-data":
+        content, fields = parse_multipart(content, content_type)
+        params.update(fields)
+
+    options = parse_options(params)
+    if response_mode(options) == "overlay":
+        overlay = json.dumps(googlify_overlay(content, options))
+        response = {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": overlay}
+        return _conditional(event, response, overlay.encode())
+
+    image, mimetype, metadata = googlify_bytes(content, options, accept=_headers(event).get("accept"))
+    response = {
+        "statusCode": 200,
+        "headers": {"Content-Type": mimetype, **metadata_headers(metadata), "Vary": "Accept"},
+        "body": base64.b64encode(image).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+    return _conditional(event, response, image)
+
+
+def _bad_request(message: str) -> dict[str, t.Any]:
+    return {"statusCode": 400, "headers": {"Content-Type": "text/plain; charset=utf-8"}, "body": message}
 
 
 def lambda_handler(event: dict, context: t.Any) -> dict[str, t.Any]:
-    data: dict[str, t.Any] = json.loads(event["body"])
-    return googlify(data)
+    content_type = _content_type(event)
+    try:
+        if content_type.split(";")[0].strip() in (*IMAGE_MIMETYPES, "multipart/form-data"):
+            return _raw_handler(event, content_type)
+        data: dict[str, t.Any] = json.loads(event["body"])
+        return googlify(data)
+    except UnidentifiedImageError:
+        return _bad_request(UNIDENTIFIED_IMAGE)
+    except ValueError as e:
+        return _bad_request(str(e))
@@ -159,6 +159,54 @@ def cpu_nms(dets: np.ndarray, threshold: float) -> list[int]:
     return keep
 
 
+def iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """
+    IoU of one x1, y1, x2, y2 box against an (N, 4) array of boxes, with the same +1 pixel convention as cpu_nms
+    """
+    w = np.maximum(0.0, np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]) + 1)
+    h = np.maximum(0.0, np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]) + 1)
+    inter = w * h
+    area = (box[2] - box[0] + 1) * (box[3] - box[1] + 1)
+    areas = (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+    return inter / (area + areas - inter)
+
+
+def nms(dets: np.ndarray, threshold: float, top_k: int | None = None) -> list[int]:
+    """
+    Vectorised greedy non-maximum suppression, equivalent to cpu_nms
+    Args:
+        dets (numpy array): (N, 5) array of x1, y1, x2, y2, score
+        threshold (float): IoU at or above which a lower-scoring box is suppressed
+        top_k (int): only consider the top_k highest-scoring boxes, or None for all
+    Returns
+        indices of the kept boxes, highest score first
+    """
+    x1 = dets[:, 0]
+    y1 = dets[:, 1]
+    x2 = dets[:, 2]
+    y2 = dets[:, 3]
+    scores = dets[:, 4]
+
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    if top_k is not None:
+        order = order[:top_k]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        # IoU of the kept box against all remaining boxes at once
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[rest] - inter)
+        order = rest[ovr < threshold]
+
+    return keep
+
+
 def transform_bbox(
     x: np.ndarray,
     y: np.ndarray,
@@ -1,21 +1,30 @@
+import math
 import os
+import threading
 from pathlib import Path
 
 import numpy as np
 from PIL import Image, ImageOps
 
+# BGR mean values from biubug6/Pytorch_Retinaface training config
+_PIXEL_MEANS = np.array([104.0, 117.0, 123.0], dtype=np.float32)
 
-def get_image(img_uri: str | np.ndarray) -> np.ndarray:
+# Per-thread scratch space for model input tensors, reused across requests
+_buffers = threading.local()
+
+
+def get_image(img_uri: str | np.ndarray, copy: bool = True) -> np.ndarray:
     """
     Load the given image
     Args:
         img_path (str or numpy array): exact image path or pre-loaded numpy array (RGB format)
+        copy (bool): copy a pre-loaded array. Pass False when the result is only read.
     Returns:
         image itself
     """
     # if it is pre-loaded numpy array
     if isinstance(img_uri, np.ndarray):  # Use given NumPy array
-        img = img_uri.copy()
+        img = img_uri.copy() if copy else img_uri
 
     # then it has to be a path on filesystem
     elif isinstance(img_uri, str):
@@ -25,7 +34,7 @@ def get_image(img_uri: str | np.ndarray) -> np.ndarray:
         if not os.path.isfile(img_uri):
             raise ValueError(f"Input image file path ({img_uri}) does not exist.")
 
-        img = np.array(Image.open(img_uri))
+        img = np.asarray(Image.open(img_uri))
 
     else:
         raise ValueError(
@@ -59,23 +68,111 @@ def resize_image(
     Returns
         resized image, im_scale
     """
-    img_h, img_w = img.shape[0:2]
-    im_scale = (target_size[0] / float(img.shape[0]), target_size[1] / float(img.shape[1]))
+    im_scale, im_offset = letterbox_params(img.shape[0:2], target_size)
+
+    im = Image.fromarray(img)
+    im = ImageOps.pad(im, size=target_size, method=Image.Resampling.BILINEAR)
+    img = np.asarray(im)
+
+    return img, im_scale, im_offset
+
+
+def letterbox_params(img_shape: tuple[int, int], target_size: tuple[int, int]) -> tuple[float, tuple[float, float]]:
+    """
+    Scale and offset mapping letterboxed model coordinates back to the original image
+    Args:
+        img_shape (tuple): original image height and width
+        target_size (tuple): letterboxed size
+    Returns
+        im_scale, im_offset
+    """
+    img_h, img_w = img_shape
+    im_scale = (target_size[0] / float(img_h), target_size[1] / float(img_w))
 
     if im_scale[0] < im_scale[1]:
         im_offset = ((img_h - img_w) / 2, 0.0)
     else:
         im_offset = (0.0, (img_w - img_h) / 2)
 
-    im = Image.fromarray(img)
-    im = ImageOps.pad(im, size=target_size, method=Image.Resampling.BILINEAR)
-    img = np.array(im)
+    return min(im_scale), im_offset
 
-    return img, min(im_scale), im_offset
+
+def resize_image_keep_aspect(
+    img: np.ndarray, max_size: int, allow_upscaling: bool
+) -> tuple[np.ndarray, float, tuple[float, float]]:
+    """
+    Resize the image so that its longest side is max_size, without padding
+    Args:
+        img (numpy array): given image
+        max_size (int): target length of the longest side
+        allow_upscaling (bool): whether images smaller than max_size may be enlarged
+    Returns
+        resized image, im_scale, im_offset
+    """
+    img_h, img_w = img.shape[0:2]
+    im_scale = max_size / float(max(img_h, img_w))
+    if not allow_upscaling:
+        im_scale = min(im_scale, 1.0)
+
+    size = (max(round(img_w * im_scale), 1), max(round(img_h * im_scale), 1))
+    if size != (img_w, img_h):
+        img = np.asarray(Image.fromarray(img).resize(size, resample=Image.Resampling.BILINEAR))
+
+    return img, im_scale, (0.0, 0.0)
+
+
+def resize_for_model(
+    img: np.ndarray, allow_upscaling: bool, max_size: int = 640, keep_aspect_ratio: bool = False
+) -> tuple[np.ndarray, float, tuple[float, float]]:
+    """
+    Resize the image to the model input size, letterboxed to a square unless keep_aspect_ratio
+    Returns
+        resized uint8 image, im_scale, im_offset
+    """
+    if keep_aspect_ratio:
+        return resize_image_keep_aspect(img, max_size=max_size, allow_upscaling=allow_upscaling)
+    return resize_image(img, target_size=(max_size, max_size), allow_upscaling=allow_upscaling)
+
+
+def aligned_size(size: int, stride: int) -> int:
+    return math.ceil(size / stride) * stride
+
+
+def get_buffer(shape: tuple[int, ...]) -> np.ndarray:
+    """
+    Return a float32 array of the given shape backed by this thread's scratch buffer
+    The contents are only valid until the next call on the same thread, so callers must not keep it.
+    """
+    size = math.prod(shape)
+    data = getattr(_buffers, "data", None)
+    if data is None or data.size < size:
+        data = _buffers.data = np.empty(size, dtype=np.float32)
+    return data[:size].reshape(shape)
+
+
+def write_tensor(img: np.ndarray, out: np.ndarray) -> None:
+    """
+    Write an RGB uint8 image into a (3, H, W) float32 tensor
+    RGB → BGR, mean subtraction and HWC → CHW happen in a single pass. The image is placed at the
+    top-left of out and any remaining rows/columns are zeroed.
+    """
+    img_h, img_w = img.shape[0:2]
+    np.subtract(
+        img.transpose(2, 0, 1)[::-1],  # HWC → CHW, RGB → BGR (views)
+        _PIXEL_MEANS[:, np.newaxis, np.newaxis],
+        out=out[:, :img_h, :img_w],
+    )
+    out[:, img_h:, :] = 0
+    out[:, :img_h, img_w:] = 0
 
 
 def preprocess_image(
-    img: np.ndarray, allow_upscaling: bool
+    img: np.ndarray,
+    allow_upscaling: bool,
+    max_size: int = 640,
+    keep_aspect_ratio: bool = False,
+    stride: int = 32,
+    out: np.ndarray | None = None,
 ) -> tuple[np.ndarray, tuple[int, int], float, tuple[float, float]]:
     """
     This function is modified from the following code snippet:
@@ -83,17 +180,17 @@ def preprocess_image(
     Args:
         img (numpy array): given image
         allow_upscaling (bool)
+        max_size (int): side length of the square model input, or longest side if keep_aspect_ratio
+        keep_aspect_ratio (bool): keep the image's aspect ratio and pad only up to a multiple of stride,
+            instead of letterboxing to max_size × max_size
+        stride (int): alignment of the tensor height and width when keep_aspect_ratio is set
+        out (numpy array): preallocated (1, 3, H, W) float32 tensor to write into, e.g. from get_buffer
     Returns:
         tensor, image shape, im_scale
     """
-    # BGR mean values from biubug6/Pytorch_Retinaface training config
-    _PIXEL_MEANS = np.array([104.0, 117.0, 123.0], dtype=np.float32)
-
-    img, im_scale, im_offset = resize_image(img, target_size=(640, 640), allow_upscaling=allow_upscaling)
-    img = img.astype(np.float32)
-    img = img[:, :, ::-1]  # RGB → BGR
-    img -= _PIXEL_MEANS
-    im_shape = (img.shape[0], img.shape[1])
-    im_tensor = img.transpose(2, 0, 1)[np.newaxis, :, :, :]  # HWC → NCHW
+    img, im_scale, im_offset = resize_for_model(img, allow_upscaling, max_size, keep_aspect_ratio)
+    im_shape = (aligned_size(img.shape[0], stride), aligned_size(img.shape[1], stride))
+    im_tensor = np.empty((1, 3, *im_shape), dtype=np.float32) if out is None else out
+    write_tensor(img, im_tensor[0])
 
     return im_tensor, im_shape, im_scale, im_offset
@@ -0,0 +1,60 @@
+import math
+import os
+from typing import Sequence
+
+import numpy as np
+
+
+def generate_priors(
+    min_sizes: Sequence[Sequence[int]],
+    steps: Sequence[int],
+    image_size: tuple[int, int],
+    clip: bool = False,
+) -> np.ndarray:
+    """
+    Generate the RetinaFace anchor boxes for the given input size
+    Args:
+        min_sizes (list): anchor sizes in pixels for each feature level
+        steps (list): stride of each feature level
+        image_size (tuple): input (height, width)
+        clip (bool): clip the priors to [0, 1]
+    Returns
+        (N, 4) float32 array of (cx, cy, w, h), normalised by the image size, ordered level → row → col → size
+    """
+    im_height, im_width = image_size
+    levels = []
+    for level_min_sizes, step in zip(min_sizes, steps):
+        feat_h = math.ceil(im_height / step)
+        feat_w = math.ceil(im_width / step)
+        sizes = np.asarray(level_min_sizes, dtype=np.float64)
+        level = np.empty((feat_h, feat_w, len(sizes), 4), dtype=np.float32)
+        level[..., 0] = ((np.arange(feat_w) + 0.5) * step / im_width)[np.newaxis, :, np.newaxis]
+        level[..., 1] = ((np.arange(feat_h) + 0.5) * step / im_height)[:, np.newaxis, np.newaxis]
+        level[..., 2] = sizes / im_width
+        level[..., 3] = sizes / im_height
+        levels.append(level.reshape(-1, 4))
+    priors = np.concatenate(levels, axis=0)
+    if clip:
+        np.clip(priors, 0, 1, out=priors)
+    return priors
+
+
+def priors_path(directory: str, image_size: tuple[int, int]) -> str:
+    return os.path.join(directory, f"priors_{image_size[0]}x{image_size[1]}.npy")
+
+
+def save_priors(path: str, priors: np.ndarray) -> None:
+    np.save(path, np.ascontiguousarray(priors, dtype=np.float32))
+
+
+def load_priors(path: str) -> np.ndarray | None:
+    """
+    Memory-map a precomputed priors artefact, if present
+    Args:
+        path (str): path of the .npy file
+    Returns
+        read-only (N, 4) array, or None if the file does not exist
+    """
+    if not os.path.isfile(path):
+        return None
+    return np.load(path, mmap_mode="r")
@@ -5,32 +5,49 @@ Weights are downloaded automatically from HuggingFace (py-feat/retinaface).
 Run from the repo root:
 
     poetry run python retinaface/convert_model.py
+
+The ResNet50 model for the accurate tier (840px input, see cfg_re50) is
+exported with `--backbone resnet50 [--weights Resnet50_Final.pth]`.
 """
 
+import argparse
 import os
 import sys
+import tempfile
 
 import torch
 from huggingface_hub import hf_hub_download
 
 _HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.dirname(os.path.abspath(_HERE)))  # repo root, for retinaface.commons
 sys.path.insert(0, _HERE)
 sys.path.insert(0, os.path.join(_HERE, "pytorch"))
 
-from pytorch.data.config import cfg_mnet  # noqa: E402
+from pytorch.data.config import cfg_mnet, cfg_re50  # noqa: E402
 from pytorch.models.retinaface import RetinaFace  # noqa: E402
+from retinaface.commons.priors import generate_priors, priors_path, save_priors  # noqa: E402
+from retinaface.end_to_end import OUTPUT_PATH as END_TO_END_PATH, export_end_to_end  # noqa: E402
+from retinaface.raw_input import OUTPUT_PATH as RAW_INPUT_PATH, export_raw_input  # noqa: E402
 
 WEIGHTS_REPO = "py-feat/retinaface"
-WEIGHTS_FILE = "mobilenet0.25_Final.pth"
+
+# Training config, final weights file in WEIGHTS_REPO and exported model file, per backbone
+BACKBONES = {
+    "mobilenet": (cfg_mnet, "mobilenet0.25_Final.pth", "retinaface.onnx"),
+    "resnet50": (cfg_re50, "Resnet50_Final.pth", "retinaface.resnet50.onnx"),
+}
+WEIGHTS_FILE = BACKBONES["mobilenet"][1]
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "retinaface.onnx")
+TORCHSCRIPT_PATH = os.path.join(os.path.dirname(__file__), "retinaface.torchscript.pt")
 
-# Disable pretrain weight loading — we supply the final weights ourselves
-_cfg = {**cfg_mnet, "pretrain": False}
-IMAGE_SIZE = _cfg["image_size"]
+# The end-to-end and raw-input variants bake the input size into the graph, and the raw-input variant needs
+# antialiased Resize, so they are built from a fixed-size export at this opset
+IN_GRAPH_OPSET = 18
 
 
-def load_model(weights_path: str) -> torch.nn.Module:
-    net = RetinaFace(cfg=_cfg, phase="test")
+def load_model(weights_path: str, cfg: dict = cfg_mnet) -> torch.nn.Module:
+    # Disable pretrain weight loading — we supply the final weights ourselves
+    net = RetinaFace(cfg={**cfg, "pretrain": False}, phase="test")
     state = torch.load(weights_path, map_location="cpu")
     if "state_dict" in state:
         state = state["state_dict"]
@@ -40,21 +57,119 @@ def load_model(weights_path: str) -> torch.nn.Module:
     return net
 
 
-def export(net: torch.nn.Module, output_path: str) -> None:
-    dummy = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+def export(
+    net: torch.nn.Module,
+    output_path: str,
+    image_size: int = cfg_mnet["image_size"],
+    fixed_size: bool = False,
+    opset_version: int = 11,
+) -> None:
+    """
+    Export the model to ONNX, with a dynamic batch size
+    Args:
+        net (Module): model from load_model
+        output_path (str): ONNX file to write
+        image_size (int): input height and width to trace with
+        fixed_size (bool): keep the input at image_size square, instead of dynamic height and width
+        opset_version (int): ONNX opset to export to
+    """
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    if fixed_size:
+        dynamic_axes = {name: {0: "batch"} for name in ("input", "bbox", "cls", "ldm")}
+    else:
+        dynamic_axes = {
+            "input": {0: "batch", 2: "height", 3: "width"},
+            "bbox": {0: "batch", 1: "anchors"},
+            "cls": {0: "batch", 1: "anchors"},
+            "ldm": {0: "batch", 1: "anchors"},
+        }
     torch.onnx.export(
         net,
         dummy,
         output_path,
         input_names=["input"],
         output_names=["bbox", "cls", "ldm"],
-        opset_version=11,
-        dynamic_axes={"input": {0: "batch"}},
+        opset_version=opset_version,
+        dynamic_axes=dynamic_axes,
     )
     print(f"Saved {output_path}")
 
 
+def export_in_graph_variants(
+    net: torch.nn.Module, end_to_end_path: str | None = None, raw_input_path: str | None = None
+) -> None:
+    """
+    Write the end-to-end and raw-input variants, from an intermediate fixed-size export at IN_GRAPH_OPSET
+    Args:
+        net (Module): MobileNet model from load_model
+        end_to_end_path (str): where to write the end-to-end model, or None to skip it
+        raw_input_path (str): where to write the raw-input model, or None to skip it
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        fixed_path = os.path.join(directory, "retinaface.fixed.onnx")
+        export(net, fixed_path, cfg_mnet["image_size"], fixed_size=True, opset_version=IN_GRAPH_OPSET)
+        if end_to_end_path:
+            export_end_to_end(fixed_path, end_to_end_path)
+        if raw_input_path:
+            export_raw_input(fixed_path, raw_input_path)
+
+
+def export_torchscript(net: torch.nn.Module, output_path: str, image_size: int = cfg_mnet["image_size"]) -> None:
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    with torch.inference_mode():
+        traced = torch.jit.freeze(torch.jit.trace(net, dummy))
+    traced.save(output_path)
+    print(f"Saved {output_path}")
+
+
+def export_priors(output_dir: str, cfg: dict = cfg_mnet) -> None:
+    """Precompute the anchors for the export size so the runtime can memory-map them instead."""
+    image_size = (cfg["image_size"], cfg["image_size"])
+    path = priors_path(output_dir, image_size)
+    save_priors(path, generate_priors(cfg["min_sizes"], cfg["steps"], image_size))
+    print(f"Saved {path}")
+
+
 if __name__ == "__main__":
-    weights_path = hf_hub_download(repo_id=WEIGHTS_REPO, filename=WEIGHTS_FILE)
-    net = load_model(weights_path)
-    export(net, OUTPUT_PATH)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backbone",
+        choices=sorted(BACKBONES),
+        default="mobilenet",
+        help="resnet50 writes retinaface.resnet50.onnx for the accurate tier, and needs torchvision",
+    )
+    parser.add_argument("--weights", help=f"local weights file instead of downloading it from {WEIGHTS_REPO}")
+    parser.add_argument(
+        "--end-to-end",
+        action="store_true",
+        help=f"also write {os.path.basename(END_TO_END_PATH)}, with decoding, thresholding and NMS in the graph",
+    )
+    parser.add_argument(
+        "--raw-input",
+        action="store_true",
+        help=f"also write {os.path.basename(RAW_INPUT_PATH)}, which takes the uint8 HWC image and preprocesses it "
+        "in-graph",
+    )
+    parser.add_argument(
+        "--torchscript",
+        action="store_true",
+        help=f"also write {os.path.basename(TORCHSCRIPT_PATH)}, for the torchscript inference backend",
+    )
+    args = parser.parse_args()
+    if args.backbone != "mobilenet" and (args.end_to_end or args.raw_input or args.torchscript):
+        parser.error("--end-to-end, --raw-input and --torchscript are only available for the mobilenet backbone")
+
+    cfg, weights_file, output_file = BACKBONES[args.backbone]
+    output_path = os.path.join(_HERE, output_file)
+    weights_path = args.weights or hf_hub_download(repo_id=WEIGHTS_REPO, filename=weights_file)
+    net = load_model(weights_path, cfg)
+    export(net, output_path, cfg["image_size"])
+    export_priors(_HERE, cfg)
+    if args.end_to_end or args.raw_input:
+        export_in_graph_variants(
+            net,
+            END_TO_END_PATH if args.end_to_end else None,
+            RAW_INPUT_PATH if args.raw_input else None,
+        )
+    if args.torchscript:
+        export_torchscript(net, TORCHSCRIPT_PATH)
@@ -1,111 +1,534 @@
+import functools
 import math
-from typing import Any, Callable
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
 
 import numpy as np
 
 from retinaface.commons import postprocess, preprocess
+from retinaface.commons.priors import generate_priors, load_priors, priors_path
+from retinaface.pytorch.data.config import cfg_mnet, cfg_re50
 
-# MobileNet0.25 anchor config (biubug6/Pytorch_Retinaface)
-_MIN_SIZES = [[16, 32], [64, 128], [256, 512]]
-_STEPS = [8, 16, 32]
-_VARIANCE = [0.1, 0.2]
-_IMAGE_SIZE = 640
 
+@dataclass(frozen=True)
+class AnchorConfig:
+    """Prior box layout and input size of an exported model, from its training config"""
 
-def _generate_priors() -> np.ndarray:
-    priors = []
-    for min_sizes, step in zip(_MIN_SIZES, _STEPS):
-        feat_h = math.ceil(_IMAGE_SIZE / step)
-        feat_w = math.ceil(_IMAGE_SIZE / step)
-        for i in range(feat_h):
-            for j in range(feat_w):
-                for min_size in min_sizes:
-                    cx = (j + 0.5) * step / _IMAGE_SIZE
-                    cy = (i + 0.5) * step / _IMAGE_SIZE
-                    w = min_size / _IMAGE_SIZE
-                    h = min_size / _IMAGE_SIZE
-                    priors.append([cx, cy, w, h])
-    return np.array(priors, dtype=np.float32)
+    name: str
+    min_sizes: tuple[tuple[int, ...], ...]
+    steps: tuple[int, ...]
+    variance: tuple[float, float]
+    image_size: int
 
+    @classmethod
+    def from_cfg(cls, cfg: dict[str, Any]) -> "AnchorConfig":
+        return cls(
+            name=cfg["name"],
+            min_sizes=tuple(tuple(sizes) for sizes in cfg["min_sizes"]),
+            steps=tuple(cfg["steps"]),
+            variance=(cfg["variance"][0], cfg["variance"][1]),
+            image_size=cfg["image_size"],
+        )
+
+    @property
+    def stride(self) -> int:
+        return max(self.steps)
+
+
+# Anchor configs of the exported models (biubug6/Pytorch_Retinaface)
+MOBILENET = AnchorConfig.from_cfg(cfg_mnet)
+RESNET50 = AnchorConfig.from_cfg(cfg_re50)
+
+_NMS_THRESHOLD = 0.4
+
+# Tiled mode: overlap between neighbouring tiles, which should exceed the faces it is meant to find,
+# and how close (px) a box may come to an inner tile edge before it is treated as a cut-off face
+_TILE_OVERLAP = 160
+_TILE_EDGE_MARGIN = 2
+# Views per model call in tiled mode; each 640×640 view is 4.9 MB of float32 input
+_TILE_BATCH_SIZE = 16
 
-_PRIORS = _generate_priors()
+# Two-pass mode: crop side relative to the coarse face box, and the IoU a refined box needs with
+# its coarse candidate to replace it
+_CROP_SCALE = 2.0
+_REFINE_MIN_IOU = 0.3
 
+_PRIORS_DIR = os.path.dirname(__file__)
 
-def _decode_boxes(loc: np.ndarray) -> np.ndarray:
+# Number of (H, W) input shapes whose priors are kept in memory
+_PRIOR_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=_PRIOR_CACHE_SIZE)
+def _generate_priors(
+    image_size: tuple[int, int] = (MOBILENET.image_size, MOBILENET.image_size), anchors: AnchorConfig = MOBILENET
+) -> np.ndarray:
+    # Prefer a precomputed artefact shipped next to the model, memory-mapped read-only. Artefacts are
+    # keyed on the input size only, which is enough while all configs share min_sizes and steps.
+    priors = load_priors(priors_path(_PRIORS_DIR, image_size))
+    if priors is not None:
+        return priors
+    priors = generate_priors(anchors.min_sizes, anchors.steps, image_size)
+    priors.setflags(write=False)  # shared between calls via the cache
+    return priors
+
+
+def _decode_boxes(
+    loc: np.ndarray, priors: np.ndarray, image_size: tuple[int, int], variance: tuple[float, float] = MOBILENET.variance
+) -> np.ndarray:
     boxes = np.concatenate(
         [
-            _PRIORS[:, :2] + loc[:, :2] * _VARIANCE[0] * _PRIORS[:, 2:],
-            _PRIORS[:, 2:] * np.exp(loc[:, 2:] * _VARIANCE[1]),
+            priors[:, :2] + loc[:, :2] * variance[0] * priors[:, 2:],
+            priors[:, 2:] * np.exp(loc[:, 2:] * variance[1]),
         ],
         axis=1,
     )
     boxes[:, :2] -= boxes[:, 2:] / 2  # center → corner
     boxes[:, 2:] += boxes[:, :2]
-    return boxes * _IMAGE_SIZE
-
-
-def _decode_landmarks(pre: np.ndarray) -> np.ndarray:
-    return (
-        np.concatenate(
-            [
-                _PRIORS[:, :2] + pre[:, 0:2] * _VARIANCE[0] * _PRIORS[:, 2:],
-                _PRIORS[:, :2] + pre[:, 2:4] * _VARIANCE[0] * _PRIORS[:, 2:],
-                _PRIORS[:, :2] + pre[:, 4:6] * _VARIANCE[0] * _PRIORS[:, 2:],
-                _PRIORS[:, :2] + pre[:, 6:8] * _VARIANCE[0] * _PRIORS[:, 2:],
-                _PRIORS[:, :2] + pre[:, 8:10] * _VARIANCE[0] * _PRIORS[:, 2:],
-            ],
-            axis=1,
-        )
-        * _IMAGE_SIZE
-    )
+    im_height, im_width = image_size
+    return boxes * np.array([im_width, im_height, im_width, im_height], dtype=np.float32)
 
 
-def detect_faces(
-    img_path: str | np.ndarray,
-    model: Callable[[np.ndarray], list[np.ndarray]],
-    threshold: float = 0.9,
-    allow_upscaling: bool = True,
-) -> list[dict[str, Any]]:
-    img = preprocess.get_image(img_path)
-    im_tensor, im_shape, im_scale, im_offset = preprocess.preprocess_image(img, allow_upscaling)
+def _decode_landmarks(
+    pre: np.ndarray, priors: np.ndarray, image_size: tuple[int, int], variance: tuple[float, float] = MOBILENET.variance
+) -> np.ndarray:
+    im_height, im_width = image_size
+    landmarks = priors[:, np.newaxis, :2] + pre.reshape(-1, 5, 2) * variance[0] * priors[:, np.newaxis, 2:]
+    return (landmarks * np.array([im_width, im_height], dtype=np.float32)).reshape(-1, 10)
 
-    bbox_raw, cls_raw, ldm_raw = model(im_tensor)
 
-    bbox = bbox_raw[0]  # (N, 4)
-    cls = cls_raw[0]    # (N, 2)
-    ldm = ldm_raw[0]    # (N, 10)
+@functools.lru_cache(maxsize=_PRIOR_CACHE_SIZE)
+def _anchor_thresholds(
+    image_size: tuple[int, int], thresholds: tuple[float, ...], anchors: AnchorConfig = MOBILENET
+) -> np.ndarray:
+    """Expand one score threshold per feature level into one per anchor."""
+    if len(thresholds) != len(anchors.steps):
+        raise ValueError(f"Expected {len(anchors.steps)} per-level thresholds, got {len(thresholds)}.")
+    im_height, im_width = image_size
+    level_sizes = [
+        math.ceil(im_height / step) * math.ceil(im_width / step) * len(min_sizes)
+        for min_sizes, step in zip(anchors.min_sizes, anchors.steps)
+    ]
+    out = np.repeat(np.asarray(thresholds, dtype=np.float64), level_sizes)
+    out.setflags(write=False)
+    return out
 
-    boxes = _decode_boxes(bbox)        # pixels in 640×640 space
-    landmarks = _decode_landmarks(ldm)  # pixels in 640×640 space
-    scores = cls[:, 1]
 
-    keep = np.where(scores >= threshold)[0]
-    if len(keep) == 0:
-        return []
-    boxes, landmarks, scores = boxes[keep], landmarks[keep], scores[keep]
+def _select_anchors(
+    scores: np.ndarray,
+    threshold: float | Sequence[float],
+    image_size: tuple[int, int],
+    top_k: int | None,
+    anchors: AnchorConfig = MOBILENET,
+) -> np.ndarray:
+    if isinstance(threshold, (int, float)):
+        keep = np.flatnonzero(scores >= threshold)
+    else:
+        keep = np.flatnonzero(scores >= _anchor_thresholds(image_size, tuple(threshold), anchors))
+    if top_k is not None and len(keep) > top_k:
+        keep = keep[np.argpartition(scores[keep], -top_k)[-top_k:]]
+    return keep
+
+
+def _decode(
+    bbox: np.ndarray,
+    cls: np.ndarray,
+    ldm: np.ndarray,
+    im_scale: float,
+    im_offset: tuple[float, float],
+    threshold: float | Sequence[float],
+    image_size: tuple[int, int],
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decode above-threshold anchors into (N, 4) boxes, (N, 5, 2) landmarks and (N,) scores in image pixels."""
+    # Filter on score first so that only the surviving anchors are decoded
+    keep = _select_anchors(cls[:, 1], threshold, image_size, top_k, anchors)
+    priors = _generate_priors(image_size, anchors)[keep]
+    boxes = _decode_boxes(bbox[keep], priors, image_size, anchors.variance)        # pixels in input tensor space
+    landmarks = _decode_landmarks(ldm[keep], priors, image_size, anchors.variance)  # pixels in input tensor space
+    scores = cls[keep, 1]
 
     # transform back to original image coordinates
     boxes[:, 0], boxes[:, 1] = postprocess.transform_bbox(boxes[:, 0], boxes[:, 1], im_scale, im_offset)
     boxes[:, 2], boxes[:, 3] = postprocess.transform_bbox(boxes[:, 2], boxes[:, 3], im_scale, im_offset)
 
     lm_x, lm_y = postprocess.transform_bbox(landmarks[:, 0::2], landmarks[:, 1::2], im_scale, im_offset)
-    landmarks_out = np.stack([lm_x, lm_y], axis=2)  # (N, 5, 2)
+    return boxes, np.stack([lm_x, lm_y], axis=2), scores
+
 
+def _nms_faces(boxes: np.ndarray, landmarks: np.ndarray, scores: np.ndarray) -> list[dict[str, Any]]:
     pre_det = np.hstack([boxes[:, :4], scores[:, np.newaxis]]).astype(np.float32)
-    keep = postprocess.cpu_nms(pre_det, 0.4)
-    boxes, scores, landmarks_out = boxes[keep], scores[keep], landmarks_out[keep]
+    keep = postprocess.nms(pre_det, _NMS_THRESHOLD)
+    return _to_dicts(boxes[keep], landmarks[keep], scores[keep])
 
+
+def _to_dicts(boxes: np.ndarray, landmarks: np.ndarray, scores: np.ndarray) -> list[dict[str, Any]]:
     return [
         {
             "score": float(scores[i]),
             "facial_area": boxes[i, :4].astype(int).tolist(),
             "landmarks": {
-                "right_eye": landmarks_out[i][0].tolist(),
-                "left_eye": landmarks_out[i][1].tolist(),
-                "nose": landmarks_out[i][2].tolist(),
-                "mouth_right": landmarks_out[i][3].tolist(),
-                "mouth_left": landmarks_out[i][4].tolist(),
+                "right_eye": landmarks[i][0].tolist(),
+                "left_eye": landmarks[i][1].tolist(),
+                "nose": landmarks[i][2].tolist(),
+                "mouth_right": landmarks[i][3].tolist(),
+                "mouth_left": landmarks[i][4].tolist(),
             },
         }
         for i in range(len(boxes))
     ]
+
+
+def _postprocess(
+    bbox: np.ndarray,
+    cls: np.ndarray,
+    ldm: np.ndarray,
+    im_scale: float,
+    im_offset: tuple[float, float],
+    threshold: float | Sequence[float],
+    image_size: tuple[int, int],
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    return _nms_faces(*_decode(bbox, cls, ldm, im_scale, im_offset, threshold, image_size, top_k, anchors))
+
+
+def detect_faces(
+    img_path: str | np.ndarray,
+    model: Callable[[np.ndarray], list[np.ndarray]],
+    threshold: float | Sequence[float] = 0.9,
+    allow_upscaling: bool = True,
+    keep_aspect_ratio: bool = False,
+    top_k: int | None = None,
+    tile_above_pixels: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    """
+    Detect faces in one image
+    Args:
+        see detect_faces_batch
+        tile_above_pixels (int): switch to detect_faces_tiled for images with more pixels than this,
+            or None to never tile
+    Returns:
+        detected faces
+    """
+    if tile_above_pixels is not None:
+        img = preprocess.get_image(img_path, copy=False)
+        if img.shape[0] * img.shape[1] > tile_above_pixels:
+            return detect_faces_tiled(img, model, threshold=threshold, top_k=top_k, anchors=anchors)
+        img_path = img
+    return detect_faces_batch(
+        [img_path],
+        model,
+        threshold=threshold,
+        allow_upscaling=allow_upscaling,
+        keep_aspect_ratio=keep_aspect_ratio,
+        top_k=top_k,
+        anchors=anchors,
+    )[0]
+
+
+def detect_faces_batch(
+    images: Sequence[str | np.ndarray],
+    model: Callable[[np.ndarray], list[np.ndarray]],
+    threshold: float | Sequence[float] = 0.9,
+    allow_upscaling: bool = True,
+    batch_size: int | None = None,
+    keep_aspect_ratio: bool = False,
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[list[dict[str, Any]]]:
+    """
+    Detect faces in several images with one model call per batch
+    Args:
+        images (list of str or numpy array): image paths or pre-loaded numpy arrays (RGB format)
+        model: callable mapping an NCHW tensor to the raw [bbox, cls, ldm] outputs
+        threshold (float or list of float): minimum face score, or one minimum per feature level
+            (strides 8, 16, 32, i.e. small to large faces)
+        allow_upscaling (bool)
+        batch_size (int): maximum number of images per model call, or None to send them all at once
+        keep_aspect_ratio (bool): resize to a stride-aligned size with the image's own aspect ratio instead of
+            letterboxing to a square. Requires a model exported with dynamic height and width.
+        top_k (int): maximum number of above-threshold anchors to decode and pass to NMS, or None for all
+        anchors (AnchorConfig): prior layout and input size of the model, MOBILENET or RESNET50
+    Returns:
+        detected faces for each image, in the same order as the inputs
+    """
+    batch_size = batch_size or max(len(images), 1)
+    results: list[list[dict[str, Any]]] = []
+    for start in range(0, len(images), batch_size):
+        resized = [
+            preprocess.resize_for_model(
+                preprocess.get_image(image, copy=False), allow_upscaling, anchors.image_size, keep_aspect_ratio
+            )
+            for image in images[start : start + batch_size]
+        ]
+        # Images of different shapes are zero-padded bottom/right to the largest stride-aligned size. Letterboxed
+        # images already have the export size, which need not be aligned (840 for ResNet50).
+        stride = anchors.stride if keep_aspect_ratio else 1
+        image_size = (
+            max(preprocess.aligned_size(img.shape[0], stride) for img, _, _ in resized),
+            max(preprocess.aligned_size(img.shape[1], stride) for img, _, _ in resized),
+        )
+        im_tensor = preprocess.get_buffer((len(resized), 3, *image_size))
+        for i, (img, _, _) in enumerate(resized):
+            preprocess.write_tensor(img, im_tensor[i])
+
+        bbox_raw, cls_raw, ldm_raw = model(im_tensor)  # (B, N, 4), (B, N, 2), (B, N, 10)
+
+        results.extend(
+            _postprocess(
+                bbox_raw[i], cls_raw[i], ldm_raw[i], im_scale, im_offset, threshold, image_size, top_k, anchors
+            )
+            for i, (_, im_scale, im_offset) in enumerate(resized)
+        )
+    return results
+
+
+def _tile_starts(length: int, tile_size: int, overlap: int) -> list[int]:
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, tile_size - overlap))
+    return starts + [length - tile_size]
+
+
+def _inside_tile(
+    boxes: np.ndarray, origin: tuple[int, int], tile_shape: tuple[int, int], img_shape: tuple[int, int]
+) -> np.ndarray:
+    """Mask of boxes that do not touch an inner tile edge, i.e. that are not faces cut off by the tile."""
+    x0, y0 = origin
+    tile_h, tile_w = tile_shape
+    img_h, img_w = img_shape
+    mask = np.ones(len(boxes), dtype=bool)
+    if x0 > 0:
+        mask &= boxes[:, 0] > x0 + _TILE_EDGE_MARGIN
+    if y0 > 0:
+        mask &= boxes[:, 1] > y0 + _TILE_EDGE_MARGIN
+    if x0 + tile_w < img_w:
+        mask &= boxes[:, 2] < x0 + tile_w - _TILE_EDGE_MARGIN
+    if y0 + tile_h < img_h:
+        mask &= boxes[:, 3] < y0 + tile_h - _TILE_EDGE_MARGIN
+    return mask
+
+
+def detect_faces_tiled(
+    img_path: str | np.ndarray,
+    model: Callable[[np.ndarray], list[np.ndarray]],
+    threshold: float | Sequence[float] = 0.9,
+    overlap: int = _TILE_OVERLAP,
+    batch_size: int | None = _TILE_BATCH_SIZE,
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    """
+    Detect faces at full resolution by splitting the image into overlapping model-sized tiles
+    A downscaled view of the whole image runs in the same batch as the tiles so that faces too large
+    for one tile are still found. Detections from all views are merged with NMS across the tile seams.
+    Args:
+        img_path (str or numpy array): image path or pre-loaded numpy array (RGB format)
+        model: callable mapping an NCHW tensor to the raw [bbox, cls, ldm] outputs
+        threshold (float or list of float): minimum face score, or one minimum per feature level
+        overlap (int): overlap between neighbouring tiles in pixels
+        batch_size (int): maximum number of views per model call, or None to run them all at once
+        top_k (int): maximum number of above-threshold anchors to decode per view
+        anchors (AnchorConfig): prior layout and input size of the model, which is also the tile size
+    Returns:
+        detected faces
+    """
+    img = preprocess.get_image(img_path, copy=False)
+    tile_size = anchors.image_size
+    img_h, img_w = img.shape[0:2]
+
+    # (view, im_scale, im_offset, tile origin) with the whole-image view first
+    views: list[tuple[np.ndarray, float, tuple[float, float], tuple[int, int] | None]] = [
+        (*preprocess.resize_for_model(img, allow_upscaling=True, max_size=tile_size), None)
+    ]
+    for y0 in _tile_starts(img_h, tile_size, overlap):
+        for x0 in _tile_starts(img_w, tile_size, overlap):
+            tile = img[y0 : y0 + tile_size, x0 : x0 + tile_size]
+            views.append((tile, 1.0, (-float(x0), -float(y0)), (x0, y0)))
+
+    image_size = (tile_size, tile_size)
+    batch_size = batch_size or len(views)
+    decoded = []
+    for start in range(0, len(views), batch_size):
+        chunk = views[start : start + batch_size]
+        im_tensor = preprocess.get_buffer((len(chunk), 3, *image_size))
+        for i, (view, _, _, _) in enumerate(chunk):
+            preprocess.write_tensor(view, im_tensor[i])
+
+        bbox_raw, cls_raw, ldm_raw = model(im_tensor)
+
+        for i, (view, im_scale, im_offset, origin) in enumerate(chunk):
+            boxes, landmarks, scores = _decode(
+                bbox_raw[i], cls_raw[i], ldm_raw[i], im_scale, im_offset, threshold, image_size, top_k, anchors
+            )
+            if origin is not None:
+                mask = _inside_tile(boxes, origin, view.shape[0:2], (img_h, img_w))
+                boxes, landmarks, scores = boxes[mask], landmarks[mask], scores[mask]
+            decoded.append((boxes, landmarks, scores))
+
+    return _nms_faces(*(np.concatenate(parts, axis=0) for parts in zip(*decoded)))
+
+
+def _crop_window(box: np.ndarray, img_shape: tuple[int, int], crop_scale: float) -> tuple[int, int, int, int]:
+    """Square window of crop_scale × the box size around its centre, clipped to the image."""
+    img_h, img_w = img_shape
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    half = crop_scale * max(box[2] - box[0], box[3] - box[1], 1.0) / 2
+    x0, y0 = max(int(cx - half), 0), max(int(cy - half), 0)
+    x1, y1 = min(int(np.ceil(cx + half)), img_w), min(int(np.ceil(cy + half)), img_h)
+    return x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)
+
+
+def detect_faces_two_pass(
+    img_path: str | np.ndarray,
+    model: Callable[[np.ndarray], list[np.ndarray]],
+    threshold: float | Sequence[float] = 0.9,
+    coarse_size: int | None = None,
+    coarse_threshold: float | Sequence[float] = 0.5,
+    crop_scale: float = _CROP_SCALE,
+    batch_size: int | None = _TILE_BATCH_SIZE,
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    """
+    Detect faces with a cheap low-resolution pass, then refine each candidate on an upscaled crop
+    Only the crops around candidate faces run at the full model resolution, which gives accurate eye
+    landmarks without running the whole image at high resolution. All crops go through the model in
+    one batch.
+    Args:
+        img_path (str or numpy array): image path or pre-loaded numpy array (RGB format)
+        model: callable mapping an NCHW tensor to the raw [bbox, cls, ldm] outputs
+        threshold (float or list of float): minimum score of a refined face
+        coarse_size (int): input size of the coarse pass, or None for the model's own. Other sizes need a
+            model exported with dynamic height and width.
+        coarse_threshold (float or list of float): minimum score of a coarse candidate
+        crop_scale (float): crop side relative to the candidate box, to give the model some context
+        batch_size (int): maximum number of crops per model call, or None to run them all at once
+        top_k (int): maximum number of above-threshold anchors to decode per view
+        anchors (AnchorConfig): prior layout and input size of the model
+    Returns:
+        detected faces
+    """
+    img = preprocess.get_image(img_path, copy=False)
+    coarse_size = coarse_size or anchors.image_size
+    img_shape = (img.shape[0], img.shape[1])
+
+    # Coarse pass
+    resized, im_scale, im_offset = preprocess.resize_for_model(img, allow_upscaling=True, max_size=coarse_size)
+    coarse_image_size = (coarse_size, coarse_size)
+    im_tensor = preprocess.get_buffer((1, 3, *coarse_image_size))
+    preprocess.write_tensor(resized, im_tensor[0])
+    bbox_raw, cls_raw, ldm_raw = model(im_tensor)
+    candidates = _decode(
+        bbox_raw[0], cls_raw[0], ldm_raw[0], im_scale, im_offset, coarse_threshold, coarse_image_size, top_k, anchors
+    )
+    keep = postprocess.nms(np.hstack([candidates[0], candidates[2][:, np.newaxis]]), _NMS_THRESHOLD)
+    candidate_boxes = candidates[0][keep]
+    if len(candidate_boxes) == 0:
+        return []
+
+    # Refinement pass on crops, each letterboxed and upscaled to the model resolution
+    crops = []
+    for box in candidate_boxes:
+        x0, y0, x1, y1 = _crop_window(box, img_shape, crop_scale)
+        crop, crop_scale_factor, crop_offset = preprocess.resize_for_model(
+            img[y0:y1, x0:x1], allow_upscaling=True, max_size=anchors.image_size
+        )
+        crops.append((crop, crop_scale_factor, (crop_offset[0] - x0, crop_offset[1] - y0)))
+
+    image_size = (anchors.image_size, anchors.image_size)
+    batch_size = batch_size or len(crops)
+    refined = []
+    for start in range(0, len(crops), batch_size):
+        chunk = crops[start : start + batch_size]
+        im_tensor = preprocess.get_buffer((len(chunk), 3, *image_size))
+        for i, (crop, _, _) in enumerate(chunk):
+            preprocess.write_tensor(crop, im_tensor[i])
+
+        bbox_raw, cls_raw, ldm_raw = model(im_tensor)
+
+        for i, (_, crop_scale_factor, crop_offset) in enumerate(chunk):
+            boxes, landmarks, scores = _decode(
+                bbox_raw[i],
+                cls_raw[i],
+                ldm_raw[i],
+                crop_scale_factor,
+                crop_offset,
+                threshold,
+                image_size,
+                top_k,
+                anchors,
+            )
+            if len(boxes) == 0:
+                continue
+            # The crop may also contain neighbouring faces, so keep the detection matching the candidate
+            overlap = postprocess.iou(candidate_boxes[start + i], boxes)
+            best = int(np.argmax(overlap))
+            if overlap[best] >= _REFINE_MIN_IOU:
+                refined.append((boxes[best : best + 1], landmarks[best : best + 1], scores[best : best + 1]))
+
+    if not refined:
+        return []
+    return _nms_faces(*(np.concatenate(parts, axis=0) for parts in zip(*refined)))
+
+
+def detect_faces_end_to_end(
+    img_path: str | np.ndarray,
+    model: Callable[[np.ndarray, float], list[np.ndarray]],
+    threshold: float = 0.9,
+    allow_upscaling: bool = True,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    """
+    Detect faces with a model that decodes, thresholds and runs NMS in-graph (see retinaface/end_to_end.py)
+    Args:
+        img_path (str or numpy array): image path or pre-loaded numpy array (RGB format)
+        model: callable mapping an NCHW tensor and a score threshold to the
+            [batch_index, boxes, scores, landmarks] outputs of the end-to-end model
+        threshold (float): minimum face score
+        allow_upscaling (bool)
+        anchors (AnchorConfig): config of the model the end-to-end graph was built on
+    Returns:
+        detected faces
+    """
+    img = preprocess.get_image(img_path, copy=False)
+    resized, im_scale, im_offset = preprocess.resize_for_model(img, allow_upscaling, anchors.image_size)
+    im_tensor = preprocess.get_buffer((1, 3, anchors.image_size, anchors.image_size))
+    preprocess.write_tensor(resized, im_tensor[0])
+
+    _, boxes, scores, landmarks = model(im_tensor, threshold)  # only the kept faces, in input tensor pixels
+
+    boxes[:, 0], boxes[:, 1] = postprocess.transform_bbox(boxes[:, 0], boxes[:, 1], im_scale, im_offset)
+    boxes[:, 2], boxes[:, 3] = postprocess.transform_bbox(boxes[:, 2], boxes[:, 3], im_scale, im_offset)
+    lm_x, lm_y = postprocess.transform_bbox(landmarks[:, 0::2], landmarks[:, 1::2], im_scale, im_offset)
+    return _to_dicts(boxes, np.stack([lm_x, lm_y], axis=2), scores)
+
+
+def detect_faces_raw(
+    img_path: str | np.ndarray,
+    model: Callable[[np.ndarray], list[np.ndarray]],
+    threshold: float | Sequence[float] = 0.9,
+    top_k: int | None = None,
+    anchors: AnchorConfig = MOBILENET,
+) -> list[dict[str, Any]]:
+    """
+    Detect faces with a model that letterboxes and normalises the image in-graph (see retinaface/raw_input.py)
+    Args:
+        img_path (str or numpy array): image path or pre-loaded numpy array (RGB format)
+        model: callable mapping an RGB uint8 (H, W, 3) image to the [bbox, cls, ldm] outputs
+        threshold (float or sequence of 3 floats): minimum face score, or one per FPN level
+        top_k (int): keep only the top_k highest scoring anchors before NMS
+        anchors (AnchorConfig): config of the model the raw-input graph was built on
+    Returns:
+        detected faces
+    """
+    img = np.ascontiguousarray(preprocess.get_image(img_path, copy=False))
+    image_size = (anchors.image_size, anchors.image_size)
+    im_scale, im_offset = preprocess.letterbox_params(img.shape[0:2], image_size)
+
+    bbox_raw, cls_raw, ldm_raw = model(img)
+    return _postprocess(bbox_raw[0], cls_raw[0], ldm_raw[0], im_scale, im_offset, threshold, image_size, top_k, anchors)
@@ -0,0 +1,171 @@
+"""
+Append prior decoding, score thresholding and NonMaxSuppression to an exported RetinaFace ONNX model.
+
+The resulting model takes the preprocessed image and a score threshold, and
+returns only the final faces (batch_index, boxes, scores, landmarks) in input
+tensor pixels, so none of the raw per-anchor outputs leave the session.
+The priors are baked in, so the input model needs a fixed input height and
+width. convert_model.py exports retinaface.onnx with a dynamic size, so build
+the end-to-end model from the weights with:
+
+    poetry run python retinaface/convert_model.py --end-to-end
+
+which makes its own fixed-size export for this step. Running this script
+directly only works on a fixed-size model, e.g. the checked-in retinaface.onnx:
+
+    poetry run python retinaface/end_to_end.py --input retinaface/retinaface.onnx
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import onnx
+from onnx import TensorProto, compose, helper, numpy_helper
+
+_HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.dirname(os.path.abspath(_HERE)))  # repo root, for retinaface.detect
+
+from retinaface import detect  # noqa: E402
+
+INPUT_PATH = os.path.join(_HERE, "retinaface.onnx")
+OUTPUT_PATH = os.path.join(_HERE, "retinaface.e2e.onnx")
+
+# Upper bound on faces per image kept by NonMaxSuppression
+MAX_FACES = 750
+
+
+def _const(name: str, value: np.ndarray | list | float) -> onnx.TensorProto:
+    array = np.asarray(value)
+    if array.dtype == np.float64:
+        array = array.astype(np.float32)
+    return numpy_helper.from_array(array, name=name)
+
+
+def postprocess_model(
+    image_size: tuple[int, int],
+    ir_version: int,
+    opset: int,
+    max_faces: int = MAX_FACES,
+    anchors: detect.AnchorConfig = detect.MOBILENET,
+) -> onnx.ModelProto:
+    """
+    Graph mapping the raw bbox/cls/ldm outputs to the faces kept by NMS, mirroring retinaface.detect
+    """
+    im_height, im_width = image_size
+    priors = np.asarray(detect._generate_priors(image_size, anchors), dtype=np.float32)
+    variance_xy, variance_wh = anchors.variance
+
+    initializers = [
+        _const("prior_xy", priors[:, :2]),
+        _const("prior_wh", priors[:, 2:]),
+        _const("prior_point_xy", priors[:, np.newaxis, :2]),
+        _const("prior_point_wh", priors[:, np.newaxis, 2:]),
+        _const("variance_xy", np.float32(variance_xy)),
+        _const("variance_wh", np.float32(variance_wh)),
+        _const("half", np.float32(0.5)),
+        _const("box_scale", np.array([im_width, im_height, im_width, im_height], dtype=np.float32)),
+        _const("point_scale", np.array([im_width, im_height], dtype=np.float32)),
+        _const("split_xy_wh", np.array([2, 2], dtype=np.int64)),
+        _const("landmark_points_shape", np.array([0, -1, 5, 2], dtype=np.int64)),
+        _const("landmark_flat_shape", np.array([0, -1, 10], dtype=np.int64)),
+        _const("face_class", np.array(1, dtype=np.int64)),
+        _const("class_axis", np.array([1], dtype=np.int64)),
+        _const("batch_and_box", np.array([0, 2], dtype=np.int64)),
+        _const("batch_column", np.array(0, dtype=np.int64)),
+        _const("max_faces", np.array([max_faces], dtype=np.int64)),
+        _const("iou_threshold", np.array([detect._NMS_THRESHOLD], dtype=np.float32)),
+    ]
+
+    nodes = [
+        # boxes: centre/size regression against the priors, then corners in pixels
+        helper.make_node("Split", ["bbox", "split_xy_wh"], ["loc_xy", "loc_wh"], axis=-1),
+        helper.make_node("Mul", ["loc_xy", "variance_xy"], ["loc_xy_var"]),
+        helper.make_node("Mul", ["loc_xy_var", "prior_wh"], ["centre_delta"]),
+        helper.make_node("Add", ["prior_xy", "centre_delta"], ["centre"]),
+        helper.make_node("Mul", ["loc_wh", "variance_wh"], ["loc_wh_var"]),
+        helper.make_node("Exp", ["loc_wh_var"], ["wh_scale"]),
+        helper.make_node("Mul", ["prior_wh", "wh_scale"], ["wh"]),
+        helper.make_node("Mul", ["wh", "half"], ["half_wh"]),
+        helper.make_node("Sub", ["centre", "half_wh"], ["top_left"]),
+        helper.make_node("Add", ["top_left", "wh"], ["bottom_right"]),
+        helper.make_node("Concat", ["top_left", "bottom_right"], ["norm_boxes"], axis=-1),
+        helper.make_node("Mul", ["norm_boxes", "box_scale"], ["all_boxes"]),
+        # landmarks: five points, each an offset from the prior centre
+        helper.make_node("Reshape", ["ldm", "landmark_points_shape"], ["ldm_points"]),
+        helper.make_node("Mul", ["ldm_points", "variance_xy"], ["ldm_var"]),
+        helper.make_node("Mul", ["ldm_var", "prior_point_wh"], ["ldm_delta"]),
+        helper.make_node("Add", ["prior_point_xy", "ldm_delta"], ["norm_points"]),
+        helper.make_node("Mul", ["norm_points", "point_scale"], ["points"]),
+        helper.make_node("Reshape", ["points", "landmark_flat_shape"], ["all_landmarks"]),
+        # thresholding and NMS on the face score
+        helper.make_node("Gather", ["cls", "face_class"], ["all_scores"], axis=2),
+        helper.make_node("Unsqueeze", ["all_scores", "class_axis"], ["nms_scores"]),
+        helper.make_node(
+            "NonMaxSuppression",
+            ["all_boxes", "nms_scores", "max_faces", "iou_threshold", "score_threshold"],
+            ["selected"],
+            center_point_box=0,
+        ),
+        helper.make_node("Gather", ["selected", "batch_and_box"], ["selected_anchors"], axis=1),
+        helper.make_node("Gather", ["selected", "batch_column"], ["batch_index"], axis=1),
+        helper.make_node("GatherND", ["all_boxes", "selected_anchors"], ["boxes"]),
+        helper.make_node("GatherND", ["all_scores", "selected_anchors"], ["scores"]),
+        helper.make_node("GatherND", ["all_landmarks", "selected_anchors"], ["landmarks"]),
+    ]
+
+    graph = helper.make_graph(
+        nodes,
+        "retinaface_postprocess",
+        inputs=[
+            helper.make_tensor_value_info("bbox", TensorProto.FLOAT, ["batch", "anchors", 4]),
+            helper.make_tensor_value_info("cls", TensorProto.FLOAT, ["batch", "anchors", 2]),
+            helper.make_tensor_value_info("ldm", TensorProto.FLOAT, ["batch", "anchors", 10]),
+            helper.make_tensor_value_info("score_threshold", TensorProto.FLOAT, [1]),
+        ],
+        outputs=[
+            helper.make_tensor_value_info("batch_index", TensorProto.INT64, ["faces"]),
+            helper.make_tensor_value_info("boxes", TensorProto.FLOAT, ["faces", 4]),
+            helper.make_tensor_value_info("scores", TensorProto.FLOAT, ["faces"]),
+            helper.make_tensor_value_info("landmarks", TensorProto.FLOAT, ["faces", 10]),
+        ],
+        initializer=initializers,
+    )
+    return helper.make_model(graph, ir_version=ir_version, opset_imports=[helper.make_opsetid("", opset)])
+
+
+def build_end_to_end(
+    model: onnx.ModelProto, max_faces: int = MAX_FACES, anchors: detect.AnchorConfig = detect.MOBILENET
+) -> onnx.ModelProto:
+    """
+    Merge the post-processing graph onto a model with raw bbox/cls/ldm outputs
+    Requires a fixed input height and width, since the priors are baked into the graph.
+    """
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    if not (dims[2].HasField("dim_value") and dims[3].HasField("dim_value")):
+        raise ValueError(
+            "End-to-end export needs a model with a fixed input height and width, "
+            "see retinaface/convert_model.py --end-to-end."
+        )
+    image_size = (dims[2].dim_value, dims[3].dim_value)
+    opset = next(op.version for op in model.opset_import if op.domain in ("", "ai.onnx"))
+
+    post = postprocess_model(image_size, model.ir_version, opset, max_faces, anchors)
+    return compose.merge_models(model, post, io_map=[("bbox", "bbox"), ("cls", "cls"), ("ldm", "ldm")])
+
+
+def export_end_to_end(input_path: str, output_path: str, max_faces: int = MAX_FACES) -> None:
+    model = build_end_to_end(onnx.load(input_path), max_faces)
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    print(f"Saved {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--max-faces", type=int, default=MAX_FACES)
+    args = parser.parse_args()
+    export_end_to_end(args.input, args.output, args.max_faces)
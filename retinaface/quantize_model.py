@@ -0,0 +1,94 @@
+"""
+Quantise the float32 RetinaFace ONNX model to a static INT8 variant.
+
+Activation ranges are calibrated by running the float32 model over a local
+folder of sample photos, which should look like production traffic. Run from
+the repo root after convert_model.py:
+
+    poetry run python retinaface/quantize_model.py path/to/calibration/images
+
+then check the accuracy and speed-up against the float32 model with
+benchmarks/quantization.py before deploying it.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from PIL import Image
+
+_HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.dirname(os.path.abspath(_HERE)))  # repo root, for retinaface.commons
+
+from retinaface.commons import preprocess  # noqa: E402
+
+INPUT_PATH = os.path.join(_HERE, "retinaface.onnx")
+OUTPUT_PATH = os.path.join(_HERE, "retinaface.int8.onnx")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class ImageFolderReader(CalibrationDataReader):
+    """Feeds preprocessed images from a folder to the calibrator, one at a time."""
+
+    def __init__(self, image_dir: str, max_images: int):
+        self.paths = sorted(
+            os.path.join(image_dir, name)
+            for name in os.listdir(image_dir)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )[:max_images]
+        self._paths = iter(self.paths)
+
+    def get_next(self) -> dict[str, np.ndarray] | None:
+        path = next(self._paths, None)
+        if path is None:
+            return None
+        img = np.asarray(Image.open(path).convert("RGB"))
+        im_tensor, _, _, _ = preprocess.preprocess_image(img, allow_upscaling=True)
+        return {"input": im_tensor}
+
+    def rewind(self) -> None:
+        self._paths = iter(self.paths)
+
+
+def quantize(input_path: str, output_path: str, calibration_dir: str, max_images: int = 200) -> None:
+    reader = ImageFolderReader(calibration_dir, max_images)
+    if not reader.paths:
+        raise ValueError(f"No calibration images ({', '.join(IMAGE_EXTENSIONS)}) found in {calibration_dir}.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference and graph cleanup make the quantiser's job easier
+        prepared_path = os.path.join(tmp, "prepared.onnx")
+        # Load the external weights (retinaface.onnx.data) up front so the pre-processor sees one model
+        quant_pre_process(onnx.load(input_path), prepared_path, skip_symbolic_shape=True)
+        quantize_static(
+            prepared_path,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    print(f"Saved {output_path} (calibrated on {len(reader.paths)} images)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("calibration_dir", help="folder of sample photos used to calibrate activation ranges")
+    parser.add_argument("--max-images", type=int, default=200)
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+    quantize(args.input, args.output, args.calibration_dir, args.max_images)
@@ -0,0 +1,133 @@
+"""
+Prepend letterbox resizing, RGB → BGR, mean subtraction and HWC → NCHW to an exported RetinaFace ONNX model.
+
+The resulting model takes the decoded RGB uint8 (height, width, 3) image as is,
+so the float32 input tensor is only ever built inside the session, on ORT's
+thread pool. The resize mirrors preprocess.resize_image (PIL bilinear with
+antialiasing, centred on a black square) to within a few grey levels.
+The input model needs a fixed, square input size and opset 18 or later, for
+the antialiased Resize. convert_model.py exports retinaface.onnx with a
+dynamic size at opset 11, so build the raw-input model from the weights with:
+
+    poetry run python retinaface/convert_model.py --raw-input
+
+which makes its own fixed-size opset 18 export for this step. Running this
+script directly only works on such a model, e.g. the checked-in retinaface.onnx:
+
+    poetry run python retinaface/raw_input.py --input retinaface/retinaface.onnx
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import onnx
+from onnx import TensorProto, compose, helper, numpy_helper
+
+_HERE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.dirname(os.path.abspath(_HERE)))  # repo root, for retinaface.commons
+
+from retinaface.commons.preprocess import _PIXEL_MEANS  # noqa: E402
+
+INPUT_PATH = os.path.join(_HERE, "retinaface.onnx")
+OUTPUT_PATH = os.path.join(_HERE, "retinaface.raw.onnx")
+
+
+def _const(name: str, value: np.ndarray) -> onnx.TensorProto:
+    return numpy_helper.from_array(np.asarray(value), name=name)
+
+
+def preprocess_model(image_size: int, ir_version: int, opset: int) -> onnx.ModelProto:
+    """
+    Graph mapping an RGB uint8 image to the letterboxed, mean-subtracted (1, 3, image_size, image_size) input
+    """
+    initializers = [
+        _const("hw_start", np.array([0], dtype=np.int64)),
+        _const("hw_end", np.array([2], dtype=np.int64)),
+        _const("target_side", np.array([image_size], dtype=np.float64)),
+        _const("target_hw", np.array([image_size, image_size], dtype=np.int64)),
+        _const("half", np.array(0.5, dtype=np.float64)),
+        _const("channels", np.array([3], dtype=np.int64)),
+        _const("no_pad", np.array([0], dtype=np.int64)),
+        _const("bgr", np.array([2, 1, 0], dtype=np.int64)),
+        _const("pixel_means", _PIXEL_MEANS.reshape(3, 1, 1)),
+        _const("batch_axis", np.array([0], dtype=np.int64)),
+    ]
+
+    nodes = [
+        # resized size, as ImageOps.pad: the long side becomes image_size, the short side keeps the aspect ratio
+        helper.make_node("Shape", ["image"], ["image_shape"]),
+        helper.make_node("Slice", ["image_shape", "hw_start", "hw_end"], ["hw"]),
+        helper.make_node("Cast", ["hw"], ["hw_float"], to=TensorProto.DOUBLE),
+        helper.make_node("ReduceMax", ["hw_float"], ["long_side"], keepdims=1),
+        helper.make_node("Div", ["hw_float", "long_side"], ["aspect"]),
+        helper.make_node("Mul", ["aspect", "target_side"], ["resized_hw_float"]),
+        helper.make_node("Round", ["resized_hw_float"], ["resized_hw_round"]),
+        helper.make_node("Cast", ["resized_hw_round"], ["resized_hw"], to=TensorProto.INT64),
+        helper.make_node("Concat", ["resized_hw", "channels"], ["sizes"], axis=0),
+        # resize in uint8 HWC, before the 4x float32 blow-up
+        helper.make_node("Resize", ["image", "", "", "sizes"], ["resized"], mode="linear", antialias=1),
+        # centre on a black square
+        helper.make_node("Sub", ["target_hw", "resized_hw"], ["pad_total"]),
+        helper.make_node("Cast", ["pad_total"], ["pad_total_float"], to=TensorProto.DOUBLE),
+        helper.make_node("Mul", ["pad_total_float", "half"], ["pad_start_float"]),
+        helper.make_node("Round", ["pad_start_float"], ["pad_start_round"]),
+        helper.make_node("Cast", ["pad_start_round"], ["pad_start"], to=TensorProto.INT64),
+        helper.make_node("Sub", ["pad_total", "pad_start"], ["pad_end"]),
+        helper.make_node("Concat", ["pad_start", "no_pad", "pad_end", "no_pad"], ["pads"], axis=0),
+        helper.make_node("Pad", ["resized", "pads"], ["padded"]),
+        # HWC RGB → NCHW BGR, minus the training means
+        helper.make_node("Cast", ["padded"], ["padded_float"], to=TensorProto.FLOAT),
+        helper.make_node("Transpose", ["padded_float"], ["chw"], perm=[2, 0, 1]),
+        helper.make_node("Gather", ["chw", "bgr"], ["chw_bgr"], axis=0),
+        helper.make_node("Sub", ["chw_bgr", "pixel_means"], ["normalised"]),
+        helper.make_node("Unsqueeze", ["normalised", "batch_axis"], ["preprocessed"]),
+    ]
+
+    graph = helper.make_graph(
+        nodes,
+        "retinaface_preprocess",
+        inputs=[helper.make_tensor_value_info("image", TensorProto.UINT8, ["height", "width", 3])],
+        outputs=[helper.make_tensor_value_info("preprocessed", TensorProto.FLOAT, [1, 3, image_size, image_size])],
+        initializer=initializers,
+    )
+    return helper.make_model(graph, ir_version=ir_version, opset_imports=[helper.make_opsetid("", opset)])
+
+
+def build_raw_input(model: onnx.ModelProto) -> onnx.ModelProto:
+    """
+    Merge the preprocessing graph in front of a model taking the (batch, 3, H, W) float32 input
+    Requires a fixed, square input size to letterbox to.
+    """
+    input_name = model.graph.input[0].name
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    if not (dims[2].HasField("dim_value") and dims[2].dim_value == dims[3].dim_value):
+        raise ValueError(
+            "Raw-input export needs a model with a fixed, square input size, "
+            "see retinaface/convert_model.py --raw-input."
+        )
+    opset = next(op.version for op in model.opset_import if op.domain in ("", "ai.onnx"))
+    if opset < 18:
+        raise ValueError(
+            f"Raw-input export needs opset 18 or later for antialiased Resize, got {opset}, "
+            "see retinaface/convert_model.py --raw-input."
+        )
+
+    pre = preprocess_model(dims[2].dim_value, model.ir_version, opset)
+    return compose.merge_models(pre, model, io_map=[("preprocessed", input_name)])
+
+
+def export_raw_input(input_path: str, output_path: str) -> None:
+    model = build_raw_input(onnx.load(input_path))
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    print(f"Saved {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+    export_raw_input(args.input, args.output)
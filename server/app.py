@@ -1,13 +1,97 @@
-from flask import Flask, jsonify, request
+import os
+import typing as t
 
-from common.googlify import googlify
+from flask import Flask, Response, abort, jsonify, request
+from PIL import UnidentifiedImageError
+from werkzeug.exceptions import BadRequest
+
+from common.googlify import cache_stats, content_key, googlify, googlify_bytes, googlify_overlay, response_mode
+from common.payload import (
+    IMAGE_MIMETYPES,
+    UNIDENTIFIED_IMAGE,
+    etag,
+    etag_matches,
+    metadata_headers,
+    parse_options,
+    precondition_status,
+)
+from common.singleflight import SingleFlight
 
 app = Flask(__name__)
 
+# Identical requests that arrive while one is being processed, e.g. double clicks and client retries, wait for
+# its result instead of running the model again. Bounds the number of distinct requests tracked (0: off).
+_in_flight: SingleFlight[tuple, t.Any] = SingleFlight(int(os.environ.get("COALESCE_MAX_IN_FLIGHT", 64)))
+
+
+def _conditional(response: Response) -> Response:
+    """
+    Tag a response with the ETag of its body, and answer a matching If-None-Match without the body: with 412
+    Precondition Failed to a POST, or 304 Not Modified to a GET
+    """
+    tag = etag(response.get_data())
+    if etag_matches(request.headers.get("If-None-Match"), tag):
+        headers = {"ETag": tag, **({"Vary": response.headers["Vary"]} if "Vary" in response.headers else {})}
+        return Response(status=precondition_status(request.method), headers=headers)
+    response.headers["ETag"] = tag
+    return response
+
+
+@app.errorhandler(ValueError)
+def invalid_request(e: ValueError) -> BadRequest:
+    """Invalid options or payloads are the client's error, not the server's"""
+    return BadRequest(str(e))
+
+
+@app.errorhandler(UnidentifiedImageError)
+def invalid_image(e: UnidentifiedImageError) -> BadRequest:
+    return BadRequest(UNIDENTIFIED_IMAGE)
+
 
 @app.route("/googly_eyes", methods=["POST"])
 def googly_eyes():
-    return jsonify(googlify(request.get_json()))
+    data = request.get_json()
+    return _conditional(jsonify(_in_flight.do(("json", content_key(request.get_data())), lambda: googlify(data))))
+
+
+@app.route("/googly_eyes/raw", methods=["POST"])
+def googly_eyes_raw():
+    """
+    Take the image as the request body (image/jpeg, image/png or image/webp) or as the "image" part of a
+    multipart/form-data body, and return the result image bytes. Options go in the query string or the other form
+    fields, and the faces and model tier in the X-Faces and X-Model-Tier response headers (X-Faces-Omitted instead
+    of X-Faces when there are too many faces for a header, see common.payload.metadata_headers). The result's format can
+    depend on the Accept header, see $PREFERRED_OUTPUT_FORMAT. With response_mode=overlay, the response is JSON
+    with the faces and googly eye geometry instead, see common.googlify.googlify_overlay. Pass a seed for a
+    reproducible result; responses carry an ETag and answer a matching If-None-Match with 412.
+    """
+    if request.mimetype == "multipart/form-data":
+        if "image" not in request.files:
+            abort(400, "Expected an 'image' part in the multipart body.")
+        content = request.files["image"].read()
+        params = {**request.args, **request.form}
+    elif request.mimetype in IMAGE_MIMETYPES:
+        content = request.get_data()
+        params = dict(request.args)
+    else:
+        abort(415, f"Expected one of {[*IMAGE_MIMETYPES, 'multipart/form-data']}.")
+
+    try:
+        options = parse_options(params)
+        mode = response_mode(options)
+    except ValueError as e:
+        abort(400, str(e))
+    accept = request.headers.get("Accept")
+    key = ("raw", content_key(content), tuple(sorted(params.items())), accept)
+    if mode == "overlay":
+        return _conditional(jsonify(_in_flight.do(key, lambda: googlify_overlay(content, options))))
+    image, mimetype, metadata = _in_flight.do(key, lambda: googlify_bytes(content, options, accept=accept))
+    return _conditional(Response(image, mimetype=mimetype, headers={**metadata_headers(metadata), "Vary": "Accept"}))
+
+
+@app.route("/cache_stats", methods=["GET"])
+def result_cache_stats():
+    return jsonify({**cache_stats(), "in_flight": _in_flight.stats()})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+"""
+ASGI server mode, batching the model calls of concurrent requests
+
+Serves the same endpoints as server/app.py. Requests are decoded, drawn and encoded on a pool of worker threads, as
+in the Flask app, but their model calls go to one InferenceBatcher. It gathers the images waiting for the model into
+batches of up to $INFERENCE_MAX_BATCH, waiting at most $INFERENCE_MAX_WAIT_MS for a batch to fill, and runs each
+batch as one model call on its own thread while the workers carry on with the other requests. Run it with any ASGI
+server, e.g. uvicorn from the server's dependencies:
+
+    uvicorn server.asgi:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import json
+import os
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from common.face import Face
+from common.googlify import (
+    Detector,
+    batch_input_shape,
+    batchable,
+    cache_stats,
+    content_key,
+    detect_faces,
+    detect_faces_batch,
+    googlify,
+    googlify_bytes,
+    googlify_overlay,
+    response_mode,
+)
+from common.payload import (
+    IMAGE_MIMETYPES,
+    UNIDENTIFIED_IMAGE,
+    etag,
+    etag_matches,
+    metadata_headers,
+    parse_multipart,
+    parse_options,
+    precondition_status,
+)
+from common.singleflight import SingleFlight
+
+_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", 8))
+_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 5))
+# Longest a worker waits for its image's batch, after which the request fails with 503
+_TIMEOUT_S = float(os.environ.get("INFERENCE_TIMEOUT_S", 60))
+
+# Enough workers to fill a batch while the previous one runs
+_WORKERS = int(os.environ.get("ASGI_WORKERS", 0)) or 2 * _MAX_BATCH
+
+Headers = list[tuple[bytes, bytes]]
+
+
+class InferenceBatcher:
+    """
+    Queue of images waiting for the model, run in batches
+    Each batch takes the images queued while the previous one ran, plus those arriving within max_wait_ms of its
+    first, up to max_batch. Images whose model inputs differ in shape go in separate model calls.
+    Args:
+        max_batch (int): most images per batch
+        max_wait_ms (float): longest an image waits for others to batch with
+        detect_batch (callable): detects the faces in a list of images, see common.googlify.detect_faces_batch
+        timeout_s (float): longest a worker thread's detector waits for a batch's result, see detector
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_wait_ms: float,
+        detect_batch: t.Callable[[list[np.ndarray]], list[list[Face]]] = detect_faces_batch,
+        timeout_s: float = 60,
+    ):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout_s
+        self._detect_batch = detect_batch
+        self._queue: asyncio.Queue[tuple[np.ndarray, asyncio.Future[list[Face]]]] | None = None
+        self._task: asyncio.Task | None = None
+        # One thread, so that batches don't compete with each other for the cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.batches = 0
+        self.images = 0
+
+    async def detect(self, image: np.ndarray) -> list[Face]:
+        """The faces in an image, detected in a batch with the images of concurrent calls"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        elif self._task.done():
+            # The batch loop stopped, e.g. on an error outside the model call: start another on the same queue, so
+            # that the images already waiting in it still get run
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((image, future))
+        return await future
+
+    def detector(self, loop: asyncio.AbstractEventLoop) -> Detector:
+        """
+        A detector for common.googlify, for worker threads, that batches what detect_faces_batch can run
+        Raises TimeoutError when the image's batch hasn't run within the batcher's timeout, so that a stuck batch
+        can't hold on to the worker threads for good.
+        """
+
+        def detect(image: np.ndarray, mode: str = "standard", tier: str = "fast") -> list[Face]:
+            if not batchable(image.shape, mode, tier):
+                return detect_faces(image, mode=mode, tier=tier)
+            future = asyncio.run_coroutine_threadsafe(self.detect(image), loop)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise TimeoutError(f"Inference didn't finish within {self.timeout:g} s.") from None
+
+        return detect
+
+    async def _next_batch(self) -> list[tuple[np.ndarray, asyncio.Future[list[Face]]]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            buckets: dict[tuple[int, int], list[tuple[np.ndarray, asyncio.Future[list[Face]]]]] = {}
+            for image, future in await self._next_batch():
+                buckets.setdefault(batch_input_shape(image.shape), []).append((image, future))
+            for bucket in buckets.values():
+                self.batches += 1
+                self.images += len(bucket)
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self._detect_batch, [image for image, _ in bucket]
+                    )
+                except Exception as e:
+                    for _, future in bucket:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), faces in zip(bucket, results):
+                    if not future.done():
+                        future.set_result(faces)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch": self.images / self.batches if self.batches else 0.0,
+        }
+
+
+_batcher = InferenceBatcher(_MAX_BATCH, _MAX_WAIT_MS, timeout_s=_TIMEOUT_S)
+_workers = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix="googlify")
+_in_flight: SingleFlight[tuple, t.Any] = SingleFlight(int(os.environ.get("COALESCE_MAX_IN_FLIGHT", 64)))
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(data: t.Any) -> bytes:
+    return json.dumps(data).encode()
+
+
+async def _read_body(receive: t.Callable[[], t.Awaitable[dict]]) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send(send: t.Callable[[dict], t.Awaitable[None]], status: int, headers: Headers, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send: t.Callable[[dict], t.Awaitable[None]], status: int, message: str) -> None:
+    await _send(send, status, [(b"content-type", b"text/plain; charset=utf-8")], message.encode())
+
+
+def _conditional(
+    method: str, request_headers: dict[str, str], headers: Headers, body: bytes
+) -> tuple[int, Headers, bytes]:
+    """As server.app._conditional: tag the body with its ETag, answering a matching If-None-Match without it"""
+    tag = etag(body)
+    if etag_matches(request_headers.get("if-none-match"), tag):
+        return precondition_status(method), [(b"etag", tag.encode()), *((name, value) for name, value in headers if name == b"vary")], b""
+    return 200, [*headers, (b"etag", tag.encode())], body
+
+
+async def _googly_eyes(body: bytes, detector: Detector) -> tuple[Headers, bytes]:
+    data = json.loads(body)
+    result = await _in_thread(_in_flight.do, ("json", content_key(body)), lambda: googlify(data, detector))
+    return [(b"content-type", b"application/json")], _json(result)
+
+
+async def _googly_eyes_raw(
+    body: bytes, query: str, headers: dict[str, str], detector: Detector
+) -> tuple[Headers, bytes]:
+    """See server.app.googly_eyes_raw"""
+    content_type = headers.get("content-type", "")
+    mimetype = content_type.split(";")[0].strip()
+    params = dict(parse_qsl(query))
+    if mimetype == "multipart/form-data":
+        try:
+            content, fields = parse_multipart(body, content_type)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        params.update(fields)
+    elif mimetype in IMAGE_MIMETYPES:
+        content = body
+    else:
+        raise HTTPError(415, f"Expected one of {[*IMAGE_MIMETYPES, 'multipart/form-data']}.")
+
+    try:
+        options = parse_options(params)
+        mode = response_mode(options)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    accept = headers.get("accept")
+    key = ("raw", content_key(content), tuple(sorted(params.items())), accept)
+    if mode == "overlay":
+        overlay = await _in_thread(_in_flight.do, key, lambda: googlify_overlay(content, options, detector))
+        return [(b"content-type", b"application/json")], _json(overlay)
+    image, image_mimetype, metadata = await _in_thread(
+        _in_flight.do, key, lambda: googlify_bytes(content, options, accept=accept, detector=detector)
+    )
+    response_headers = [(b"content-type", image_mimetype.encode()), (b"vary", b"Accept")]
+    for name, value in metadata_headers(metadata).items():
+        response_headers.append((name.lower().encode(), value.encode()))
+    return response_headers, image
+
+
+async def _in_thread(function: t.Callable[..., t.Any], *args: t.Any) -> t.Any:
+    return await asyncio.get_running_loop().run_in_executor(_workers, function, *args)
+
+
+async def _lifespan(receive: t.Callable[[], t.Awaitable[dict]], send: t.Callable[[dict], t.Awaitable[None]]) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await _batcher.close()
+            _workers.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: dict, receive: t.Callable[[], t.Awaitable[dict]], send: t.Callable[[dict], t.Awaitable[None]]):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+    route = (scope["method"], scope["path"])
+    detector = _batcher.detector(asyncio.get_running_loop())
+    try:
+        if route == ("GET", "/cache_stats"):
+            stats = {**cache_stats(), "in_flight": _in_flight.stats(), "inference_batches": _batcher.stats()}
+            response_headers, body = [(b"content-type", b"application/json")], _json(stats)
+            return await _send(send, 200, response_headers, body)
+        if route == ("POST", "/googly_eyes"):
+            response_headers, body = await _googly_eyes(await _read_body(receive), detector)
+        elif route == ("POST", "/googly_eyes/raw"):
+            request_body = await _read_body(receive)
+            query = scope.get("query_string", b"").decode("latin-1")
+            response_headers, body = await _googly_eyes_raw(request_body, query, headers, detector)
+        elif scope["path"] in ("/googly_eyes", "/googly_eyes/raw", "/cache_stats"):
+            raise HTTPError(405, "Method not allowed.")
+        else:
+            raise HTTPError(404, "Not found.")
+    except HTTPError as e:
+        return await _send_error(send, e.status, str(e))
+    except TimeoutError as e:
+        return await _send_error(send, 503, str(e))
+    except UnidentifiedImageError:
+        return await _send_error(send, 400, UNIDENTIFIED_IMAGE)
+    except ValueError as e:
+        # Invalid options or payloads, as in server.app
+        return await _send_error(send, 400, str(e))
+    await _send(send, *_conditional(scope["method"], headers, response_headers, body))
@@ -0,0 +1,14 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _clear_result_caches():
+    """Tests patch detect_faces one at a time, so results cached by an earlier test must not reach the next"""
+    googlify = sys.modules.get("common.googlify")
+    if googlify is not None:
+        googlify._detection_cache.clear()
+        googlify._render_cache.clear()
+        googlify._near_duplicates.clear()
+    yield
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from server import asgi
+
+
+def _image_bytes(color: tuple[int, int, int] = (200, 200, 200)) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (100, 100), color=color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+async def _request(method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None, query: str = ""):
+    """Call the ASGI app as a server would, returning the status, lower-cased headers and body"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    await asgi.app(scope, receive, send)
+    start, response = messages
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, response["body"]
+
+
+async def _concurrent_uploads(colors: list[tuple[int, int, int]]) -> list:
+    headers = {"Content-Type": "image/jpeg"}
+    requests = (_request("POST", "/googly_eyes/raw", _image_bytes(color), headers) for color in colors)
+    return await asyncio.gather(*requests, return_exceptions=True)
+
+
+@pytest.fixture
+def batcher():
+    batcher = asgi.InferenceBatcher(max_batch=4, max_wait_ms=500, detect_batch=lambda images: [[] for _ in images])
+    with patch.object(asgi, "_batcher", batcher):
+        yield batcher
+
+
+class TestEndpoints:
+    def test_raw_image_round_trip(self, batcher):
+        status, headers, body = asyncio.run(
+            _request("POST", "/googly_eyes/raw", _image_bytes(), {"Content-Type": "image/jpeg"}, "seed=1")
+        )
+        assert status == 200
+        assert headers["content-type"] == "image/jpeg"
+        assert headers["x-seed"] == "1"
+        assert Image.open(BytesIO(body)).size == (100, 100)
+
+    def test_if_none_match(self, batcher):
+        request = ("POST", "/googly_eyes/raw", _image_bytes(), {"Content-Type": "image/jpeg"}, "seed=1")
+        _, headers, _ = asyncio.run(_request(*request))
+        request[3]["If-None-Match"] = headers["etag"]
+        status, headers, body = asyncio.run(_request(*request))
+        assert status == 412
+        assert body == b""
+        assert headers["vary"] == "Accept"
+
+    def test_json_endpoint(self, batcher):
+        import base64
+
+        payload = json.dumps({"image": base64.b64encode(_image_bytes()).decode(), "response_mode": "overlay"})
+        status, _, body = asyncio.run(_request("POST", "/googly_eyes", payload.encode()))
+        assert status == 200
+        assert set(json.loads(body)) == {"faces", "eyes", "model_tier", "seed"}
+
+    @pytest.mark.parametrize(
+        "method, path, content_type, status",
+        [
+            ("POST", "/googly_eyes/raw", "text/plain", 415),
+            ("GET", "/googly_eyes/raw", "image/jpeg", 405),
+            ("POST", "/elsewhere", "image/jpeg", 404),
+        ],
+    )
+    def test_errors(self, method, path, content_type, status):
+        response = asyncio.run(_request(method, path, _image_bytes(), {"Content-Type": content_type}))
+        assert response[0] == status
+
+    def test_invalid_option(self):
+        headers = {"Content-Type": "image/jpeg"}
+        response = asyncio.run(_request("POST", "/googly_eyes/raw", _image_bytes(), headers, "response_mode=video"))
+        assert response[0] == 400
+
+    def test_undecodable_image(self, batcher):
+        headers = {"Content-Type": "image/jpeg"}
+        status, _, body = asyncio.run(_request("POST", "/googly_eyes/raw", b"not an image", headers))
+        assert status == 400
+        assert b"decode" in body
+
+
+class TestInferenceBatching:
+    def test_concurrent_requests_share_a_batch(self, batcher):
+        batches = []
+
+        def detect_batch(images):
+            batches.append(len(images))
+            return [[] for _ in images]
+
+        batcher._detect_batch = detect_batch
+
+        # Distinct uploads, so that neither the caches nor request coalescing answer any of them
+        responses = asyncio.run(_concurrent_uploads([(50, 50, 50), (100, 100, 100), (150, 150, 150), (200, 200, 200)]))
+        assert [status for status, _, _ in responses] == [200] * 4
+        assert batches == [4]
+        assert batcher.stats()["mean_batch"] == 4.0
+
+    def test_error_reaches_every_request(self, batcher):
+        def detect_batch(images):
+            raise RuntimeError("model failed")
+
+        batcher._detect_batch = detect_batch
+
+        results = asyncio.run(_concurrent_uploads([(50, 50, 50), (150, 150, 150)]))
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+    def test_unbatchable_modes_detect_directly(self, batcher):
+        request = ("POST", "/googly_eyes/raw", _image_bytes(), {"Content-Type": "image/jpeg"}, "detection_mode=tiled")
+        with patch("server.asgi.detect_faces", return_value=[]) as detect:
+            response = asyncio.run(_request(*request))
+        assert response[0] == 200
+        assert detect.call_args.kwargs["mode"] == "tiled"
+        assert batcher.batches == 0
+
+    def test_stopped_batch_loop_restarts(self, batcher):
+        image = np.zeros((64, 64, 3), dtype=np.uint8)
+
+        async def detect_after_stop():
+            await batcher.detect(image)
+            batcher._task.cancel()
+            await asyncio.sleep(0)
+            return await asyncio.wait_for(batcher.detect(image), 5)
+
+        assert asyncio.run(detect_after_stop()) == []
+        assert batcher.batches == 2
+
+    def test_stuck_batch_times_out(self, batcher):
+        release = threading.Event()
+
+        def detect_batch(images):
+            release.wait(5)
+            return [[] for _ in images]
+
+        batcher._detect_batch = detect_batch
+        batcher.timeout = 0.1
+        try:
+            status, _, body = asyncio.run(
+                _request("POST", "/googly_eyes/raw", _image_bytes(), {"Content-Type": "image/jpeg"})
+            )
+        finally:
+            release.set()
+        assert status == 503
+        assert b"0.1 s" in body
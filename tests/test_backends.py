@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+from common.backends import BACKENDS, MODEL_VARIANTS, load_backend, model_path
+
+MODEL_AVAILABLE = os.path.exists(model_path("fp32"))
+
+
+class TestModelPath:
+    @pytest.mark.parametrize("variant", sorted(MODEL_VARIANTS))
+    def test_variant_in_retinaface_dir(self, variant):
+        path = model_path(variant)
+        assert os.path.basename(os.path.dirname(path)) == "retinaface"
+        assert path.endswith(".onnx")
+
+    def test_unknown_variant_raises(self):
+        with pytest.raises(ValueError, match="Unknown model variant"):
+            model_path("fp16")
+
+
+class TestLoadBackend:
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError, match="Unknown inference backend"):
+            load_backend("tensorflow")
+
+    @pytest.mark.parametrize("name", [name for name in BACKENDS if name != "onnx"])
+    def test_onnx_variants_only_with_onnx(self, name):
+        with pytest.raises(ValueError, match="only available with the onnx backend"):
+            load_backend(name, variant="int8")
+
+    @pytest.mark.skipif(not MODEL_AVAILABLE, reason="retinaface.onnx not present")
+    def test_onnx_contract(self):
+        backend = load_backend("onnx")
+        bbox, cls, ldm = backend.model(np.zeros((2, 3, 640, 640), dtype=np.float32))
+        assert (bbox.shape, cls.shape, ldm.shape) == ((2, 16800, 4), (2, 16800, 2), (2, 16800, 10))
+        np.testing.assert_allclose(cls.sum(axis=-1), 1.0, rtol=1e-5)
+        assert backend.session is not None
+        assert not backend.dynamic_input
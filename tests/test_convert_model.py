@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+pytest.importorskip("huggingface_hub")
+ort = pytest.importorskip("onnxruntime")
+
+from retinaface.convert_model import cfg_mnet, export, export_in_graph_variants  # noqa: E402
+from retinaface.pytorch.models.retinaface import RetinaFace  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def net():
+    # Untrained weights: these tests check the export path, not the detections
+    return RetinaFace(cfg={**cfg_mnet, "pretrain": False}, phase="test").eval()
+
+
+def _session(path) -> "ort.InferenceSession":
+    return ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+
+
+class TestExport:
+    def test_default_export_has_dynamic_size(self, net, tmp_path):
+        export(net, str(tmp_path / "retinaface.onnx"))
+        shape = _session(tmp_path / "retinaface.onnx").get_inputs()[0].shape
+        assert not isinstance(shape[2], int) and not isinstance(shape[3], int)
+
+    def test_end_to_end_and_raw_input_variants(self, net, tmp_path):
+        end_to_end, raw_input = tmp_path / "retinaface.e2e.onnx", tmp_path / "retinaface.raw.onnx"
+        export_in_graph_variants(net, str(end_to_end), str(raw_input))
+
+        outputs = _session(end_to_end).run(
+            None,
+            {"input": np.zeros((1, 3, 640, 640), dtype=np.float32), "score_threshold": np.array([0.5], np.float32)},
+        )
+        assert [output.shape[0] for output in outputs] == [outputs[0].shape[0]] * 4
+
+        bbox, cls, ldm = _session(raw_input).run(["bbox", "cls", "ldm"], {"image": np.zeros((480, 320, 3), np.uint8)})
+        assert bbox.shape[-1] == 4 and cls.shape[-1] == 2 and ldm.shape[-1] == 10
@@ -0,0 +1,318 @@
+import numpy as np
+import pytest
+
+from retinaface import detect
+
+N_PRIORS = 16800  # 640×640 MobileNet0.25 anchors
+
+
+def _solid_image(h: int, w: int) -> np.ndarray:
+    return np.full((h, w, 3), fill_value=128, dtype=np.uint8)
+
+
+class _FakeModel:
+    """Returns zero regressions with a single confident anchor per image."""
+
+    def __init__(self, anchor: int = 100, score: float = 0.99):
+        self.anchor = anchor
+        self.score = score
+        self.calls: list[tuple[int, ...]] = []
+
+    def __call__(self, X: np.ndarray) -> list[np.ndarray]:
+        self.calls.append(X.shape)
+        batch = X.shape[0]
+        n_priors = len(detect._generate_priors((X.shape[2], X.shape[3])))
+        cls = np.zeros((batch, n_priors, 2), dtype=np.float32)
+        cls[:, :, 0] = 1.0
+        cls[:, self.anchor] = [1.0 - self.score, self.score]
+        return [
+            np.zeros((batch, n_priors, 4), dtype=np.float32),
+            cls,
+            np.zeros((batch, n_priors, 10), dtype=np.float32),
+        ]
+
+
+class TestDetectFaces:
+    def test_returns_confident_anchor(self):
+        faces = detect.detect_faces(_solid_image(640, 640), model=_FakeModel())
+        assert len(faces) == 1
+        assert faces[0]["score"] == pytest.approx(0.99)
+        assert set(faces[0]["landmarks"]) == {"right_eye", "left_eye", "nose", "mouth_right", "mouth_left"}
+
+    def test_below_threshold_returns_empty(self):
+        faces = detect.detect_faces(_solid_image(640, 640), model=_FakeModel(score=0.5), threshold=0.9)
+        assert faces == []
+
+    def test_single_model_call(self):
+        model = _FakeModel()
+        detect.detect_faces(_solid_image(100, 200), model=model)
+        assert model.calls == [(1, 3, 640, 640)]
+
+
+class TestDetectFacesBatch:
+    def test_one_model_call_for_all_images(self):
+        model = _FakeModel()
+        detect.detect_faces_batch([_solid_image(100, 200), _solid_image(300, 150), _solid_image(64, 64)], model=model)
+        assert model.calls == [(3, 3, 640, 640)]
+
+    def test_batch_size_splits_calls(self):
+        model = _FakeModel()
+        results = detect.detect_faces_batch([_solid_image(64, 64)] * 5, model=model, batch_size=2)
+        assert len(results) == 5
+        assert [shape[0] for shape in model.calls] == [2, 2, 1]
+
+    def test_matches_single_image_results(self):
+        images = [_solid_image(100, 200), _solid_image(300, 150)]
+        batched = detect.detect_faces_batch(images, model=_FakeModel())
+        single = [detect.detect_faces(image, model=_FakeModel()) for image in images]
+        assert batched == single
+
+    def test_faces_mapped_to_each_image(self):
+        # The same anchor maps to different pixel positions depending on each image's scale
+        results = detect.detect_faces_batch([_solid_image(640, 640), _solid_image(1280, 1280)], model=_FakeModel())
+        small, large = results[0][0]["facial_area"], results[1][0]["facial_area"]
+        np.testing.assert_allclose(large, np.array(small) * 2, atol=2)
+
+    def test_empty_input(self):
+        model = _FakeModel()
+        assert detect.detect_faces_batch([], model=model) == []
+        assert model.calls == []
+
+    def test_keep_aspect_ratio_pads_batch_to_common_shape(self):
+        model = _FakeModel()
+        detect.detect_faces_batch(
+            [_solid_image(360, 640), _solid_image(640, 427)], model=model, keep_aspect_ratio=True
+        )
+        assert model.calls == [(2, 3, 640, 640)]
+
+
+class TestGeneratePriors:
+    def test_square_prior_count(self):
+        assert detect._generate_priors((640, 640)).shape == (N_PRIORS, 4)
+
+    def test_non_square_prior_count(self):
+        # 2 anchors per cell on 8/16/32 stride grids
+        expected = 2 * sum((352 // step) * (640 // step) for step in (8, 16, 32))
+        assert detect._generate_priors((352, 640)).shape == (expected, 4)
+
+    def test_cached_per_shape(self):
+        assert detect._generate_priors((352, 640)) is detect._generate_priors((352, 640))
+        assert detect._generate_priors((352, 640)) is not detect._generate_priors((640, 352))
+
+    def test_cached_priors_are_read_only(self):
+        with pytest.raises(ValueError):
+            detect._generate_priors((640, 640))[0, 0] = 0.0
+
+    def test_cache_is_bounded(self):
+        assert detect._generate_priors.cache_info().maxsize == detect._PRIOR_CACHE_SIZE
+
+
+class TestKeepAspectRatio:
+    def test_tensor_is_stride_aligned(self):
+        model = _FakeModel()
+        detect.detect_faces(_solid_image(1080, 1920), model=model, keep_aspect_ratio=True)
+        assert model.calls == [(1, 3, 384, 640)]
+
+    def test_boxes_match_letterbox_for_square_image(self):
+        image = _solid_image(640, 640)
+        letterbox = detect.detect_faces(image, model=_FakeModel())
+        native = detect.detect_faces(image, model=_FakeModel(), keep_aspect_ratio=True)
+        assert native == letterbox
+
+    def test_decoded_boxes_in_original_coordinates(self):
+        # Anchor 0 sits at the top-left cell: centre (4, 4), size 16 in tensor pixels
+        faces = detect.detect_faces(_solid_image(1080, 1920), model=_FakeModel(anchor=0), keep_aspect_ratio=True)
+        scale = 1920 / 640
+        np.testing.assert_allclose(faces[0]["facial_area"], np.array([-4, -4, 12, 12]) * scale, atol=1)
+
+
+class TestThresholdFirstDecoding:
+    def _random_outputs(self, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(seed)
+        bbox = rng.normal(0, 0.5, size=(N_PRIORS, 4)).astype(np.float32)
+        ldm = rng.normal(0, 0.5, size=(N_PRIORS, 10)).astype(np.float32)
+        scores = rng.uniform(0, 1, size=N_PRIORS).astype(np.float32) ** 8
+        return bbox, np.stack([1 - scores, scores], axis=1), ldm
+
+    def test_matches_decoding_all_anchors(self):
+        bbox, cls, ldm = self._random_outputs()
+        image_size = (640, 640)
+        priors = detect._generate_priors(image_size)
+        keep = cls[:, 1] >= 0.9
+
+        boxes = detect._decode_boxes(bbox[keep], priors[keep], image_size)
+        np.testing.assert_allclose(boxes, detect._decode_boxes(bbox, priors, image_size)[keep])
+        landmarks = detect._decode_landmarks(ldm[keep], priors[keep], image_size)
+        np.testing.assert_allclose(landmarks, detect._decode_landmarks(ldm, priors, image_size)[keep])
+
+    def test_top_k_keeps_highest_scores(self):
+        _, cls, _ = self._random_outputs()
+        keep = detect._select_anchors(cls[:, 1], 0.5, (640, 640), top_k=10)
+        assert len(keep) == 10
+        assert cls[keep, 1].min() >= np.sort(cls[:, 1])[-10]
+
+    def test_top_k_larger_than_candidates(self):
+        _, cls, _ = self._random_outputs()
+        keep = detect._select_anchors(cls[:, 1], 0.9, (640, 640), top_k=N_PRIORS)
+        np.testing.assert_array_equal(keep, np.flatnonzero(cls[:, 1] >= 0.9))
+
+    def test_per_level_thresholds(self):
+        # Anchor 100 is on the stride-8 level
+        image = _solid_image(640, 640)
+        assert len(detect.detect_faces(image, model=_FakeModel(score=0.8), threshold=[0.7, 0.95, 0.95])) == 1
+        assert detect.detect_faces(image, model=_FakeModel(score=0.8), threshold=[0.9, 0.5, 0.5]) == []
+
+    def test_per_level_thresholds_cover_every_anchor(self):
+        thresholds = detect._anchor_thresholds((352, 640), (0.1, 0.2, 0.3))
+        assert thresholds.shape == (len(detect._generate_priors((352, 640))),)
+        assert thresholds[0] == 0.1
+        assert thresholds[-1] == 0.3
+
+    def test_wrong_number_of_levels_raises(self):
+        with pytest.raises(ValueError, match="per-level thresholds"):
+            detect.detect_faces(_solid_image(64, 64), model=_FakeModel(), threshold=[0.9, 0.9])
+
+
+class TestTiledDetection:
+    def test_tile_starts_cover_length(self):
+        starts = detect._tile_starts(1500, 640, 160)
+        assert starts[0] == 0
+        assert starts[-1] + 640 == 1500
+        assert all(b - a <= 640 - 160 for a, b in zip(starts, starts[1:]))
+
+    def test_single_tile_for_small_length(self):
+        assert detect._tile_starts(500, 640, 160) == [0]
+
+    def test_tiles_and_whole_image_in_one_batch(self):
+        model = _FakeModel()
+        detect.detect_faces_tiled(_solid_image(1000, 1500), model=model, batch_size=None)
+        # whole-image view + 2 rows × 3 columns of tiles
+        assert model.calls == [(7, 3, 640, 640)]
+
+    def test_batch_size_splits_views(self):
+        model = _FakeModel()
+        detect.detect_faces_tiled(_solid_image(1000, 1500), model=model, batch_size=4)
+        assert [shape[0] for shape in model.calls] == [4, 3]
+
+    def test_duplicates_across_tiles_merged(self):
+        # The same anchor fires in every view; overlapping detections collapse under NMS
+        faces = detect.detect_faces_tiled(_solid_image(700, 700), model=_FakeModel(anchor=5000), overlap=600)
+        boxes = np.array([face["facial_area"] for face in faces])
+        assert len(faces) >= 1
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                assert not np.array_equal(boxes[i], boxes[j])
+
+    def test_boxes_on_inner_tile_edges_dropped(self):
+        boxes = np.array([[650.0, 100.0, 700.0, 150.0], [900.0, 100.0, 1279.0, 150.0]])
+        mask = detect._inside_tile(boxes, origin=(640, 0), tile_shape=(640, 640), img_shape=(640, 2000))
+        np.testing.assert_array_equal(mask, [True, False])
+
+    def test_auto_switch_above_pixel_count(self):
+        model = _FakeModel()
+        detect.detect_faces(_solid_image(1000, 1500), model=model, tile_above_pixels=1_000_000)
+        assert model.calls[0][0] > 1
+
+    def test_no_tiling_below_pixel_count(self):
+        model = _FakeModel()
+        detect.detect_faces(_solid_image(1000, 1000), model=model, tile_above_pixels=1_000_000)
+        assert model.calls == [(1, 3, 640, 640)]
+
+
+class TestTwoPassDetection:
+    def test_coarse_then_one_batch_of_crops(self):
+        model = _FakeModel(anchor=1000)
+        faces = detect.detect_faces_two_pass(_solid_image(800, 1200), model=model, coarse_size=320)
+        assert model.calls[0] == (1, 3, 320, 320)
+        assert model.calls[1][1:] == (3, 640, 640)
+        assert len(model.calls) == 2
+        assert len(faces) <= model.calls[1][0]
+
+    def test_no_candidates_skips_refinement(self):
+        model = _FakeModel(score=0.1)
+        assert detect.detect_faces_two_pass(_solid_image(800, 1200), model=model) == []
+        assert len(model.calls) == 1
+
+    def test_crop_window_clipped_to_image(self):
+        x0, y0, x1, y1 = detect._crop_window(np.array([0.0, 0.0, 100.0, 50.0]), (400, 300), crop_scale=2.0)
+        assert (x0, y0) == (0, 0)
+        assert x1 == 150
+        assert y1 == 125
+
+    def test_crop_window_square_around_box(self):
+        x0, y0, x1, y1 = detect._crop_window(np.array([100.0, 100.0, 140.0, 180.0]), (1000, 1000), crop_scale=2.0)
+        assert x1 - x0 == y1 - y0 == 160
+        assert (x0 + x1) / 2 == 120
+
+
+class TestEndToEndDetection:
+    def test_maps_graph_outputs_back_to_image(self):
+        calls = []
+
+        def model(X, threshold):
+            calls.append((X.shape, threshold))
+            return [
+                np.array([0], dtype=np.int64),
+                np.array([[100.0, 200.0, 300.0, 400.0]], dtype=np.float32),
+                np.array([0.95], dtype=np.float32),
+                np.tile(np.array([[150.0, 250.0]], dtype=np.float32), (1, 5)),
+            ]
+
+        # 1280×1280 → scaled by 0.5 into the 640×640 tensor
+        faces = detect.detect_faces_end_to_end(_solid_image(1280, 1280), model=model, threshold=0.8)
+        assert calls == [((1, 3, 640, 640), 0.8)]
+        assert len(faces) == 1
+        assert faces[0]["facial_area"] == [200, 400, 600, 800]
+        assert faces[0]["landmarks"]["nose"] == pytest.approx([300.0, 500.0])
+
+    def test_no_faces(self):
+        def model(X, threshold):
+            return [
+                np.zeros(0, dtype=np.int64),
+                np.zeros((0, 4), dtype=np.float32),
+                np.zeros(0, dtype=np.float32),
+                np.zeros((0, 10), dtype=np.float32),
+            ]
+
+        assert detect.detect_faces_end_to_end(_solid_image(480, 640), model=model) == []
+
+
+class TestRawInputDetection:
+    def test_model_receives_uint8_image(self):
+        fake = _FakeModel()
+        received = []
+
+        def model(image):
+            received.append(image)
+            return fake(np.zeros((1, 3, 640, 640), dtype=np.float32))
+
+        img = _solid_image(480, 640)
+        faces = detect.detect_faces_raw(img, model=model)
+        assert received[0].dtype == np.uint8
+        assert received[0].shape == (480, 640, 3)
+        assert len(faces) == 1
+
+    def test_mapped_like_letterboxed_path(self):
+        img = _solid_image(480, 640)
+        raw = detect.detect_faces_raw(img, model=lambda image: _FakeModel()(np.zeros((1, 3, 640, 640))))
+        assert raw == detect.detect_faces(img, model=_FakeModel())
+
+
+class TestAnchorConfig:
+    def test_from_model_configs(self):
+        assert detect.MOBILENET.image_size == 640
+        assert detect.RESNET50.image_size == 840
+        assert detect.RESNET50.steps == (8, 16, 32)
+        assert detect.RESNET50.stride == 32
+
+    def test_resnet50_input_size(self):
+        model = _FakeModel()
+        faces = detect.detect_faces(_solid_image(100, 200), model=model, anchors=detect.RESNET50)
+        assert model.calls == [(1, 3, 840, 840)]
+        assert len(faces) == 1
+
+    def test_tiles_at_model_size(self):
+        model = _FakeModel()
+        detect.detect_faces_tiled(_solid_image(1000, 1000), model=model, anchors=detect.RESNET50)
+        # whole-image view plus 2×2 tiles of 840px
+        assert model.calls == [(5, 3, 840, 840)]
@@ -0,0 +1,142 @@
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from common.drawing import (
+    GooglyEye,
+    _sprites,
+    _SpriteCache,
+    composite_googly_eyes,
+    drawable_image,
+    draw_googly_eye,
+    googly_eyes,
+    googly_eyes_for_faces,
+    render_googly_eyes,
+)
+from common.face import Face
+
+
+def _face(x: float = 50.0, y: float = 40.0) -> Face:
+    return Face(
+        score=0.99,
+        bounding_box=[x - 30, y - 20, x + 30, y + 40],
+        landmarks={"right_eye": [x - 15, y], "left_eye": [x + 15, y], "nose": [x, y + 15]},
+    )
+
+
+def _eye(x: float = 50.0, y: float = 50.0) -> GooglyEye:
+    return GooglyEye(centre=[x, y], radius=10.0, pupil_offset=[0.0, 5.0], pupil_radius=5.0)
+
+
+def _grey(size: tuple[int, int] = (100, 100)) -> Image.Image:
+    return Image.new("RGB", size, color=(200, 200, 200))
+
+
+class TestGooglyEyes:
+    def test_eyes_centred_on_landmarks(self):
+        right, left = googly_eyes(_face(), eye_size=0.5, pupil_size_range=(0.4, 0.6))
+        assert right.centre == [35.0, 40.0]
+        assert left.centre == [65.0, 40.0]
+        assert right.radius == pytest.approx(7.5)  # half of half the eye-to-eye distance
+
+    def test_pupil_stays_inside_eye(self):
+        for eye in googly_eyes(_face(), eye_size=0.5, pupil_size_range=(0.4, 0.6)):
+            assert 0.4 * eye.radius <= eye.pupil_radius <= 0.6 * eye.radius
+            assert np.linalg.norm(eye.pupil_offset) + eye.pupil_radius == pytest.approx(eye.radius)
+
+    def test_all_faces_at_once(self):
+        faces = [_face(50.0 + 100 * i, 40.0) for i in range(5)]
+        eyes = googly_eyes_for_faces(faces, eye_size=0.5, pupil_size_range=(0.4, 0.6))
+        expected = [face.landmarks[name] for face in faces for name in ("right_eye", "left_eye")]
+        assert [eye.centre for eye in eyes] == expected
+        assert googly_eyes_for_faces([], eye_size=0.5, pupil_size_range=(0.4, 0.6)) == []
+
+
+class TestRenderGooglyEyes:
+    def test_close_to_image_draw(self):
+        drawn = _grey()
+        draw_googly_eye(ImageDraw.Draw(drawn), _eye())
+        rendered = _grey()
+        render_googly_eyes(rendered, [_eye()])
+        difference = np.abs(np.asarray(rendered, dtype=int) - np.asarray(drawn, dtype=int))
+        assert difference.mean() < 5  # only the anti-aliased edges differ
+        assert rendered.getpixel((50, 55)) == (0, 0, 0)  # pupil
+        assert rendered.getpixel((50, 45)) == (255, 255, 255)  # eye white
+        assert rendered.getpixel((5, 5)) == (200, 200, 200)
+
+    def test_edges_anti_aliased(self):
+        rendered = _grey()
+        render_googly_eyes(rendered, [_eye()])
+        values = set(np.asarray(rendered).reshape(-1, 3)[:, 0].tolist())
+        assert len(values) > 3
+        hard = _grey()
+        render_googly_eyes(hard, [_eye()], supersample=1)
+        assert len(set(np.asarray(hard).reshape(-1, 3)[:, 0].tolist())) <= 3
+
+    def test_rgba_eyes_are_opaque(self):
+        image = Image.new("RGBA", (100, 100), (0, 0, 0, 0))
+        render_googly_eyes(image, [_eye()])
+        assert image.mode == "RGBA"
+        assert image.getpixel((50, 45)) == (255, 255, 255, 255)
+        assert image.getpixel((5, 5)) == (0, 0, 0, 0)
+
+    @pytest.mark.parametrize("mode", ["P", "L", "LA", "CMYK"])
+    def test_other_modes_drawn_in_place(self, mode):
+        image = _grey().convert(mode)
+        render_googly_eyes(image, [_eye()])
+        assert image.mode == mode
+        assert image.convert("RGB").getpixel((50, 45)) == (255, 255, 255)
+        assert image.convert("RGB").getpixel((50, 55)) == (0, 0, 0)
+
+    @pytest.mark.parametrize(
+        "mode, expected", [("L", "RGB"), ("LA", "RGBA"), ("CMYK", "RGB"), ("I;16", "RGB"), ("RGBA", "RGBA")]
+    )
+    def test_drawable_image(self, mode, expected):
+        image = _grey().convert(mode) if mode != "I;16" else Image.new("I;16", (100, 100), color=200 * 256)
+        image.format = "PNG"
+        drawable = drawable_image(image)
+        assert drawable.mode == expected
+        assert drawable.format == "PNG"
+        assert drawable.getpixel((0, 0))[:3] == (200, 200, 200)
+
+    def test_eye_past_image_edge(self):
+        image = _grey()
+        render_googly_eyes(image, [_eye(0.0, 99.0)])
+        assert image.getpixel((0, 94)) == (255, 255, 255)
+
+    def test_sprites_cached(self):
+        _sprites.clear()
+        image = _grey((400, 100))
+        render_googly_eyes(image, [_eye(50.0 + 100 * i) for i in range(4)])
+        assert _sprites.misses == 2  # one eye and one pupil sprite
+
+    def test_large_eyes_drawn_without_sprites(self):
+        _sprites.clear()
+        eye = GooglyEye(centre=[1000.0, 1000.0], radius=400.0, pupil_offset=[0.0, 200.0], pupil_radius=200.0)
+        image = _grey((2000, 2000))
+        render_googly_eyes(image, [eye])
+        assert image.getpixel((1000, 1200)) == (0, 0, 0)
+        assert image.getpixel((1000, 700)) == (255, 255, 255)
+        assert image.getpixel((1000, 600)) == (0, 0, 0)  # outline
+        assert _sprites.misses == 0
+
+    def test_sprite_cache_bounded_by_bytes(self):
+        cache = _SpriteCache(max_bytes=100_000)
+        for radius in range(10, 60, 5):
+            cache.get(float(radius), False, 4, "RGB")
+        assert 0 < cache.bytes <= 100_000
+        cache.get(55.0, False, 4, "RGB")
+        assert cache.hits == 1
+
+
+class TestCompositeGooglyEyes:
+    def test_matches_server_rendering(self):
+        np.random.seed(0)
+        eyes = googly_eyes(_face(), eye_size=0.5, pupil_size_range=(0.4, 0.6))
+        rendered = _grey()
+        render_googly_eyes(rendered, eyes)
+        composited = _grey()
+        composite_googly_eyes(composited, [asdict(eye) for eye in eyes])
+        np.testing.assert_array_equal(np.asarray(composited), np.asarray(rendered))
@@ -0,0 +1,327 @@
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+
+class TestDetectFaces:
+    def test_unknown_mode_raises(self):
+        from common.googlify import detect_faces
+
+        with pytest.raises(ValueError, match="Unknown detection mode"):
+            detect_faces(np.zeros((64, 64, 3), dtype=np.uint8), mode="fastest")
+
+    def test_googlify_passes_detection_mode(self):
+        from common.googlify import googlify
+        from common.image import serialize_image
+
+        image = Image.new("RGB", (64, 64))
+        image.format = "PNG"
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            googlify({"image": serialize_image(image), "detection_mode": "two_pass"})
+        assert mock.call_args.kwargs["mode"] == "two_pass"
+
+
+class TestModelTiers:
+    def test_unknown_tier_raises(self):
+        from common.googlify import available_tier
+
+        with pytest.raises(ValueError, match="Unknown model tier"):
+            available_tier("medium")
+
+    def test_accurate_falls_back_without_model(self):
+        from common.googlify import available_tier
+
+        with patch("common.googlify._accurate_backend", return_value=None):
+            assert available_tier("accurate") == "fast"
+
+    def test_small_images_use_fast_tier(self):
+        from common.googlify import choose_tier
+
+        with patch("common.googlify._accurate_backend", return_value=object()):
+            assert choose_tier((480, 640, 3)) == "fast"
+
+    def test_large_images_use_accurate_tier(self):
+        from common.googlify import choose_tier
+
+        with patch("common.googlify._accurate_backend", return_value=object()):
+            assert choose_tier((3000, 4000, 3)) == "accurate"
+
+    def test_accurate_tier_over_budget(self):
+        from common.googlify import choose_tier
+
+        with (
+            patch("common.googlify._accurate_backend", return_value=object()),
+            patch.dict("common.googlify._tier_latency", {("accurate", "standard"): (800.0, time.monotonic())}),
+        ):
+            assert choose_tier((3000, 4000, 3), latency_budget_ms=500) == "fast"
+            assert choose_tier((3000, 4000, 3), latency_budget_ms=1000) == "accurate"
+            # Latency is kept per detection mode
+            assert choose_tier((3000, 4000, 3), latency_budget_ms=500, mode="two_pass") == "accurate"
+
+    def test_slow_accurate_tier_retried_after_decay(self):
+        from common.googlify import choose_tier
+
+        # Two half-lives after the last accurate run, its 800 ms average counts as 200 ms
+        updated = time.monotonic() - 120
+        with (
+            patch("common.googlify._accurate_backend", return_value=object()),
+            patch("common.googlify._LATENCY_HALF_LIFE_S", 60),
+            patch.dict("common.googlify._tier_latency", {("accurate", "standard"): (800.0, updated)}),
+        ):
+            assert choose_tier((3000, 4000, 3), latency_budget_ms=300) == "accurate"
+            assert choose_tier((3000, 4000, 3), latency_budget_ms=150) == "fast"
+
+    def test_full_resolution_latency_per_megapixel(self):
+        from common.googlify import _expected_latency, _record_latency
+
+        with patch.dict("common.googlify._tier_latency", clear=True):
+            _record_latency("accurate", "tiled", (1000, 2000, 3), 400.0)
+            assert _expected_latency("accurate", "tiled", (2000, 4000, 3)) == pytest.approx(1600.0, rel=0.01)
+            _record_latency("accurate", "standard", (1000, 2000, 3), 300.0)
+            assert _expected_latency("accurate", "standard", (2000, 4000, 3)) == pytest.approx(300.0, rel=0.01)
+
+    def test_googlify_reports_tier(self):
+        from common.googlify import googlify
+        from common.image import serialize_image
+
+        image = Image.new("RGB", (64, 64))
+        image.format = "PNG"
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            result = googlify({"image": serialize_image(image), "model_tier": "fast"})
+        assert mock.call_args.kwargs["tier"] == "fast"
+        assert result["model_tier"] == "fast"
+
+
+def _jpeg_bytes(size: tuple[int, int]) -> bytes:
+    from io import BytesIO
+
+    buf = BytesIO()
+    Image.new("RGB", size, color=(200, 200, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _face_at(x: float, y: float):
+    from common.face import Face
+
+    return Face(
+        score=0.99,
+        bounding_box=[x - 10, y - 10, x + 10, y + 10],
+        landmarks={name: [x, y] for name in ("right_eye", "left_eye", "nose", "mouth_right", "mouth_left")},
+    )
+
+
+class TestImageModes:
+    @pytest.mark.parametrize("mode, format", [("L", "JPEG"), ("CMYK", "JPEG"), ("LA", "PNG"), ("I;16", "PNG")])
+    def test_draws_on_any_mode(self, mode, format):
+        from io import BytesIO
+
+        from common.googlify import googlify_image
+
+        image = Image.new(mode, (200, 100)) if mode == "I;16" else Image.new("RGB", (200, 100)).convert(mode)
+        buf = BytesIO()
+        image.save(buf, format=format)
+        with patch("common.googlify.detect_faces", return_value=[_face_at(100.0, 50.0)]):
+            result, _ = googlify_image(buf.getvalue(), {"model_tier": "fast", "seed": 1})
+        assert result.mode in ("RGB", "RGBA")
+        assert result.format == format
+
+
+class TestReducedResolutionDecode:
+    def test_detects_on_draft_and_maps_back(self):
+        from common.googlify import googlify_image
+
+        with patch("common.googlify.detect_faces", return_value=[_face_at(100.0, 50.0)]) as mock:
+            image, metadata = googlify_image(_jpeg_bytes((2600, 1300)), {"model_tier": "fast"})
+        assert mock.call_args.args[0].shape == (325, 650, 3)
+        assert image.size == (2600, 1300)
+        assert metadata["faces"][0]["landmarks"]["right_eye"] == [400.0, 200.0]
+        assert metadata["faces"][0]["bounding_box"] == [360, 160, 440, 240]
+
+    def test_tiled_mode_detects_at_full_resolution(self):
+        from common.googlify import googlify_image
+
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            googlify_image(_jpeg_bytes((2600, 1300)), {"model_tier": "fast", "detection_mode": "tiled"})
+        assert mock.call_args.args[0].shape == (1300, 2600, 3)
+
+
+class TestOverlayResponse:
+    def test_returns_eyes_without_image(self):
+        from common.googlify import googlify
+        from common.image import serialize_image
+
+        image = Image.new("RGB", (2600, 1300))
+        image.format = "JPEG"
+        with patch("common.googlify.detect_faces", return_value=[_face_at(100.0, 50.0)]), patch(
+            "common.googlify.put_image_into_buffer"
+        ) as encode:
+            encoded = serialize_image(image)
+            encode.reset_mock()
+            result = googlify({"image": encoded, "response_mode": "overlay", "model_tier": "fast"})
+        encode.assert_not_called()
+        assert set(result) == {"faces", "eyes", "model_tier", "seed"}
+        assert [eye["centre"] for eye in result["eyes"]] == [[400.0, 200.0], [400.0, 200.0]]
+
+    def test_unknown_response_mode_raises(self):
+        from common.googlify import response_mode
+
+        with pytest.raises(ValueError, match="Unknown response mode"):
+            response_mode({"response_mode": "sprites"})
+
+
+class TestSeed:
+    def test_invalid_seed_raises(self):
+        from common.googlify import request_seed
+
+        with pytest.raises(ValueError, match="Seed"):
+            request_seed({"seed": -1})
+        with pytest.raises(ValueError, match="Seed"):
+            request_seed({"seed": "7"})
+
+    def test_random_seed_when_missing(self):
+        from common.googlify import request_seed
+
+        assert 0 <= request_seed({}) < 2**32
+
+    def test_seed_fixes_eyes(self):
+        from common.googlify import googlify_overlay
+
+        from common.face import Face
+
+        face = Face(score=0.99, bounding_box=[0, 0, 100, 100], landmarks={"right_eye": [30, 40], "left_eye": [70, 40]})
+
+        def overlay(seed: int) -> dict:
+            with patch("common.googlify.detect_faces", return_value=[face]):
+                return googlify_overlay(_jpeg_bytes((640, 320)), {"model_tier": "fast", "seed": seed})
+
+        assert overlay(1) == overlay(1)
+        assert overlay(1)["eyes"] != overlay(2)["eyes"]
+
+
+class TestResultCaches:
+    def _face(self):
+        from common.face import Face
+
+        return Face(score=0.99, bounding_box=[0, 0, 100, 100], landmarks={"right_eye": [30, 40], "left_eye": [70, 40]})
+
+    def test_eye_options_reuse_detection(self):
+        from common.googlify import googlify_bytes
+
+        content = _jpeg_bytes((640, 320))
+        with patch("common.googlify.detect_faces", return_value=[self._face()]) as mock:
+            googlify_bytes(content, {"eye_size": 0.3})
+            googlify_bytes(content, {"eye_size": 0.6, "pupil_size_range": [0.2, 0.3]})
+            googlify_bytes(content, {"eye_size": 0.6, "detection_mode": "tiled"})
+        assert mock.call_count == 2  # the tiled request is a different detection
+
+    def test_seeded_requests_reuse_render(self):
+        from common.googlify import cache_stats, googlify_bytes
+
+        content = _jpeg_bytes((640, 320))
+        hits = cache_stats()["render"]["hits"]
+        with patch("common.googlify.detect_faces", return_value=[self._face()]), patch(
+            "common.googlify.render_googly_eyes"
+        ) as render:
+            first = googlify_bytes(content, {"seed": 3})
+            second = googlify_bytes(content, {"seed": 3})
+            googlify_bytes(content, {"seed": 3, "quality": 50})
+            googlify_bytes(content, {})
+            googlify_bytes(content, {})
+        assert first == second
+        assert render.call_count == 4
+        assert cache_stats()["render"]["hits"] == hits + 1
+
+    def test_different_uploads_detected_separately(self):
+        from common.googlify import googlify_bytes
+
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            googlify_bytes(_jpeg_bytes((640, 320)), {})
+            googlify_bytes(_jpeg_bytes((640, 321)), {})
+        assert mock.call_count == 2
+
+
+class TestNearDuplicates:
+    def _photo(self, scale: float, quality: int = 90) -> bytes:
+        from io import BytesIO
+
+        photo = Image.open("tests/group_of_people.jpg")
+        buf = BytesIO()
+        photo.resize((round(photo.width * scale), round(photo.height * scale))).save(buf, "JPEG", quality=quality)
+        return buf.getvalue()
+
+    def test_resized_copy_reuses_rescaled_faces(self):
+        from common.googlify import googlify_overlay
+
+        with patch("common.googlify.detect_faces", return_value=[_face_at(100.0, 50.0)]) as mock:
+            original = googlify_overlay(self._photo(0.2), {"model_tier": "fast"})
+            copy = googlify_overlay(self._photo(0.1, quality=40), {"model_tier": "fast"})
+        assert mock.call_count == 1
+        right_eye = original["faces"][0]["landmarks"]["right_eye"]
+        assert copy["faces"][0]["landmarks"]["right_eye"] == pytest.approx([value / 2 for value in right_eye], rel=1e-2)
+
+    def test_other_aspect_ratio_is_detected(self):
+        from io import BytesIO
+
+        from common.googlify import googlify_overlay
+
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            googlify_overlay(self._photo(0.2), {"model_tier": "fast"})
+            photo = Image.open(BytesIO(self._photo(0.2)))
+            buf = BytesIO()
+            photo.resize((photo.width, photo.height * 9 // 10)).save(buf, "JPEG")
+            googlify_overlay(buf.getvalue(), {"model_tier": "fast"})
+        assert mock.call_count == 2
+
+    def test_disabled(self):
+        from common.googlify import googlify_overlay
+
+        with patch("common.googlify._NEAR_DUPLICATE_MAX_DISTANCE", -1), patch(
+            "common.googlify.detect_faces", return_value=[]
+        ) as mock:
+            googlify_overlay(self._photo(0.2), {"model_tier": "fast"})
+            googlify_overlay(self._photo(0.1), {"model_tier": "fast"})
+        assert mock.call_count == 2
+
+
+class TestDetectionStore:
+    def _face(self):
+        from common.store import LANDMARKS
+        from common.face import Face
+
+        landmarks = {name: [30.0 + 10 * i, 40.0] for i, name in enumerate(LANDMARKS)}
+        return Face(score=0.5, bounding_box=[0, 0, 100, 100], landmarks=landmarks)
+
+    def test_reads_through_store(self, tmp_path):
+        from common import googlify
+        from common.store import DetectionStore
+
+        content = _jpeg_bytes((640, 320))
+        with patch.object(googlify, "_detection_store", DetectionStore(str(tmp_path), max_bytes=2**20)), patch(
+            "common.googlify.detect_faces", return_value=[self._face()]
+        ) as mock:
+            googlify.googlify_overlay(content, {"model_tier": "fast"})
+            googlify._detection_cache.clear()  # as in another worker process
+            result = googlify.googlify_overlay(content, {"model_tier": "fast"})
+        assert mock.call_count == 1
+        assert result["faces"][0]["landmarks"]["right_eye"] == [30.0, 40.0]
+
+    def test_warm_up_from_directory(self, tmp_path):
+        from common import googlify
+        from common.store import DetectionStore
+
+        images = tmp_path / "images"
+        images.mkdir()
+        (images / "a.jpg").write_bytes(_jpeg_bytes((640, 320)))
+        (images / "b.jpg").write_bytes(_jpeg_bytes((320, 640)))
+        (images / "notes.txt").write_text("not an image")
+        store = DetectionStore(str(tmp_path / "store"), max_bytes=2**20)
+        with patch.object(googlify, "_detection_store", store), patch(
+            "common.googlify.detect_faces", return_value=[self._face()]
+        ):
+            with patch.object(store, "put_many", wraps=store.put_many) as put_many:
+                assert googlify.warm_detection_store(str(images), {"model_tier": "fast"}) == 2
+        assert len(store) == 2
+        assert put_many.call_count == 1
@@ -8,6 +8,8 @@ from PIL import Image
 from common.image import (
     deserialize_image,
     get_image_from_bytes,
+    open_for_detection,
+    output_format,
     put_image_into_buffer,
     serialize_image,
 )
@@ -73,6 +75,77 @@ class TestPutImageIntoBuffer:
         assert recovered.size == img.size
 
 
+    @pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+    def test_encodes_requested_format(self, fmt):
+        buf = put_image_into_buffer(_make_png_image(), format=fmt.lower())
+        assert Image.open(buf).format == fmt
+
+    def test_rgba_to_jpeg_drops_alpha(self):
+        recovered = Image.open(put_image_into_buffer(_make_rgba_png_image(), format="JPEG"))
+        assert recovered.format == "JPEG"
+        assert recovered.mode == "RGB"
+
+    def test_cmyk_jpeg_to_png(self):
+        buf = BytesIO()
+        Image.new("RGB", (10, 10), color=(200, 100, 50)).convert("CMYK").save(buf, format="JPEG", quality=100)
+        cmyk = Image.open(BytesIO(buf.getvalue()))
+        assert cmyk.mode == "CMYK"
+        recovered = Image.open(put_image_into_buffer(cmyk, format="PNG"))
+        assert recovered.format == "PNG"
+        assert recovered.mode == "RGB"
+        assert np.abs(np.array(recovered.getpixel((5, 5))) - (200, 100, 50)).max() <= 3
+
+    @pytest.mark.parametrize(
+        "mode, fmt, expected",
+        [
+            ("YCbCr", "PNG", "RGB"),
+            ("I;16", "PNG", "RGB"),
+            ("I;16", "WEBP", "RGB"),
+            ("LA", "PNG", "LA"),
+            ("LA", "WEBP", "RGBA"),
+            ("LA", "JPEG", "RGB"),
+            ("L", "WEBP", "RGB"),
+        ],
+    )
+    def test_converts_modes_the_format_cannot_write(self, mode, fmt, expected):
+        img = Image.new("I;16", (10, 10), color=128 * 256) if mode == "I;16" else Image.new(mode, (10, 10))
+        recovered = Image.open(put_image_into_buffer(img, format=fmt))
+        assert recovered.mode == expected
+        if mode == "I;16":
+            assert recovered.getpixel((5, 5)) == (128, 128, 128)
+
+    @pytest.mark.parametrize("fmt", ["JPEG", "WEBP"])
+    def test_lower_quality_is_smaller(self, fmt):
+        rng = np.random.default_rng(0)
+        img = Image.fromarray(rng.integers(0, 256, size=(64, 64, 3), dtype=np.uint8))
+        low = put_image_into_buffer(img, format=fmt, quality=20).getbuffer().nbytes
+        high = put_image_into_buffer(img, format=fmt, quality=95).getbuffer().nbytes
+        assert low < high
+
+    def test_progressive_jpeg(self):
+        recovered = Image.open(put_image_into_buffer(_make_jpeg_image(), progressive=True, optimize=True))
+        assert recovered.info.get("progressive")
+
+    def test_optimized_png_is_lossless(self):
+        img = _make_png_image()
+        recovered = Image.open(put_image_into_buffer(img, optimize=True, progressive=True))
+        np.testing.assert_array_equal(np.array(recovered), np.array(img))
+
+    def test_invalid_quality_raises(self):
+        with pytest.raises(ValueError, match="Quality"):
+            put_image_into_buffer(_make_jpeg_image(), quality=0)
+
+
+class TestOutputFormat:
+    @pytest.mark.parametrize("name, expected", [("jpeg", "JPEG"), ("JPG", "JPEG"), ("png", "PNG"), ("WebP", "WEBP")])
+    def test_canonical_name(self, name, expected):
+        assert output_format(name) == expected
+
+    def test_unknown_format_raises(self):
+        with pytest.raises(ValueError, match="Unknown output format"):
+            output_format("gif")
+
+
 class TestSerializeDeserialize:
     def test_serialize_returns_string(self):
         img = _make_jpeg_image()
@@ -113,3 +186,36 @@ class TestSerializeDeserialize:
     def test_deserialize_invalid_base64_raises(self):
         with pytest.raises(Exception):
             deserialize_image("not-valid-base64!!!")
+
+
+def _encoded(size: tuple[int, int], fmt: str, mode: str = "RGB") -> bytes:
+    buf = BytesIO()
+    Image.new(mode, size, color=(100, 150, 200, 255)[: len(mode)]).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+class TestOpenForDetection:
+    def test_jpeg_decoded_at_reduced_scale(self):
+        image, scale = open_for_detection(_encoded((2600, 1300), "JPEG"), max_size=640)
+        # 2600 // 640 = 4, the largest DCT scale that keeps the longer side at least 640
+        assert image.size == (650, 325)
+        assert scale == 4.0
+
+    def test_never_below_max_size(self):
+        image, scale = open_for_detection(_encoded((1279, 700), "JPEG"), max_size=640)
+        assert image.size == (1279, 700)
+        assert scale == 1.0
+
+    def test_size_rounded_up(self):
+        image, scale = open_for_detection(_encoded((2001, 1001), "JPEG"), max_size=640)
+        assert image.size == (1001, 501)
+        assert scale == 2.0
+
+    def test_png_decoded_at_full_resolution(self):
+        image, scale = open_for_detection(_encoded((2000, 1000), "PNG"), max_size=640)
+        assert image.size == (2000, 1000)
+        assert scale == 1.0
+
+    def test_converted_to_rgb(self):
+        image, _ = open_for_detection(_encoded((50, 50), "PNG", mode="RGBA"), max_size=640)
+        assert image.mode == "RGB"
@@ -30,3 +30,107 @@ class TestLambdaHandler:
             result = predict.lambda_handler(event, None)
 
         assert result == expected
+
+
+class TestLambdaRawHandler:
+    def test_binary_body_returns_base64_image(self):
+        import base64
+
+        import predict
+
+        event = {
+            "headers": {"Content-Type": "image/png", "Accept": "image/webp,*/*"},
+            "body": base64.b64encode(b"png bytes").decode(),
+            "isBase64Encoded": True,
+            "queryStringParameters": {"eye_size": "0.3"},
+        }
+        metadata = {"faces": [], "model_tier": "fast", "seed": 7}
+        with patch("predict.googlify_bytes", return_value=(b"out", "image/png", metadata)) as mock:
+            result = predict.lambda_handler(event, None)
+
+        mock.assert_called_once_with(b"png bytes", {"eye_size": 0.3}, accept="image/webp,*/*")
+        assert result["isBase64Encoded"] is True
+        assert base64.b64decode(result["body"]) == b"out"
+        assert result["headers"]["Content-Type"] == "image/png"
+        assert result["headers"]["X-Faces"] == "[]"
+        assert result["headers"]["Vary"] == "Accept"
+
+    def test_json_body_still_uses_googlify(self):
+        import predict
+
+        event = {"headers": {"content-type": "application/json"}, "body": json.dumps({"image": "test"})}
+        with patch("predict.googlify", return_value={"image": "out", "faces": []}) as mock:
+            predict.lambda_handler(event, None)
+
+        mock.assert_called_once_with({"image": "test"})
+
+    def test_overlay_mode_returns_json(self):
+        import base64
+
+        import predict
+
+        event = {
+            "headers": {"Content-Type": "image/jpeg"},
+            "body": base64.b64encode(b"jpeg bytes").decode(),
+            "isBase64Encoded": True,
+            "queryStringParameters": {"response_mode": "overlay"},
+        }
+        overlay = {"faces": [], "eyes": [], "model_tier": "fast"}
+        with patch("predict.googlify_overlay", return_value=overlay) as mock:
+            result = predict.lambda_handler(event, None)
+
+        mock.assert_called_once_with(b"jpeg bytes", {"response_mode": "overlay"})
+        assert result["headers"]["Content-Type"] == "application/json"
+        assert json.loads(result["body"]) == overlay
+
+    def test_matching_etag_returns_412(self):
+        import base64
+
+        import predict
+        from common.payload import etag
+
+        event = {
+            "headers": {"Content-Type": "image/png", "If-None-Match": etag(b"out")},
+            "body": base64.b64encode(b"png bytes").decode(),
+            "isBase64Encoded": True,
+        }
+        metadata = {"faces": [], "model_tier": "fast", "seed": 7}
+        with patch("predict.googlify_bytes", return_value=(b"out", "image/png", metadata)):
+            result = predict.lambda_handler(event, None)
+
+        assert result["statusCode"] == 412
+        assert result["headers"]["ETag"] == etag(b"out")
+        assert result["body"] == ""
+
+    def test_invalid_option_returns_400(self):
+        import base64
+
+        import predict
+
+        event = {
+            "headers": {"Content-Type": "image/jpeg"},
+            "body": base64.b64encode(b"jpeg bytes").decode(),
+            "isBase64Encoded": True,
+            "queryStringParameters": {"quality": "500"},
+        }
+        with patch("predict.googlify_bytes") as mock:
+            result = predict.lambda_handler(event, None)
+
+        mock.assert_not_called()
+        assert result["statusCode"] == 400
+        assert "quality" in result["body"]
+
+    def test_undecodable_image_returns_400(self):
+        import base64
+
+        import predict
+
+        event = {
+            "headers": {"Content-Type": "image/jpeg"},
+            "body": base64.b64encode(b"not an image").decode(),
+            "isBase64Encoded": True,
+        }
+        result = predict.lambda_handler(event, None)
+
+        assert result["statusCode"] == 400
+        assert "decode" in result["body"]
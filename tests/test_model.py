@@ -109,3 +109,120 @@ class TestModelDetection:
         face = _closest_face(detected_faces, expected)
         for got, exp in zip(face.bounding_box, expected["bbox"]):
             assert abs(got - exp) < 10, f"bbox mismatch: got {face.bounding_box}, expected {expected['bbox']}"
+
+
+class TestModelBatchDetection:
+    def test_batch_matches_single_image(self, detected_faces):
+        from common.googlify import detect_faces_batch
+
+        img = np.array(Image.open(TEST_IMAGE))
+        batched = detect_faces_batch([img, img[::2, ::2]])
+        assert len(batched) == 2
+        assert batched[0] == detected_faces
+        assert len(batched[1]) == len(detected_faces)
+
+
+@pytest.fixture(scope="module")
+def tiled_faces():
+    from common.googlify import _model
+    from retinaface import detect
+
+    img = np.array(Image.open(TEST_IMAGE))
+    return detect.detect_faces_tiled(img, model=_model)
+
+
+class TestModelTiledDetection:
+    def test_detects_five_faces(self, tiled_faces):
+        assert len(tiled_faces) == 5
+
+    @pytest.mark.parametrize("expected", EXPECTED_FACES)
+    def test_eye_positions_close_to_single_pass(self, tiled_faces, expected):
+        # Full-resolution tiles localise eyes differently from the 640px pass, but only slightly
+        errors = [
+            np.linalg.norm(np.array(face["landmarks"]["right_eye"]) - np.array(expected["right_eye"]))
+            for face in tiled_faces
+        ]
+        assert min(errors) < 25.0
+
+
+@pytest.fixture(scope="module")
+def two_pass_faces():
+    from common.googlify import detect_faces
+
+    img = np.array(Image.open(TEST_IMAGE))
+    return detect_faces(img, mode="two_pass")
+
+
+class TestModelTwoPassDetection:
+    def test_detects_five_faces(self, two_pass_faces):
+        assert len(two_pass_faces) == 5
+
+    @pytest.mark.parametrize("expected", EXPECTED_FACES)
+    def test_eye_positions_close_to_single_pass(self, two_pass_faces, expected):
+        face = _closest_face(two_pass_faces, expected)
+        right_err = np.linalg.norm(np.array(face.landmarks["right_eye"]) - np.array(expected["right_eye"]))
+        assert right_err < 25.0
+
+
+@pytest.fixture(scope="module")
+def end_to_end_faces(tmp_path_factory):
+    onnx = pytest.importorskip("onnx")
+    import onnxruntime as ort
+
+    from common.googlify import _to_face
+    from retinaface import detect
+    from retinaface.end_to_end import build_end_to_end
+
+    model_path = os.path.join(os.path.dirname(__file__), "..", "retinaface", "retinaface.onnx")
+    output_path = str(tmp_path_factory.mktemp("e2e") / "retinaface.e2e.onnx")
+    onnx.save(build_end_to_end(onnx.load(model_path)), output_path)
+    session = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+
+    def model(X, threshold):
+        return session.run(None, {"input": X, "score_threshold": np.array([threshold], dtype=np.float32)})
+
+    img = np.array(Image.open(TEST_IMAGE))
+    return [_to_face(face) for face in detect.detect_faces_end_to_end(img, model=model)]
+
+
+class TestModelEndToEndDetection:
+    def test_detects_five_faces(self, end_to_end_faces):
+        assert len(end_to_end_faces) == 5
+
+    @pytest.mark.parametrize("expected", EXPECTED_FACES)
+    def test_matches_python_postprocessing(self, end_to_end_faces, expected):
+        face = _closest_face(end_to_end_faces, expected)
+        assert face.bounding_box == pytest.approx(expected["bbox"], abs=1)
+        for eye in ("right_eye", "left_eye"):
+            assert np.linalg.norm(np.array(face.landmarks[eye]) - np.array(expected[eye])) < 1.0
+
+
+@pytest.fixture(scope="module")
+def raw_input_faces(tmp_path_factory):
+    onnx = pytest.importorskip("onnx")
+    import onnxruntime as ort
+
+    from common.googlify import _to_face
+    from retinaface import detect
+    from retinaface.raw_input import build_raw_input
+
+    model_path = os.path.join(os.path.dirname(__file__), "..", "retinaface", "retinaface.onnx")
+    output_path = str(tmp_path_factory.mktemp("raw") / "retinaface.raw.onnx")
+    onnx.save(build_raw_input(onnx.load(model_path)), output_path)
+    session = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+
+    img = np.array(Image.open(TEST_IMAGE))
+    faces = detect.detect_faces_raw(img, model=lambda image: session.run(["bbox", "cls", "ldm"], {"image": image}))
+    return [_to_face(face) for face in faces]
+
+
+class TestModelRawInputDetection:
+    def test_detects_five_faces(self, raw_input_faces):
+        assert len(raw_input_faces) == 5
+
+    @pytest.mark.parametrize("expected", EXPECTED_FACES)
+    def test_matches_python_preprocessing(self, raw_input_faces, expected):
+        face = _closest_face(raw_input_faces, expected)
+        assert face.bounding_box == pytest.approx(expected["bbox"], abs=1)
+        for eye in ("right_eye", "left_eye"):
+            assert np.linalg.norm(np.array(face.landmarks[eye]) - np.array(expected[eye])) < 1.0
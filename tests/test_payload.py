@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from common.payload import (
+    FACES_HEADER,
+    FACES_OMITTED_HEADER,
+    SEED_HEADER,
+    TIER_HEADER,
+    accepts,
+    etag,
+    etag_matches,
+    metadata_headers,
+    parse_multipart,
+    parse_options,
+    precondition_status,
+)
+from common.store import LANDMARKS
+
+
+def _multipart(boundary: str, parts: list[tuple[str, bytes, str | None]]) -> bytes:
+    body = b""
+    for name, content, filename in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+class TestParseOptions:
+    def test_typed_like_json_body(self):
+        options = parse_options(
+            {"eye_size": "0.3", "pupil_size_range": "0.2,0.5", "detection_mode": "tiled", "latency_budget_ms": "250"}
+        )
+        assert options == {
+            "eye_size": 0.3,
+            "pupil_size_range": [0.2, 0.5],
+            "detection_mode": "tiled",
+            "latency_budget_ms": 250.0,
+        }
+
+    def test_unknown_keys_ignored(self):
+        assert parse_options({"colour": "red"}) == {}
+
+    def test_invalid_value_raises(self):
+        with pytest.raises(ValueError, match="eye_size"):
+            parse_options({"eye_size": "big"})
+
+    def test_encoder_options(self):
+        options = parse_options({"output_format": "webp", "quality": "60", "optimize": "true", "progressive": "0"})
+        assert options == {"output_format": "WEBP", "quality": 60, "optimize": True, "progressive": False}
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"output_format": "gif"},
+            {"quality": "0"},
+            {"quality": "high"},
+            {"optimize": "maybe"},
+            {"seed": "-1"},
+            {"detection_mode": "fastest"},
+            {"model_tier": "huge"},
+        ],
+    )
+    def test_invalid_encoder_option_raises(self, params):
+        with pytest.raises(ValueError, match=next(iter(params))):
+            parse_options(params)
+
+
+class TestAccepts:
+    @pytest.mark.parametrize(
+        "accept, expected",
+        [
+            ("image/avif,image/webp,*/*", True),
+            ("image/webp;q=0.8, image/jpeg", True),
+            ("IMAGE/WEBP", True),
+            ("image/webp;q=0", False),
+            ("*/*", False),
+            ("image/*", False),
+            (None, False),
+        ],
+    )
+    def test_only_explicit_mimetype(self, accept, expected):
+        assert accepts(accept, "image/webp") is expected
+
+
+class TestParseMultipart:
+    def test_splits_image_and_fields(self):
+        image = bytes(range(256))  # binary, including CR/LF bytes
+        body = _multipart("xyz", [("image", image, "face.jpg"), ("eye_size", b"0.4", None)])
+        content, fields = parse_multipart(body, "multipart/form-data; boundary=xyz")
+        assert content == image
+        assert fields == {"eye_size": "0.4"}
+
+    def test_missing_image_raises(self):
+        body = _multipart("xyz", [("eye_size", b"0.4", None)])
+        with pytest.raises(ValueError, match="'image' part"):
+            parse_multipart(body, "multipart/form-data; boundary=xyz")
+
+
+class TestMetadataHeaders:
+    def test_faces_as_compact_json(self):
+        faces = [{"score": 0.9, "bounding_box": [1, 2, 3, 4]}]
+        headers = metadata_headers({"faces": faces, "model_tier": "fast", "seed": 7})
+        assert json.loads(headers[FACES_HEADER]) == faces
+        assert " " not in headers[FACES_HEADER]
+        assert headers[TIER_HEADER] == "fast"
+        assert headers[SEED_HEADER] == "7"
+
+    def test_coordinates_rounded(self):
+        faces = [{"score": 0.987654, "bounding_box": [1, 2, 3, 4], "landmarks": {"nose": [12.3456789, 40.98765]}}]
+        headers = metadata_headers({"faces": faces, "model_tier": "fast", "seed": 7})
+        assert json.loads(headers[FACES_HEADER]) == [
+            {"score": 0.988, "bounding_box": [1, 2, 3, 4], "landmarks": {"nose": [12.3, 41.0]}}
+        ]
+
+    def test_crowd_omitted(self):
+        landmarks = {name: [1234.56789, 987.654321] for name in LANDMARKS}
+        face = {"score": 0.99876, "bounding_box": [1000, 900, 1100, 1050], "landmarks": landmarks}
+        few = metadata_headers({"faces": [face] * 10, "model_tier": "fast", "seed": 7})
+        assert len(json.loads(few[FACES_HEADER])) == 10
+        assert FACES_OMITTED_HEADER not in few
+        crowd = metadata_headers({"faces": [face] * 100, "model_tier": "fast", "seed": 7})
+        assert FACES_HEADER not in crowd
+        assert crowd[FACES_OMITTED_HEADER] == "true"
+        assert sum(len(name) + len(value) for name, value in crowd.items()) < 1024
+
+    def test_seed_header(self):
+        headers = metadata_headers({"faces": [], "model_tier": "fast", "seed": 2**32 - 1})
+        assert headers[SEED_HEADER] == "4294967295"
+
+
+class TestEtag:
+    def test_depends_only_on_body(self):
+        assert etag(b"image") == etag(b"image")
+        assert etag(b"image") != etag(b"other")
+        assert etag(b"image").startswith('"')
+
+    @pytest.mark.parametrize(
+        "header, expected", [(None, False), ('"abc"', False), ("{tag}", True), ('"abc", W/{tag}', True), ("*", True)]
+    )
+    def test_if_none_match(self, header, expected):
+        tag = etag(b"image")
+        assert etag_matches(header.format(tag=tag) if header else header, tag) is expected
+
+    @pytest.mark.parametrize("method, status", [("GET", 304), ("HEAD", 304), ("POST", 412), ("put", 412)])
+    def test_precondition_status(self, method, status):
+        assert precondition_status(method) == status
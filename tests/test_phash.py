@@ -0,0 +1,76 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from common.phash import BKTree, NearDuplicateIndex, dhash, hamming
+
+
+def _photo() -> Image.Image:
+    return Image.open("tests/group_of_people.jpg")
+
+
+def _reencoded(image: Image.Image, scale: float, quality: int) -> Image.Image:
+    buffer = BytesIO()
+    image.resize((round(image.width * scale), round(image.height * scale))).save(buffer, "JPEG", quality=quality)
+    return Image.open(BytesIO(buffer.getvalue()))
+
+
+class TestDhash:
+    def test_stable_under_resize_and_recompression(self):
+        photo = _photo()
+        original = dhash(photo)
+        assert hamming(original, dhash(_reencoded(photo, 0.5, 85))) <= 4
+        assert hamming(original, dhash(_reencoded(photo, 0.2, 30))) <= 4
+
+    def test_differs_for_other_images(self):
+        photo = _photo()
+        assert hamming(dhash(photo), dhash(photo.transpose(Image.Transpose.FLIP_LEFT_RIGHT))) > 10
+        assert hamming(dhash(photo), dhash(photo.crop((0, 0, photo.width // 2, photo.height)))) > 10
+
+    def test_flat_image_has_no_hash(self):
+        assert dhash(Image.new("RGB", (640, 480), color=(200, 200, 200))) is None
+
+
+class TestBKTree:
+    def test_search_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        # Clustered hashes, a few bits from a handful of centres, like near-duplicate uploads
+        centres = [int(key) for key in rng.integers(0, 2**63, size=5)]
+        keys = {centre ^ int(rng.integers(0, 2**63)) & int(rng.integers(0, 2**63)) for centre in centres * 40}
+        tree: BKTree[int] = BKTree()
+        for key in keys:
+            tree.add(key, key)
+        assert len(tree) == len(keys)
+        for query in centres:
+            expected = sorted(hamming(query, key) for key in keys if hamming(query, key) <= 20)
+            assert [distance for distance, _, _ in tree.search(query, 20)] == expected
+
+    def test_identical_hash_replaces_value(self):
+        tree: BKTree[str] = BKTree()
+        tree.add(0b1010, "a")
+        tree.add(0b1010, "b")
+        assert len(tree) == 1
+        assert tree.search(0b1011, 1) == [(1, 0b1010, "b")]
+
+
+class TestNearDuplicateIndex:
+    def test_finds_nearest_within_distance(self):
+        index: NearDuplicateIndex[str] = NearDuplicateIndex(max_distance=2, maxsize=10)
+        index.add(0b0000, "zero")
+        index.add(0b1111, "fifteen")
+        assert index.find(0b0001) == "zero"
+        assert index.find(0b0111) == "fifteen"
+        assert index.find(0b11110000) is None
+        assert (index.hits, index.misses) == (2, 1)
+
+    def test_evicts_least_recently_used(self):
+        index: NearDuplicateIndex[int] = NearDuplicateIndex(max_distance=0, maxsize=10)
+        for key in range(10):
+            index.add(key, key)
+        index.find(0)
+        index.add(10, 10)
+        assert len(index) == 10
+        assert index.find(0) == 0
+        assert index.find(1) is None
+        assert index.find(10) == 10
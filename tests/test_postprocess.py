@@ -7,6 +7,7 @@ from retinaface.commons.postprocess import (
     clip_boxes,
     anchors_plane,
     cpu_nms,
+    nms,
     transform_bbox,
 )
 
@@ -137,6 +138,44 @@ class TestCpuNms:
         assert kept == []
 
 
+def _random_dets(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Clustered boxes, like the many overlapping candidates around each face
+    centres = rng.uniform(0, 640, size=(max(n // 10, 1), 2))[rng.integers(0, max(n // 10, 1), size=n)]
+    centres += rng.normal(0, 8, size=(n, 2))
+    sizes = rng.uniform(10, 80, size=(n, 1))
+    return np.hstack([centres - sizes / 2, centres + sizes / 2, rng.uniform(0, 1, size=(n, 1))]).astype(np.float32)
+
+
+class TestNms:
+    @pytest.mark.parametrize("n", [1, 10, 100, 500])
+    @pytest.mark.parametrize("threshold", [0.3, 0.4, 0.7])
+    def test_matches_cpu_nms(self, n, threshold):
+        dets = _random_dets(n, seed=n)
+        assert nms(dets, threshold) == cpu_nms(dets, threshold)
+
+    def test_empty_input(self):
+        assert nms(np.zeros((0, 5)), threshold=0.5) == []
+
+    def test_fully_overlapping_keeps_highest_score(self):
+        dets = np.array([[0, 0, 10, 10, 0.5], [0, 0, 10, 10, 0.9]])
+        assert nms(dets, threshold=0.5) == [1]
+
+    def test_top_k_limits_candidates(self):
+        dets = np.array(
+            [
+                [0, 0, 10, 10, 0.9],
+                [20, 20, 30, 30, 0.8],
+                [40, 40, 50, 50, 0.7],
+            ]
+        )
+        assert nms(dets, threshold=0.5, top_k=2) == [0, 1]
+
+    def test_returns_python_ints(self):
+        dets = _random_dets(20, seed=0)
+        assert all(isinstance(i, int) for i in nms(dets, threshold=0.4))
+
+
 class TestTransformBbox:
     def test_identity_transform(self):
         x = np.array([100.0, 200.0])
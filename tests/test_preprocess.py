@@ -1,7 +1,16 @@
 import numpy as np
 import pytest
 
-from retinaface.commons.preprocess import get_image, preprocess_image, resize_image
+from retinaface.commons.preprocess import (
+    aligned_size,
+    get_buffer,
+    get_image,
+    letterbox_params,
+    preprocess_image,
+    resize_image,
+    resize_image_keep_aspect,
+    write_tensor,
+)
 
 
 def _solid_image(h: int, w: int) -> np.ndarray:
@@ -77,6 +86,78 @@ class TestResizeImage:
         assert offset == (0.0, 0.0)
 
 
+class TestLetterboxParams:
+    def test_matches_resize_image(self):
+        img = _solid_image(300, 700)
+        _, scale, offset = resize_image(img, target_size=(640, 640), allow_upscaling=True)
+        assert letterbox_params((300, 700), (640, 640)) == (scale, offset)
+
+    def test_portrait_offset_is_horizontal(self):
+        scale, offset = letterbox_params((800, 400), (640, 640))
+        assert scale == pytest.approx(0.8)
+        assert offset == (200.0, 0.0)
+
+
+class TestResizeImageKeepAspect:
+    def test_longest_side_is_max_size(self):
+        resized, scale, offset = resize_image_keep_aspect(_solid_image(1080, 1920), max_size=640, allow_upscaling=True)
+        assert resized.shape == (360, 640, 3)
+        assert scale == pytest.approx(640 / 1920)
+        assert offset == (0.0, 0.0)
+
+    def test_no_upscaling(self):
+        resized, scale, _ = resize_image_keep_aspect(_solid_image(100, 200), max_size=640, allow_upscaling=False)
+        assert resized.shape == (100, 200, 3)
+        assert scale == 1.0
+
+
+class TestAlignedSize:
+    def test_rounds_up_to_multiple(self):
+        assert aligned_size(360, 32) == 384
+
+    def test_aligned_size_unchanged(self):
+        assert aligned_size(640, 32) == 640
+
+
+class TestGetBuffer:
+    def test_shape_and_dtype(self):
+        buffer = get_buffer((2, 3, 64, 96))
+        assert buffer.shape == (2, 3, 64, 96)
+        assert buffer.dtype == np.float32
+
+    def test_reused_between_calls(self):
+        first = get_buffer((1, 3, 64, 64))
+        second = get_buffer((1, 3, 32, 32))
+        assert np.shares_memory(first, second)
+
+    def test_per_thread(self):
+        import threading
+
+        buffers = []
+        thread = threading.Thread(target=lambda: buffers.append(get_buffer((1, 3, 8, 8))))
+        thread.start()
+        thread.join()
+        assert not np.shares_memory(buffers[0], get_buffer((1, 3, 8, 8)))
+
+
+class TestWriteTensor:
+    def test_matches_reference_pipeline(self):
+        rng = np.random.default_rng(0)
+        img = rng.integers(0, 256, size=(20, 30, 3), dtype=np.uint8)
+        out = np.full((3, 20, 30), np.nan, dtype=np.float32)
+        write_tensor(img, out)
+        expected = (img.astype(np.float32)[:, :, ::-1] - np.array([104.0, 117.0, 123.0])).transpose(2, 0, 1)
+        np.testing.assert_array_equal(out, expected)
+
+    def test_zero_pads_remainder(self):
+        img = np.full((20, 30, 3), 255, dtype=np.uint8)
+        out = np.full((3, 32, 64), np.nan, dtype=np.float32)
+        write_tensor(img, out)
+        assert not np.isnan(out).any()
+        assert out[:, 20:, :].sum() == 0
+        assert out[:, :, 30:].sum() == 0
+
+
 class TestPreprocessImage:
     def test_output_tensor_shape(self):
         img = _solid_image(200, 300)
@@ -89,9 +170,22 @@ class TestPreprocessImage:
         tensor, _, _, _ = preprocess_image(img, allow_upscaling=True)
         assert tensor.dtype == np.float32
 
+    def test_writes_into_given_buffer(self):
+        out = np.empty((1, 3, 640, 640), dtype=np.float32)
+        tensor, _, _, _ = preprocess_image(_solid_image(100, 100), allow_upscaling=True, out=out)
+        assert tensor is out
+
     def test_pixel_values_mean_subtracted(self):
         # BGR means (104, 117, 123); darkest possible pixel after subtraction is 0 - 123 = -123
         img = np.full((50, 50, 3), 128, dtype=np.uint8)
         tensor, _, _, _ = preprocess_image(img, allow_upscaling=True)
         assert tensor.min() >= -123.0
         assert tensor.max() <= 255.0 - 104.0
+
+    def test_keep_aspect_ratio_shape(self):
+        img = _solid_image(400, 600)
+        tensor, im_shape, scale, offset = preprocess_image(img, allow_upscaling=True, keep_aspect_ratio=True)
+        assert tensor.shape == (1, 3, 448, 640)
+        assert im_shape == (448, 640)
+        assert scale == pytest.approx(640 / 600)
+        assert offset == (0.0, 0.0)
@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+import pytest
+
+from retinaface.commons.priors import generate_priors, load_priors, priors_path, save_priors
+
+MIN_SIZES = [[16, 32], [64, 128], [256, 512]]
+STEPS = [8, 16, 32]
+
+
+def _reference_priors(image_size: tuple[int, int]) -> np.ndarray:
+    """The original nested-loop implementation."""
+    im_height, im_width = image_size
+    priors = []
+    for min_sizes, step in zip(MIN_SIZES, STEPS):
+        for i in range(math.ceil(im_height / step)):
+            for j in range(math.ceil(im_width / step)):
+                for min_size in min_sizes:
+                    cx = (j + 0.5) * step / im_width
+                    cy = (i + 0.5) * step / im_height
+                    priors.append([cx, cy, min_size / im_width, min_size / im_height])
+    return np.array(priors, dtype=np.float32)
+
+
+class TestGeneratePriors:
+    @pytest.mark.parametrize("image_size", [(640, 640), (352, 640), (640, 427), (840, 840)])
+    def test_matches_reference_loop(self, image_size):
+        np.testing.assert_array_equal(generate_priors(MIN_SIZES, STEPS, image_size), _reference_priors(image_size))
+
+    def test_dtype_is_float32(self):
+        assert generate_priors(MIN_SIZES, STEPS, (64, 64)).dtype == np.float32
+
+    def test_clip(self):
+        priors = generate_priors(MIN_SIZES, STEPS, (64, 64), clip=True)
+        assert priors.min() >= 0.0
+        assert priors.max() <= 1.0
+
+
+class TestPriorsArtefact:
+    def test_path_includes_shape(self, tmp_path):
+        assert priors_path(str(tmp_path), (352, 640)).endswith("priors_352x640.npy")
+
+    def test_save_load_roundtrip(self, tmp_path):
+        priors = generate_priors(MIN_SIZES, STEPS, (640, 640))
+        path = priors_path(str(tmp_path), (640, 640))
+        save_priors(path, priors)
+        loaded = load_priors(path)
+        np.testing.assert_array_equal(loaded, priors)
+        assert not loaded.flags.writeable
+
+    def test_missing_artefact_returns_none(self, tmp_path):
+        assert load_priors(priors_path(str(tmp_path), (640, 640))) is None
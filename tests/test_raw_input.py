@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from retinaface.commons.preprocess import preprocess_image
+
+onnx = pytest.importorskip("onnx")
+ort = pytest.importorskip("onnxruntime")
+
+from retinaface.raw_input import build_raw_input, preprocess_model  # noqa: E402
+
+
+def _run(image: np.ndarray) -> np.ndarray:
+    session = ort.InferenceSession(
+        preprocess_model(640, ir_version=10, opset=18).SerializeToString(), providers=["CPUExecutionProvider"]
+    )
+    return session.run(None, {"image": image})[0]
+
+
+def _gradient_image(h: int, w: int) -> np.ndarray:
+    y, x = np.mgrid[0:h, 0:w]
+    return np.stack([x * 255 // w, y * 255 // h, (x + y) % 256], axis=2).astype(np.uint8)
+
+
+class TestPreprocessModel:
+    @pytest.mark.parametrize("shape", [(480, 640), (1200, 900), (640, 640), (100, 50)])
+    def test_matches_python_preprocessing(self, shape):
+        image = _gradient_image(*shape)
+        expected, _, _, _ = preprocess_image(image, allow_upscaling=True)
+        actual = _run(image)
+        assert actual.shape == (1, 3, 640, 640)
+        # Resampling differs from PIL only by rounding, in the odd pixel
+        assert np.abs(actual - expected).mean() < 0.05
+        assert np.abs(actual - expected).max() <= 10
+
+    def test_padding_is_black(self):
+        actual = _run(np.full((320, 640, 3), 255, dtype=np.uint8))
+        np.testing.assert_allclose(actual[0, :, 0, 0], [-104.0, -117.0, -123.0])
+        np.testing.assert_allclose(actual[0, :, 320, 320], [151.0, 138.0, 132.0])
+
+
+class TestBuildRawInput:
+    def _model(self, dims: list[int | str]) -> "onnx.ModelProto":
+        from onnx import TensorProto, helper
+
+        graph = helper.make_graph(
+            [helper.make_node("Identity", ["input"], ["bbox"])],
+            "model",
+            inputs=[helper.make_tensor_value_info("input", TensorProto.FLOAT, dims)],
+            outputs=[helper.make_tensor_value_info("bbox", TensorProto.FLOAT, dims)],
+        )
+        return helper.make_model(graph, ir_version=10, opset_imports=[helper.make_opsetid("", 18)])
+
+    def test_input_becomes_uint8_image(self):
+        model = build_raw_input(self._model(["batch", 3, 640, 640]))
+        (graph_input,) = model.graph.input
+        assert graph_input.name == "image"
+        assert graph_input.type.tensor_type.elem_type == onnx.TensorProto.UINT8
+
+    @pytest.mark.parametrize("dims", [["batch", 3, "height", "width"], ["batch", 3, 480, 640]])
+    def test_rejects_dynamic_or_non_square_input(self, dims):
+        with pytest.raises(ValueError, match="fixed, square input size"):
+            build_raw_input(self._model(dims))
@@ -0,0 +1,212 @@
+import base64
+import json
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("flask")
+
+from server.app import app  # noqa: E402
+
+
+def _image_bytes(fmt: str = "JPEG") -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (100, 100), color=(200, 200, 200)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+class TestJsonEndpoint:
+    def test_base64_round_trip(self, client):
+        payload = {"image": base64.b64encode(_image_bytes()).decode()}
+        with patch("common.googlify.detect_faces", return_value=[]):
+            response = client.post("/googly_eyes", json=payload)
+        assert response.status_code == 200
+        assert set(response.get_json()) == {"image", "faces", "model_tier", "seed"}
+
+
+class TestRawEndpoint:
+    @pytest.mark.parametrize("fmt, mimetype", [("JPEG", "image/jpeg"), ("PNG", "image/png")])
+    def test_image_body_returns_image_bytes(self, client, fmt, mimetype):
+        with patch("common.googlify.detect_faces", return_value=[]):
+            response = client.post("/googly_eyes/raw", data=_image_bytes(fmt), content_type=mimetype)
+        assert response.status_code == 200
+        assert response.mimetype == mimetype
+        assert Image.open(BytesIO(response.data)).size == (100, 100)
+        assert json.loads(response.headers["X-Faces"]) == []
+        assert response.headers["X-Model-Tier"] == "fast"
+
+    def test_query_string_options(self, client):
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            client.post("/googly_eyes/raw?detection_mode=tiled", data=_image_bytes(), content_type="image/jpeg")
+        assert mock.call_args.kwargs["mode"] == "tiled"
+
+    def test_multipart_body(self, client):
+        data = {"image": (BytesIO(_image_bytes("PNG")), "photo.png"), "detection_mode": "two_pass"}
+        with patch("common.googlify.detect_faces", return_value=[]) as mock:
+            response = client.post("/googly_eyes/raw", data=data, content_type="multipart/form-data")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert mock.call_args.kwargs["mode"] == "two_pass"
+
+    def test_unsupported_content_type(self, client):
+        response = client.post("/googly_eyes/raw", data=b"{}", content_type="application/json")
+        assert response.status_code == 415
+
+    def test_invalid_option(self, client):
+        response = client.post("/googly_eyes/raw?eye_size=big", data=_image_bytes(), content_type="image/jpeg")
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("query", ["detection_mode=fastest", "model_tier=huge"])
+    def test_unknown_mode_or_tier(self, client, query):
+        response = client.post(f"/googly_eyes/raw?{query}", data=_image_bytes(), content_type="image/jpeg")
+        assert response.status_code == 400
+
+    def test_undecodable_image(self, client):
+        response = client.post("/googly_eyes/raw", data=b"not an image", content_type="image/jpeg")
+        assert response.status_code == 400
+        assert b"decode" in response.data
+
+    def test_json_endpoint_invalid_request(self, client):
+        payload = {"image": base64.b64encode(_image_bytes()).decode(), "detection_mode": "fastest"}
+        assert client.post("/googly_eyes", json=payload).status_code == 400
+        payload = {"image": base64.b64encode(b"not an image").decode()}
+        assert client.post("/googly_eyes", json=payload).status_code == 400
+
+
+class TestOutputEncoding:
+    def test_output_format_option(self, client):
+        with patch("common.googlify.detect_faces", return_value=[]):
+            response = client.post(
+                "/googly_eyes/raw?output_format=webp", data=_image_bytes(), content_type="image/jpeg"
+            )
+        assert response.mimetype == "image/webp"
+        assert Image.open(BytesIO(response.data)).format == "WEBP"
+
+    @pytest.mark.parametrize("accept, mimetype", [("image/webp,*/*", "image/webp"), ("*/*", "image/jpeg")])
+    def test_preferred_format_when_accepted(self, client, accept, mimetype):
+        with patch("common.googlify.detect_faces", return_value=[]), patch(
+            "common.googlify._PREFERRED_OUTPUT_FORMAT", "WEBP"
+        ):
+            response = client.post(
+                "/googly_eyes/raw", data=_image_bytes(), content_type="image/jpeg", headers={"Accept": accept}
+            )
+        assert response.mimetype == mimetype
+        assert response.headers["Vary"] == "Accept"
+
+    def test_json_endpoint_output_format(self, client):
+        payload = {"image": base64.b64encode(_image_bytes("PNG")).decode(), "output_format": "JPEG", "quality": 70}
+        with patch("common.googlify.detect_faces", return_value=[]):
+            response = client.post("/googly_eyes", json=payload)
+        image = Image.open(BytesIO(base64.b64decode(response.get_json()["image"])))
+        assert image.format == "JPEG"
+
+
+class TestOverlayMode:
+    def test_raw_overlay_returns_json(self, client):
+        with patch("common.googlify.detect_faces", return_value=[]):
+            response = client.post(
+                "/googly_eyes/raw?response_mode=overlay&seed=7", data=_image_bytes(), content_type="image/jpeg"
+            )
+        assert response.status_code == 200
+        assert response.get_json() == {"faces": [], "eyes": [], "model_tier": "fast", "seed": 7}
+
+    def test_unknown_response_mode(self, client):
+        response = client.post(
+            "/googly_eyes/raw?response_mode=sprites", data=_image_bytes(), content_type="image/jpeg"
+        )
+        assert response.status_code == 400
+
+
+def _face():
+    from common.face import Face
+
+    landmarks = {"right_eye": [35.0, 40.0], "left_eye": [65.0, 40.0], "nose": [50.0, 55.0]}
+    return Face(score=0.99, bounding_box=[20, 20, 80, 80], landmarks=landmarks)
+
+
+class TestSeededResponses:
+    def _post(self, client, query: str, **kwargs):
+        with patch("common.googlify.detect_faces", return_value=[_face()]):
+            return client.post(
+                f"/googly_eyes/raw?{query}", data=_image_bytes("PNG"), content_type="image/png", **kwargs
+            )
+
+    def test_same_seed_same_bytes_and_etag(self, client):
+        first, second = self._post(client, "seed=42"), self._post(client, "seed=42")
+        assert first.data == second.data
+        assert first.headers["ETag"] == second.headers["ETag"]
+        assert first.headers["X-Seed"] == "42"
+        assert self._post(client, "seed=43").data != first.data
+
+    def test_echoed_seed_reproduces_response(self, client):
+        first = self._post(client, "")
+        again = self._post(client, f"seed={first.headers['X-Seed']}")
+        assert again.data == first.data
+
+    def test_if_none_match_on_post_returns_412(self, client):
+        tag = self._post(client, "seed=42").headers["ETag"]
+        response = self._post(client, "seed=42", headers={"If-None-Match": tag})
+        assert response.status_code == 412
+        assert response.data == b""
+        assert response.headers["ETag"] == tag
+        assert response.headers["Vary"] == "Accept"
+
+    def test_json_endpoint_seed(self, client):
+        payload = {"image": base64.b64encode(_image_bytes("PNG")).decode(), "seed": 5}
+        with patch("common.googlify.detect_faces", return_value=[_face()]):
+            first, second = client.post("/googly_eyes", json=payload), client.post("/googly_eyes", json=payload)
+        assert first.get_json() == second.get_json()
+        assert first.get_json()["seed"] == 5
+        assert first.headers["ETag"] == second.headers["ETag"]
+
+
+class TestCoalescing:
+    def test_concurrent_identical_requests_detect_once(self):
+        import threading
+        import time
+
+        from server.app import _in_flight
+
+        calls = []
+
+        def slow_detect(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.2)
+            return []
+
+        responses = []
+
+        def post() -> None:
+            response = app.test_client().post("/googly_eyes/raw?seed=7", data=_image_bytes(), content_type="image/jpeg")
+            responses.append(response)
+
+        shared = _in_flight.shared
+        with patch("common.googlify.detect_faces", side_effect=slow_detect):
+            threads = [threading.Thread(target=post) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert [response.status_code for response in responses] == [200] * 3
+        assert len({response.get_data() for response in responses}) == 1
+        assert len(calls) == 1
+        assert _in_flight.shared == shared + 2
+
+
+class TestCacheStats:
+    def test_reports_all_caches(self, client):
+        with patch("common.googlify.detect_faces", return_value=[]):
+            client.post("/googly_eyes/raw?seed=1", data=_image_bytes(), content_type="image/jpeg")
+            client.post("/googly_eyes/raw?seed=2", data=_image_bytes(), content_type="image/jpeg")
+        stats = client.get("/cache_stats").get_json()
+        assert stats["detection"]["hits"] >= 1
+        assert set(stats["render"]) == {"size", "maxsize", "hits", "misses", "evictions"}
+        assert set(stats["near_duplicate"]) == {"size", "maxsize", "hits", "misses"}
+        assert set(stats["in_flight"]) == {"in_flight", "maxsize", "calls", "shared"}
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import onnxruntime
+import pytest
+
+from common.session import PROFILES, create_session, optimized_model_path, session_options
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "retinaface", "retinaface.onnx")
+MODEL_AVAILABLE = os.path.exists(MODEL_PATH)
+
+
+class TestSessionOptions:
+    def test_default_profile_uses_ort_defaults(self):
+        options = session_options("default")
+        assert options.intra_op_num_threads == onnxruntime.SessionOptions().intra_op_num_threads
+
+    def test_latency_uses_all_cores(self):
+        assert session_options("latency").intra_op_num_threads == (os.cpu_count() or 1)
+
+    def test_throughput_uses_one_thread(self):
+        options = session_options("throughput")
+        assert options.intra_op_num_threads == 1
+        assert options.graph_optimization_level == onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    @pytest.mark.parametrize("memory_mb, threads", [("512", 1), ("3538", 2), ("10240", 6)])
+    def test_lambda_threads_from_memory_tier(self, monkeypatch, memory_mb, threads):
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", memory_mb)
+        options = session_options("lambda")
+        assert options.intra_op_num_threads == threads
+        assert not options.enable_cpu_mem_arena
+
+    def test_unknown_profile_raises(self):
+        with pytest.raises(ValueError, match="Unknown session profile"):
+            session_options("fastest")
+
+
+@pytest.mark.skipif(not MODEL_AVAILABLE, reason="retinaface.onnx not present")
+class TestCreateSession:
+    def test_optimised_graph_persisted_and_reused(self, tmp_path):
+        create_session(MODEL_PATH, profile="throughput", cache_dir=str(tmp_path))
+        optimized_path = optimized_model_path(MODEL_PATH, str(tmp_path))
+        assert os.path.isfile(optimized_path)
+        mtime = os.stat(optimized_path).st_mtime_ns
+
+        create_session(MODEL_PATH, profile="throughput", cache_dir=str(tmp_path))
+        assert os.stat(optimized_path).st_mtime_ns == mtime
+
+    @pytest.mark.parametrize("profile", ["default", "lambda"])
+    def test_profile_not_persisted(self, tmp_path, profile):
+        create_session(MODEL_PATH, profile=profile, cache_dir=str(tmp_path))
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.parametrize("profile", PROFILES)
+    def test_profiles_match_default_outputs(self, tmp_path, profile):
+        X = np.random.default_rng(0).normal(0, 50, size=(1, 3, 640, 640)).astype(np.float32)
+        expected = create_session(MODEL_PATH).run(None, {"input": X})
+        for _ in range(2):  # first load optimises, second load reuses the cached graph
+            got = create_session(MODEL_PATH, profile=profile, cache_dir=str(tmp_path)).run(None, {"input": X})
+            for a, b in zip(got, expected):
+                np.testing.assert_allclose(a, b, atol=1e-4)
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from common.singleflight import SingleFlight
+
+
+def _run_concurrently(flight: SingleFlight, keys: list, compute) -> tuple[list, list[threading.Thread]]:
+    """Call flight.do for each key from its own thread, in order, returning the results list they fill in"""
+    results: list = [None] * len(keys)
+
+    def call(i: int) -> None:
+        try:
+            results[i] = flight.do(keys[i], compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(keys))]
+    for i, thread in enumerate(threads):
+        thread.start()
+        while flight.stats()["calls"] <= i:
+            pass
+    return results, threads
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_computation(self):
+        flight: SingleFlight[str, int] = SingleFlight(maxsize=8)
+        release = threading.Event()
+        count = 0
+
+        def compute() -> int:
+            nonlocal count
+            count += 1
+            release.wait(5)
+            return 42
+
+        results, threads = _run_concurrently(flight, ["a"] * 4, compute)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == [42] * 4
+        assert count == 1
+        assert flight.stats() == {"in_flight": 0, "maxsize": 8, "calls": 4, "shared": 3}
+
+    def test_error_reaches_every_caller(self):
+        flight: SingleFlight[str, int] = SingleFlight(maxsize=8)
+        release = threading.Event()
+
+        def compute() -> int:
+            release.wait(5)
+            raise ValueError("no faces")
+
+        results, threads = _run_concurrently(flight, ["a"] * 3, compute)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flight) == 0
+
+    def test_finished_calls_run_again(self):
+        flight: SingleFlight[str, int] = SingleFlight(maxsize=8)
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("a", lambda: 2) == 2
+        with pytest.raises(KeyError):
+            flight.do("a", lambda: {}["missing"])
+        assert flight.do("a", lambda: 3) == 3
+
+    def test_calls_beyond_maxsize_run_alone(self):
+        flight: SingleFlight[str, int] = SingleFlight(maxsize=1)
+        release = threading.Event()
+        count = 0
+
+        def compute() -> int:
+            nonlocal count
+            count += 1
+            release.wait(5)
+            return count
+
+        results, threads = _run_concurrently(flight, ["a", "b", "b"], compute)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert count == 3
+        assert flight.shared == 0
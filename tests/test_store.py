@@ -0,0 +1,83 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from common.face import Face
+from common.store import LANDMARKS, DetectionStore, decode_faces, encode_faces
+
+
+def _face(x: float = 50.0, score: float = 0.5) -> Face:  # exact in float32
+    landmarks = {name: [x + i, 40.0 + i] for i, name in enumerate(LANDMARKS)}
+    return Face(score=score, bounding_box=[int(x) - 20, 10, int(x) + 20, 70], landmarks=landmarks)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DetectionStore(str(tmp_path), max_bytes=2**20)
+    yield store
+    store.close()
+
+
+class TestRecord:
+    def test_round_trip(self):
+        faces = [_face(50.0, 0.5), _face(150.0, 0.75)]
+        assert decode_faces(encode_faces(faces)) == faces
+
+    def test_compact(self):
+        assert len(encode_faces([_face()])) == 60
+        assert decode_faces(encode_faces([])) == []
+
+
+class TestDetectionStore:
+    def test_get_put(self, store):
+        assert store.get("a") is None
+        store.put("a", [_face()])
+        assert store.get("a") == [_face()]
+        store.put("a", [])
+        assert store.get("a") == []
+
+    def test_shared_between_instances(self, store, tmp_path):
+        store.put("a", [_face()])
+        other = DetectionStore(str(tmp_path), max_bytes=2**20)
+        assert other.get("a") == [_face()]
+        other.close()
+
+    def test_concurrent_writers(self, store):
+        def write(worker: int) -> None:
+            for i in range(20):
+                store.put(f"{worker}-{i}", [_face(float(i))])
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(store) == 80
+        assert store.get("3-19") == [_face(19.0)]
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        entry_size = len(encode_faces([_face()] * 10)) + 2 + 40
+        store = DetectionStore(str(tmp_path), max_bytes=10 * entry_size)
+        with patch("common.store.time.time", side_effect=range(0, 10_000 * 100, 100)):
+            store.put_many([(f"a{i}", [_face()] * 10) for i in range(10)])
+            store.get("a0")
+            store.put_many([(f"b{i}", [_face()] * 10) for i in range(2)])
+        assert store.size_bytes() <= 9 * entry_size  # evicted to 10% under the budget
+        assert store.get("a0") is not None  # recently read
+        assert store.get("a1") is None
+        assert store.get("b1") is not None
+        store.close()
+
+    def test_reads_refresh_access_time_at_most_once_per_interval(self, store):
+        def accessed() -> float:
+            return store._connection().execute("SELECT accessed FROM detections WHERE key = 'a'").fetchone()[0]
+
+        with patch("common.store.time.time", return_value=1000.0):
+            store.put("a", [_face()])
+        with patch("common.store.time.time", return_value=1030.0):
+            store.get("a")
+        assert accessed() == 1000.0
+        with patch("common.store.time.time", return_value=1060.0):
+            store.get("a")
+        assert accessed() == 1060.0